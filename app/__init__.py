@@ -2,8 +2,9 @@
 
 from flask import Flask
 from config import get_config
-from .pdf_service import process_all_pdfs
-from .audio_service import model as whisper_model
+from .pdf_service import process_all_pdfs, ingest_pdfs
+from . import knowledge_base
+from .audio_service import start_transcription_worker
 import logging
 import os
 
@@ -19,10 +20,8 @@ def create_app():
     config = get_config()
     app.config.from_object(config)
 
-    if whisper_model is None:
-        logger.warning("Whisper model failed to load. Audio transcription will be unavailable.")
-    else:
-        logger.info("Whisper model loaded successfully.")
+    # Whisper runs in a separate local worker so web workers boot without torch
+    start_transcription_worker()
 
     # Ensure the 'data' directory exists
     os.makedirs("data", exist_ok=True)
@@ -38,11 +37,15 @@ def create_app():
     pdf_folder = os.path.join(project_root, "data/pdfs")  # Correct path to data/pdfs
     os.makedirs(pdf_folder, exist_ok=True)
 
-    # Process PDFs with force refresh
+    # Bring the knowledge base up to date; unchanged PDFs are not re-embedded
     if os.listdir(pdf_folder):
-        logger.info("Processing PDFs with force refresh")
-        process_all_pdfs(force_refresh=True)
+        logger.info("Processing new or changed PDFs")
+        process_all_pdfs(force_refresh=False)
     else:
         logger.warning(f"No PDFs found in {pdf_folder}")
 
+    # Pick up PDFs added while running, without a restart
+    if app.config["KB_WATCH_INTERVAL"] > 0:
+        knowledge_base.start_watcher("data/pdfs", ingest_pdfs, app.config["KB_WATCH_INTERVAL"])
+
     return app
\ No newline at end of file
@@ -1,89 +1,581 @@
 # app/audio_service.py
 
 import logging
-import whisper
 import os
+import sys
+import time
+import socket
+import struct
+import secrets
+import hashlib
 import requests
+import threading
 import subprocess
+import numpy as np
+from multiprocessing.connection import Connection, answer_challenge, deliver_challenge
+from .disk_cache import DiskCache
 
 logger = logging.getLogger(__name__)
 
-# Whisper model loading
-try:
-    logger.info("Attempting to load Whisper model...")
-    model = whisper.load_model("base")
-    logger.info("Whisper model loaded successfully")
-except Exception as e:
-    logger.error(f"Failed to load Whisper model: {str(e)}")
-    model = None
-
-def download_audio_file(url):
-    response = requests.get(url)
-    if response.status_code == 200:
-        audio_path = "audio.ogg"
-        with open(audio_path, 'wb') as f:
-            f.write(response.content)
-        return audio_path
-    return None
-
-def convert_to_wav(input_path):
-    output_path = os.path.splitext(input_path)[0] + ".wav"
-    try:
-        ffmpeg_path = "ffmpeg"  # Assumes ffmpeg is in PATH, adjust if necessary
-        result = subprocess.run(
-            [ffmpeg_path, "-i", input_path, "-acodec", "pcm_s16le", "-ar", "16000", output_path],
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        logger.info(f"FFmpeg conversion output: {result.stderr}")
-        return output_path
-    except subprocess.CalledProcessError as e:
-        logger.error(f"FFmpeg conversion failed. Command: {e.cmd}")
-        logger.error(f"Error output: {e.stderr}")
-        return None
-    except Exception as e:
-        logger.error(f"Error in convert_to_wav: {str(e)}")
-        return None
+WHISPER_LANGUAGE = os.getenv("WHISPER_LANGUAGE") or None  # None = detect per segment
+
+# Transcription profiles: Whisper model size, int8 dynamic quantization of
+# the Linear layers (CPU only) and decoding (beam_size None = greedy).
+# WHISPER_MODEL, TRANSCRIPTION_QUANTIZE and TRANSCRIPTION_BEAM_SIZE override
+# single fields of the chosen profile. TRANSCRIPTION_THREADS caps torch's
+# intra-op threads per model process (0 = cores / processes), so several
+# processes do not oversubscribe the CPU.
+TRANSCRIPTION_PROFILES = {
+    "fast": {"model": "tiny", "quantize": True, "beam_size": None},
+    "default": {"model": "base", "quantize": False, "beam_size": None},
+    "quantized": {"model": "base", "quantize": True, "beam_size": None},
+    "accurate": {"model": "small", "quantize": True, "beam_size": 5},
+}
+TRANSCRIPTION_PROFILE = os.getenv("TRANSCRIPTION_PROFILE", "default")
+TRANSCRIPTION_THREADS = int(os.getenv("TRANSCRIPTION_THREADS", 0))
+
+SAMPLE_RATE = 16000  # what Whisper expects
+STREAM_BLOCK_SIZE = 64 * 1024
+
+# Notes longer than MAX_AUDIO_SECONDS are cut there ("truncate") or refused
+# ("reject"); either way the download stops at the limit.
+MAX_AUDIO_SECONDS = float(os.getenv("MAX_AUDIO_SECONDS", 600))
+AUDIO_OVER_LIMIT = os.getenv("AUDIO_OVER_LIMIT", "truncate")
+
+# Long notes are split into segments of at most SEGMENT_SECONDS (under
+# Whisper's 30 s window), cut at the quietest frame of the last
+# SEGMENT_SEARCH_SECONDS before the limit so words are not split.
+SEGMENT_SECONDS = float(os.getenv("TRANSCRIPTION_SEGMENT_SECONDS", 28))
+SEGMENT_SEARCH_SECONDS = 5
+
+# "worker" sends audio to the local transcription worker process, which
+# loads Whisper once for all web workers; "inprocess" loads it lazily here.
+TRANSCRIPTION_MODE = os.getenv("TRANSCRIPTION_MODE", "worker")
+TRANSCRIPTION_SOCKET = os.getenv("TRANSCRIPTION_SOCKET", "data/transcription.sock")
+# The worker generates a fresh authkey at every start into
+# TRANSCRIPTION_KEY_FILE (mode 0600); TRANSCRIPTION_AUTHKEY pins one instead.
+TRANSCRIPTION_AUTHKEY = os.getenv("TRANSCRIPTION_AUTHKEY")
+TRANSCRIPTION_KEY_FILE = os.getenv("TRANSCRIPTION_KEY_FILE", "data/transcription.key")
+TRANSCRIPTION_CONNECT_TIMEOUT = float(os.getenv("TRANSCRIPTION_CONNECT_TIMEOUT", 5))
+TRANSCRIPTION_LOCK_FILE = os.getenv("TRANSCRIPTION_LOCK_FILE", "data/transcription.lock")
+TRANSCRIPTION_TIMEOUT = float(os.getenv("TRANSCRIPTION_TIMEOUT", 120))
+TRANSCRIPTION_AUTOSTART = os.getenv("TRANSCRIPTION_AUTOSTART", "true").lower() in ("true", "1", "t")
+# When the worker can't be reached (down, or still loading its model),
+# transcribe in this process instead. Off by default: every web worker
+# would then load its own copy of Whisper.
+TRANSCRIPTION_LOCAL_FALLBACK = os.getenv("TRANSCRIPTION_LOCAL_FALLBACK", "false").lower() in ("true", "1", "t")
+
+# Voice activity detection: frames more than VAD_THRESHOLD_DB above the
+# clip's noise floor count as speech, and so does anything louder than
+# VAD_SPEECH_DBFS (a clip that is speech end to end has no quiet 10th
+# percentile to measure a floor from). Leading/trailing silence is cut,
+# internal pauses longer than VAD_MAX_PAUSE are shortened to it, and clips
+# with less than VAD_MIN_SPEECH seconds of speech never reach Whisper.
+VAD_ENABLED = os.getenv("VAD_ENABLED", "true").lower() in ("true", "1", "t")
+VAD_FRAME_MS = 30
+VAD_THRESHOLD_DB = float(os.getenv("VAD_THRESHOLD_DB", 12))
+VAD_SILENCE_DBFS = float(os.getenv("VAD_SILENCE_DBFS", -50))
+VAD_SPEECH_DBFS = float(os.getenv("VAD_SPEECH_DBFS", -35))
+VAD_MAX_PAUSE = float(os.getenv("VAD_MAX_PAUSE", 0.6))
+VAD_MIN_SPEECH = float(os.getenv("VAD_MIN_SPEECH", 0.3))
+VAD_PADDING = 0.15  # seconds kept around speech so word edges aren't clipped
+
+# Running totals for the VAD report (per process, updated from request threads)
+vad_stats = {"clips": 0, "rejected": 0, "seconds_in": 0.0, "seconds_out": 0.0,
+             "transcribe_seconds": 0.0, "transcribed_audio_seconds": 0.0}
+vad_stats_lock = threading.Lock()
+
+# Yielded by iter_audio_message when VAD finds no speech; callers answer
+# with NO_SPEECH_REPLY instead of sending it to the model
+NO_SPEECH = "Erro: Áudio sem fala detectável."
+NO_SPEECH_REPLY = "Não consegui ouvir nada no seu áudio 😕 Pode gravar de novo ou me mandar por escrito?"
+# Same for a note that could not be transcribed at all
+TRANSCRIPTION_FAILED = "Erro: Falha ao transcrever o áudio."
+TRANSCRIPTION_FAILED_REPLY = "Não consegui entender seu áudio agora 😕 Pode me mandar sua dúvida por escrito?"
+FIXED_REPLIES = {NO_SPEECH: NO_SPEECH_REPLY, TRANSCRIPTION_FAILED: TRANSCRIPTION_FAILED_REPLY}
+
+# Transcriptions keyed by audio content hash (and by audioUrl, which Z-API
+# keeps stable per media file), so forwarded voice notes are transcribed once
+TRANSCRIPTION_CACHE_BY_URL = os.getenv("TRANSCRIPTION_CACHE_BY_URL", "true").lower() in ("true", "1", "t")
+transcription_cache = DiskCache(
+    os.getenv("TRANSCRIPTION_CACHE_DIR", "data/cache/transcriptions"),
+    max_entries=int(os.getenv("TRANSCRIPTION_CACHE_MAX_ENTRIES", 10000)),
+    max_bytes=int(float(os.getenv("TRANSCRIPTION_CACHE_MAX_MB", 50)) * 1024 * 1024)
+)
+
+
+class AudioTooLongError(Exception):
+    pass
+
+class WorkerUnavailableError(Exception):
+    """The transcription worker could not be connected to (down or still loading)."""
+
+# Loaded on first use only, so importing this module stays cheap
+model = None
 
-def transcribe_audio_file(audio_path):
+def get_profile(name=None):
+    """The named transcription profile (TRANSCRIPTION_PROFILE by default) with env overrides applied."""
+    name = name or TRANSCRIPTION_PROFILE
+    if name not in TRANSCRIPTION_PROFILES:
+        raise ValueError(f"Unknown transcription profile {name!r}, expected one of {sorted(TRANSCRIPTION_PROFILES)}")
+    profile = dict(TRANSCRIPTION_PROFILES[name], name=name)
+    if os.getenv("WHISPER_MODEL"):
+        profile["model"] = os.getenv("WHISPER_MODEL")
+    if os.getenv("TRANSCRIPTION_QUANTIZE"):
+        profile["quantize"] = os.getenv("TRANSCRIPTION_QUANTIZE").lower() in ("true", "1", "t")
+    if os.getenv("TRANSCRIPTION_BEAM_SIZE"):
+        profile["beam_size"] = int(os.getenv("TRANSCRIPTION_BEAM_SIZE")) or None
+    return profile
+
+def set_torch_threads(processes=1):
+    """Limit torch to TRANSCRIPTION_THREADS threads, or an even share of the cores."""
+    import torch
+    threads = TRANSCRIPTION_THREADS or max(1, (os.cpu_count() or 1) // max(processes, 1))
+    torch.set_num_threads(threads)
+    return threads
+
+def quantize_model(whisper_model):
+    """Replace the Linear layers with int8 dynamically quantized ones (CPU inference only)."""
+    import torch
+    # Whisper uses a Linear subclass, which quantize_dynamic leaves alone;
+    # swap in plain Linear modules sharing the same weights first
+    for module in list(whisper_model.modules()):
+        for name, child in list(module.named_children()):
+            if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+                linear = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+                linear.weight = child.weight
+                linear.bias = child.bias
+                setattr(module, name, linear)
+    return torch.quantization.quantize_dynamic(whisper_model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def load_model(profile):
+    """Load and prepare the Whisper model described by a transcription profile."""
+    import whisper
+    logger.info(f"Attempting to load Whisper model '{profile['model']}' (profile {profile['name']})...")
+    whisper_model = whisper.load_model(profile["model"])
+    if profile["quantize"]:
+        if whisper_model.device.type == "cpu":
+            whisper_model = quantize_model(whisper_model)
+            logger.info("Whisper Linear layers quantized to int8")
+        else:
+            logger.info(f"Skipping int8 quantization on {whisper_model.device}")
+    return whisper_model
+
+def decode_options(profile):
+    """Keyword arguments for whisper decoding under a profile."""
+    options = {"fp16": False, "language": WHISPER_LANGUAGE}
+    if profile["beam_size"]:
+        options["beam_size"] = profile["beam_size"]
+    return options
+
+def get_model(processes=None):
+    """
+    Load the Whisper model on first use (torch is imported here, not at boot).
+    processes is how many copies of the model share the CPU; in process it
+    defaults to gunicorn's WEB_CONCURRENCY.
+    """
+    global model
     if model is None:
-        logger.error("Whisper model is not available for transcription")
-        return None
-    
+        try:
+            threads = set_torch_threads(processes or int(os.getenv("WEB_CONCURRENCY", 1)))
+            model = load_model(get_profile())
+            logger.info(f"Whisper model loaded successfully ({threads} torch threads)")
+        except Exception as e:
+            logger.error(f"Failed to load Whisper model: {str(e)}")
+            model = None
+    return model
+
+def start_transcription_worker():
+    """
+    Spawn the transcription worker in the background if autostart is on.
+    Every web worker may call this; the worker holds a lock file, so any
+    extra copy exits immediately.
+    """
+    if TRANSCRIPTION_MODE != "worker" or not TRANSCRIPTION_AUTOSTART:
+        return
+    os.makedirs(os.path.dirname(TRANSCRIPTION_SOCKET) or ".", exist_ok=True)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "app.transcription_worker"],
+        stdin=subprocess.DEVNULL,
+        start_new_session=True
+    )
+    # Reap it when it exits (at once, for the copies that find the lock taken)
+    threading.Thread(target=process.wait, daemon=True).start()
+
+def create_authkey():
+    """A new authkey for this worker boot, written where only this user can read it."""
+    if TRANSCRIPTION_AUTHKEY:
+        return TRANSCRIPTION_AUTHKEY.encode()
+    key = secrets.token_hex(32).encode()
+    tmp = TRANSCRIPTION_KEY_FILE + ".tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    os.replace(tmp, TRANSCRIPTION_KEY_FILE)
+    return key
+
+def get_authkey():
+    if TRANSCRIPTION_AUTHKEY:
+        return TRANSCRIPTION_AUTHKEY.encode()
+    with open(TRANSCRIPTION_KEY_FILE, 'rb') as f:
+        return f.read().strip()
+
+def set_socket_timeout(sock, seconds):
+    """Kernel send/receive timeouts; Connection does plain blocking reads, so settimeout() wouldn't apply."""
+    timeval = struct.pack("ll", int(seconds), int(seconds % 1 * 1e6))
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO, timeval)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, timeval)
+
+def connect_worker(timeout=TRANSCRIPTION_CONNECT_TIMEOUT, request_timeout=TRANSCRIPTION_TIMEOUT):
+    """
+    Connect and authenticate to the transcription worker within timeout
+    seconds, so a busy, loading or hung worker can't block the caller.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
     try:
-        logger.info(f"Attempting to transcribe audio file: {audio_path}")
-        result = model.transcribe(audio_path, fp16=False)
-        logger.info("Transcription completed successfully")
-        return result['text']
-    except Exception as e:
-        logger.error(f"Error during transcription: {str(e)}")
+        sock.settimeout(timeout)
+        sock.connect(TRANSCRIPTION_SOCKET)
+        sock.setblocking(True)
+        set_socket_timeout(sock, timeout)
+        conn = Connection(sock.detach())
+    except OSError:
+        sock.close()
+        raise
+    try:
+        authkey = get_authkey()
+        answer_challenge(conn, authkey)
+        deliver_challenge(conn, authkey)
+    except (OSError, EOFError) as e:
+        conn.close()
+        raise TimeoutError(f"Transcription worker handshake failed within {timeout}s: {e}") from e
+    except Exception:
+        conn.close()
+        raise
+    # Answers are waited for with poll(); this only bounds a stalled transfer
+    with socket.socket(fileno=os.dup(conn.fileno())) as handle:
+        set_socket_timeout(handle, request_timeout)
+    return conn
+
+def request_transcription_stream(payload, timeout=TRANSCRIPTION_TIMEOUT):
+    """
+    Send a streaming request to the transcription worker and yield each
+    segment's text as it arrives. timeout applies per segment.
+    """
+    start = time.time()
+    try:
+        conn = connect_worker(request_timeout=timeout)
+    except (OSError, EOFError) as e:
+        raise WorkerUnavailableError(str(e) or type(e).__name__) from e
+    with conn:
+        conn.send(dict(payload, stream=True))
+        while True:
+            if not conn.poll(timeout):
+                raise TimeoutError(f"Transcription worker did not answer within {timeout}s")
+            response = conn.recv()
+            if "error" in response:
+                raise RuntimeError(response["error"])
+            if response.get("done"):
+                break
+            logger.info(f"Segment {response['index'] + 1} transcribed after {time.time() - start:.2f}s")
+            yield response["partial"]
+
+def decode_audio_url(url, timeout=30, digest=None):
+    """
+    Stream an audio file from url through ffmpeg and return 16 kHz mono
+    float32 samples. Nothing touches the disk: the download is piped into
+    ffmpeg's stdin and PCM is read from its stdout. Output is capped at
+    MAX_AUDIO_SECONDS, which also stops the download. If digest (a
+    hashlib object) is given it is updated with the downloaded bytes.
+    """
+    max_bytes = int(MAX_AUDIO_SECONDS * SAMPLE_RATE) * 2
+    process = subprocess.Popen(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+         "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    errors = []
+    stderr = bytearray()
+
+    def feed():
+        try:
+            with requests.get(url, stream=True, timeout=timeout) as response:
+                response.raise_for_status()
+                for block in response.iter_content(STREAM_BLOCK_SIZE):
+                    if digest is not None:
+                        digest.update(block)
+                    process.stdin.write(block)
+        except BrokenPipeError:
+            pass  # ffmpeg stopped reading (duration cap or decode error)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    def drain_stderr():
+        for line in process.stderr:
+            if len(stderr) < 4096:
+                stderr.extend(line)
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    stderr_reader = threading.Thread(target=drain_stderr, daemon=True)
+    feeder.start()
+    stderr_reader.start()
+
+    pcm = bytearray()
+    truncated = False
+    try:
+        while True:
+            block = process.stdout.read(STREAM_BLOCK_SIZE)
+            if not block:
+                break
+            pcm.extend(block)
+            if len(pcm) >= max_bytes:
+                truncated = True
+                del pcm[max_bytes:]
+                process.kill()
+                break
+    except BaseException:
+        process.kill()
+        raise
+    finally:
+        # Always reap ffmpeg, also when reading fails
+        process.stdout.close()
+        process.wait()
+    feeder.join(timeout)
+    stderr_reader.join(1)
+
+    if errors:
+        raise RuntimeError(f"Audio download failed: {errors[0]}")
+    if process.returncode != 0 and not truncated:
+        raise RuntimeError(f"FFmpeg decode failed: {stderr.decode(errors='replace').strip()}")
+    if truncated:
+        if AUDIO_OVER_LIMIT == "reject":
+            raise AudioTooLongError(f"Audio longer than {MAX_AUDIO_SECONDS:.0f}s")
+        logger.warning(f"Audio longer than {MAX_AUDIO_SECONDS}s, truncated")
+
+    return pcm_to_float32(bytes(pcm))
+
+def pcm_to_float32(pcm):
+    """Convert signed 16-bit PCM bytes to float32 samples in [-1, 1)."""
+    return np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+
+def frame_levels(audio, frame_size):
+    """RMS level in dBFS of each full frame."""
+    frames = audio[:len(audio) // frame_size * frame_size].reshape(-1, frame_size)
+    rms = np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+def runs(mask):
+    """(start, end) index pairs of consecutive True values in a boolean array."""
+    padded = np.concatenate([[False], mask, [False]])
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    return list(zip(edges[::2], edges[1::2]))
+
+def speech_frames(audio, frame_size):
+    """Boolean speech mask per frame, widened by VAD_PADDING on both sides."""
+    levels = frame_levels(audio, frame_size)
+    if not len(levels):
+        return levels.astype(bool)
+    noise_floor = np.percentile(levels, 10)
+    speech = (levels > max(noise_floor + VAD_THRESHOLD_DB, VAD_SILENCE_DBFS)) | (levels > VAD_SPEECH_DBFS)
+
+    padding = int(VAD_PADDING * 1000 / VAD_FRAME_MS)
+    if padding and speech.any():
+        speech = np.convolve(speech, np.ones(2 * padding + 1), mode="same") > 0
+    return speech
+
+def trim_silence(audio):
+    """
+    Drop leading/trailing silence and shorten long pauses.
+    Returns the trimmed samples, or None when the clip has no real speech.
+    """
+    frame_size = SAMPLE_RATE * VAD_FRAME_MS // 1000
+    speech = speech_frames(audio, frame_size)
+    speech_seconds = speech.sum() * VAD_FRAME_MS / 1000
+    if speech_seconds < VAD_MIN_SPEECH:
         return None
 
-def handle_audio_message(audio_data):
+    keep = speech.copy()
+    max_pause = int(VAD_MAX_PAUSE * 1000 / VAD_FRAME_MS)
+    spoken = np.flatnonzero(speech)
+    first, last = spoken[0], spoken[-1]
+    for start, end in runs(~speech):
+        if start < first or end > last:
+            continue  # leading or trailing silence: drop entirely
+        if end - start <= max_pause:
+            keep[start:end] = True
+        else:
+            keep[start:start + max_pause // 2] = True
+            keep[end - max_pause // 2:end] = True
+
+    samples = np.repeat(keep, frame_size)
+    return audio[:len(samples)][samples]
+
+def split_at_silence(audio, max_seconds=SEGMENT_SECONDS):
+    """
+    Split audio into segments of at most max_seconds, cutting each one at
+    the quietest frame shortly before the limit. Short audio comes back
+    as a single segment.
+    """
+    max_length = int(max_seconds * SAMPLE_RATE)
+    if len(audio) <= max_length:
+        return [audio]
+
+    frame_size = SAMPLE_RATE * VAD_FRAME_MS // 1000
+    levels = frame_levels(audio, frame_size)
+    search_frames = int(SEGMENT_SEARCH_SECONDS * 1000 / VAD_FRAME_MS)
+    segments = []
+    start = 0
+    while len(audio) - start > max_length:
+        last = (start + max_length) // frame_size
+        first = max(start // frame_size + 1, last - search_frames)
+        quietest = first + int(np.argmin(levels[first:last]))
+        cut = quietest * frame_size + frame_size // 2
+        segments.append(audio[start:cut])
+        start = cut
+    if len(audio) - start >= SAMPLE_RATE // 10:
+        segments.append(audio[start:])  # a few ms of tail only invites hallucinated text
+    return segments
+
+def apply_vad(audio):
+    """Run trim_silence, update the running totals and log the reduction."""
+    seconds_in = len(audio) / SAMPLE_RATE
+    trimmed = trim_silence(audio)
+    seconds_out = 0.0 if trimmed is None else len(trimmed) / SAMPLE_RATE
+
+    with vad_stats_lock:
+        vad_stats["clips"] += 1
+        vad_stats["seconds_in"] += seconds_in
+        vad_stats["seconds_out"] += seconds_out
+        if trimmed is None:
+            vad_stats["rejected"] += 1
+    if trimmed is None:
+        logger.info(f"VAD: no speech in {seconds_in:.1f}s clip, skipping transcription")
+    else:
+        logger.info(f"VAD: {seconds_in:.1f}s -> {seconds_out:.1f}s ({1 - seconds_out / max(seconds_in, 1e-6):.0%} less audio)")
+    return trimmed
+
+def get_vad_stats():
+    """VAD totals plus the transcription time saved, estimated from the observed speed."""
+    with vad_stats_lock:
+        stats = dict(vad_stats)
+    removed = stats["seconds_in"] - stats["seconds_out"]
+    stats["audio_reduction"] = round(removed / stats["seconds_in"], 3) if stats["seconds_in"] else None
+    if stats["transcribed_audio_seconds"]:
+        seconds_per_audio_second = stats["transcribe_seconds"] / stats["transcribed_audio_seconds"]
+        stats["estimated_latency_saved"] = round(removed * seconds_per_audio_second, 2)
+    return stats
+
+def transcribe_locally(audio):
+    """Transcribe a file path or float32 samples with the model loaded in this process."""
+    whisper_model = get_model()
+    if whisper_model is None:
+        raise RuntimeError("Whisper model is not available for transcription")
+    result = whisper_model.transcribe(audio, **decode_options(get_profile()))
+    return result['text']
+
+def iter_worker_transcription(audio):
+    """Stream segments from the worker, transcribing locally if it can't be reached and the fallback is on."""
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+    try:
+        yield from request_transcription_stream({"pcm": pcm})
+    except WorkerUnavailableError as e:
+        if not TRANSCRIPTION_LOCAL_FALLBACK:
+            raise
+        logger.warning(f"Transcription worker unavailable ({e}), transcribing in process")
+        for segment in split_at_silence(audio):
+            yield transcribe_locally(segment)
+
+def iter_transcription(audio):
+    """
+    Transcribe 16 kHz float32 samples segment by segment, yielding each
+    segment's text as soon as it is ready.
+    """
+    logger.info(f"Attempting to transcribe {len(audio) / SAMPLE_RATE:.1f}s of audio")
+    start = time.time()
+    if TRANSCRIPTION_MODE == "worker":
+        partials = iter_worker_transcription(audio)
+    else:
+        partials = (transcribe_locally(segment) for segment in split_at_silence(audio))
+    for text in partials:
+        text = text.strip()
+        if text:
+            yield text
+    with vad_stats_lock:
+        vad_stats["transcribe_seconds"] += time.time() - start
+        vad_stats["transcribed_audio_seconds"] += len(audio) / SAMPLE_RATE
+    logger.info("Transcription completed successfully")
+
+def iter_audio_message(audio_data):
+    """
+    Yield the transcription of an audio message in pieces, one per
+    segment, so callers can start working on the first part of a long
+    note. Cache hits and errors come out as a single piece.
+    """
     logger.info("Handling audio message")
     
     audio_url = audio_data.get('audioUrl')
     if not audio_url:
         logger.error("Audio URL not found in the data")
-        return "Erro: URL do áudio não encontrada."
-    
-    audio_path = download_audio_file(audio_url)
-    if not audio_path:
-        logger.error("Failed to download audio file")
-        return "Erro: Falha ao baixar o arquivo de áudio."
-    
-    wav_path = convert_to_wav(audio_path)
-    if not wav_path:
-        logger.error("Failed to convert audio to WAV")
-        return "Erro: Falha ao converter o arquivo de áudio para WAV."
+        yield "Erro: URL do áudio não encontrada."
+        return
     
-    transcription = transcribe_audio_file(wav_path)
+    url_key = f"url:{audio_url}"
+    if TRANSCRIPTION_CACHE_BY_URL:
+        # A miss here falls through to the content hash, which counts the lookup
+        cached = transcription_cache.get(url_key, count=False)
+        if cached is not None:
+            transcription_cache.record(True)
+            log_cache_hit("audioUrl")
+            yield cached["text"]
+            return
+
+    audio_hash = hashlib.sha256()
+    try:
+        audio = decode_audio_url(audio_url, digest=audio_hash)
+    except AudioTooLongError as e:
+        logger.warning(f"Rejected audio message: {e}")
+        yield f"Erro: Áudio muito longo (máximo de {MAX_AUDIO_SECONDS / 60:.0f} minutos)."
+        return
+    except Exception as e:
+        logger.error(f"Failed to download or decode audio: {str(e)}")
+        yield "Erro: Falha ao baixar o arquivo de áudio."
+        return
+
+    content_key = f"audio:{audio_hash.hexdigest()}"
+    cached = transcription_cache.get(content_key)
+    if cached is not None:
+        log_cache_hit("content hash")
+        transcription = cached["text"]
+        yield transcription
+    else:
+        if VAD_ENABLED:
+            audio = apply_vad(audio)
+            if audio is None:
+                yield NO_SPEECH
+                return
+        parts = []
+        try:
+            for text in iter_transcription(audio):
+                parts.append(text)
+                yield text
+        except Exception as e:
+            logger.error(f"Error during transcription: {str(e)}")
+            if not parts:
+                yield TRANSCRIPTION_FAILED
+            return  # a partial transcription is never cached
+        transcription = " ".join(parts)
+        transcription_cache.set(content_key, {"text": transcription})
     logger.info(f"Transcription result: {transcription}")
-    
-    # Clean up audio files
-    os.remove(audio_path)
-    os.remove(wav_path)
-    
-    return transcription
\ No newline at end of file
+
+    if TRANSCRIPTION_CACHE_BY_URL:
+        transcription_cache.set(url_key, {"text": transcription})
+
+def log_cache_hit(source):
+    stats = transcription_cache.stats()
+    logger.info(f"Transcription cache hit by {source} (hit rate {stats['hit_rate']:.0%}, {stats['hits']} hits)")
\ No newline at end of file
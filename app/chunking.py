@@ -0,0 +1,261 @@
+# app/chunking.py
+
+import re
+import hashlib
+import logging
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken is optional, fall back to a regex estimate
+    _encoding = None
+
+# Roughly one token per word, number or punctuation mark; close enough to
+# cl100k for sizing chunks when tiktoken isn't installed.
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+# Section headings: "1. Introdução", "2) Preços", "3.1 Módulos" (a number
+# followed by a capitalised title) or an all-caps line. A bare leading
+# number isn't enough: "10 parcelas de R$ 49,90" is body text.
+HEADING_PATTERN = re.compile(
+    r"^(\d+(\.\d+)*[.)]\s+[A-ZÀ-Ý].*|\d+(\.\d+)+\s+[A-ZÀ-Ý].*|[A-ZÀ-Ý][A-ZÀ-Ý0-9\s\-:&/]{2,})$"
+)
+LIST_ITEM_PATTERN = re.compile(r"^(\s*([-•*▪◦✅👉]|\d+[.)]|[a-z][.)])\s+)")
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+
+def count_tokens(text):
+    """Count tokens with tiktoken when available, otherwise estimate them."""
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def normalize_line(line):
+    """Normalize a line for boilerplate detection (case, digits and spacing)."""
+    line = re.sub(r"\d+", "#", line.lower())
+    return re.sub(r"\s+", " ", line).strip()
+
+
+def normalize_chunk(text):
+    """Normalize a chunk for duplicate detection (case and spacing only)."""
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+
+def edge_lines(page, edge=2):
+    """Return the first and last non-empty lines of a page."""
+    lines = [line for line in page.splitlines() if line.strip()]
+    return lines[:edge] + lines[-edge:]
+
+
+def strip_repeated_lines(pages, min_ratio=0.5, edge=2, max_length=120):
+    """
+    Remove header/footer lines that repeat on most pages of a document.
+    Only the first and last few lines of each page are considered, and
+    page numbers are ignored when comparing, so "Página 3 de 10" is
+    treated the same on every page.
+    """
+    if len(pages) < 3:
+        return pages
+
+    counts = Counter()
+    for page in pages:
+        counts.update({
+            normalize_line(line) for line in edge_lines(page, edge) if len(line) <= max_length
+        })
+
+    threshold = max(2, int(len(pages) * min_ratio))
+    boilerplate = {line for line, count in counts.items() if count >= threshold}
+    if not boilerplate:
+        return pages
+    logger.info(f"Removing {len(boilerplate)} repeated header/footer lines")
+
+    cleaned = []
+    for page in pages:
+        edges = set(edge_lines(page, edge))
+        cleaned.append("\n".join(
+            line for line in page.splitlines()
+            if line not in edges or normalize_line(line) not in boilerplate
+        ))
+    return cleaned
+
+
+def is_heading(line):
+    """A short line without final punctuation that looks like a title."""
+    line = line.strip()
+    if not line or len(line) > 80 or line[-1] in ".,;!?":
+        return False
+    return bool(HEADING_PATTERN.match(line)) or line.endswith(":")
+
+
+def is_list_item(lines, i):
+    """
+    Whether lines[i] is a list item. A numbered line that reads like a
+    title ("2. Preços") is a section heading unless a neighbouring line is
+    a list item too.
+    """
+    if not LIST_ITEM_PATTERN.match(lines[i]):
+        return False
+    if not is_heading(lines[i]):
+        return True
+    neighbours = [lines[j] for j in (i - 1, i + 1) if 0 <= j < len(lines)]
+    return any(LIST_ITEM_PATTERN.match(line) for line in neighbours)
+
+
+def iter_units(text):
+    """
+    Yield (kind, text) units in document order: headings, list items and
+    sentences. List items are kept whole so a bullet is never split.
+    """
+    paragraph = []
+    lines = [line.strip() for line in text.splitlines()]
+
+    def flush_paragraph():
+        joined = " ".join(paragraph).strip()
+        paragraph.clear()
+        if joined:
+            for sentence in SENTENCE_PATTERN.split(joined):
+                if sentence.strip():
+                    yield "sentence", sentence.strip()
+
+    for i, line in enumerate(lines):
+        if not line:
+            yield from flush_paragraph()
+            continue
+        if is_list_item(lines, i):
+            yield from flush_paragraph()
+            yield "list_item", line
+        elif is_heading(line):
+            yield from flush_paragraph()
+            yield "heading", line
+        else:
+            paragraph.append(line)
+
+    yield from flush_paragraph()
+
+
+def split_long_word(word, max_tokens):
+    """Cut a single word larger than max_tokens (a long URL, an encoded blob) into pieces that fit."""
+    step = max(1, len(word) * max_tokens // count_tokens(word))
+    start = 0
+    while start < len(word):
+        piece = word[start:start + step]
+        while len(piece) > 1 and count_tokens(piece) > max_tokens:
+            piece = piece[:len(piece) // 2]
+        yield piece, count_tokens(piece)
+        start += len(piece)
+
+
+def split_long_unit(text, max_tokens):
+    """Split a single unit larger than max_tokens at word boundaries, and inside words that don't fit alone."""
+    piece, piece_tokens = [], 0
+    for word in text.split():
+        word_tokens = count_tokens(word)
+        parts = split_long_word(word, max_tokens) if word_tokens > max_tokens else [(word, word_tokens)]
+        for part, part_tokens in parts:
+            if piece and piece_tokens + part_tokens > max_tokens:
+                yield " ".join(piece), piece_tokens
+                piece, piece_tokens = [], 0
+            piece.append(part)
+            piece_tokens += part_tokens
+    if piece:
+        yield " ".join(piece), piece_tokens
+
+
+def iter_chunks(text, chunk_size=300, overlap=50):
+    """
+    Stream token-sized chunks from text in a single pass.
+
+    Units (sentences, list items, headings) are accumulated until adding
+    the next one would exceed chunk_size tokens. The tail of each chunk,
+    up to overlap tokens, is carried into the next one. A heading always
+    starts a new chunk so sections don't bleed into each other.
+    """
+    current = []  # list of (text, tokens)
+    current_tokens = 0
+
+    def emit():
+        return "\n".join(unit for unit, _ in current)
+
+    def carry_overlap():
+        carried, carried_tokens = [], 0
+        for unit, tokens in reversed(current):
+            if carried_tokens + tokens > overlap:
+                break
+            carried.insert(0, (unit, tokens))
+            carried_tokens += tokens
+        return carried, carried_tokens
+
+    for kind, unit in iter_units(text):
+        unit_tokens = count_tokens(unit)
+
+        if kind == "heading" and current:
+            yield emit()
+            current, current_tokens = [], 0
+
+        pieces = split_long_unit(unit, chunk_size) if unit_tokens > chunk_size else [(unit, unit_tokens)]
+        for piece, piece_tokens in pieces:
+            if current and current_tokens + piece_tokens > chunk_size:
+                yield emit()
+                current, current_tokens = carry_overlap()
+                # Drop the overlap if it leaves no room for the next piece
+                if current_tokens + piece_tokens > chunk_size:
+                    current, current_tokens = [], 0
+            current.append((piece, piece_tokens))
+            current_tokens += piece_tokens
+
+    if current:
+        yield emit()
+
+
+def simhash(text, bits=64):
+    """64-bit SimHash over word 3-shingles of the normalized text."""
+    words = normalize_chunk(text).split()
+    shingles = [" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))]
+    weights = [0] * bits
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.md5(shingle.encode("utf-8")).digest()[:8], "big")
+        for bit in range(bits):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(bits) if weights[bit] > 0)
+
+
+def dedupe_chunks(chunks, max_distance=3):
+    """
+    Drop chunks that are exact or near duplicates of an earlier chunk.
+
+    Fingerprints are bucketed by 16-bit bands: two fingerprints within
+    max_distance (< 4) bits of each other must share at least one band,
+    so each chunk is only compared against a handful of candidates.
+    """
+    seen_exact = set()
+    bands = {}
+    fingerprints = []
+    unique = []
+    dropped = 0
+
+    for chunk in chunks:
+        normalized = normalize_chunk(chunk)
+        if not normalized or normalized in seen_exact:
+            dropped += 1
+            continue
+
+        fingerprint = simhash(chunk)
+        keys = [(band, fingerprint >> (band * 16) & 0xFFFF) for band in range(4)]
+        candidates = {index for key in keys for index in bands.get(key, ())}
+        if any(bin(fingerprint ^ fingerprints[index]).count("1") <= max_distance for index in candidates):
+            dropped += 1
+            continue
+
+        seen_exact.add(normalized)
+        for key in keys:
+            bands.setdefault(key, []).append(len(fingerprints))
+        fingerprints.append(fingerprint)
+        unique.append(chunk)
+
+    if dropped:
+        logger.info(f"Dropped {dropped} duplicate chunks, kept {len(unique)}")
+    return unique
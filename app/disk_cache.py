@@ -0,0 +1,114 @@
+# app/disk_cache.py
+
+import os
+import json
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCache:
+    """
+    Bounded JSON cache on disk, shared by every worker on the host.
+
+    Each entry is one file named after the hash of its key. Reads bump
+    the file's mtime, and eviction removes the least recently used files
+    once max_entries or max_bytes is exceeded. Hit/miss counters are per
+    process.
+    """
+
+    def __init__(self, directory, max_entries=10000, max_bytes=50 * 1024 * 1024, evict_every=50):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, key, count=True):
+        """
+        Return the cached value for key, or None. With count=False the
+        hit/miss counters are left alone, for a lookup that falls through
+        to another key and should be counted once (see record).
+        """
+        path = self.path(key)
+        try:
+            with open(path, 'r') as f:
+                value = json.load(f)
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            value = None
+        if count:
+            self.record(value is not None)
+        return value
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def set(self, key, value):
+        """Store value under key (atomic write), evicting old entries now and then."""
+        path = self.path(key)
+        temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp, 'w') as f:
+                json.dump(value, f)
+            os.replace(temp, path)
+        except OSError as e:
+            logger.warning(f"Could not write cache entry in {self.directory}: {e}")
+            return
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % self.evict_every == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until both limits hold (with 10% headroom)."""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        if len(entries) <= self.max_entries and total <= self.max_bytes:
+            return
+
+        entries.sort()
+        target_entries = int(self.max_entries * 0.9)
+        target_bytes = int(self.max_bytes * 0.9)
+        removed = 0
+        for _, size, path in entries:
+            if len(entries) - removed <= target_entries and total <= target_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            removed += 1
+            total -= size
+        with self._lock:
+            self.evictions += removed
+        logger.info(f"Evicted {removed} entries from {self.directory}")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+        }
@@ -3,12 +3,11 @@
 import re
 import random
 import logging
-from openai import OpenAI
-import os
 from app.message_splitting import ai_split_message
+from app.llm_gateway import chat_completion
+from app import local_humanizer
 
 logger = logging.getLogger(__name__)
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 def humanize_ai_response(original_response):
     """
@@ -20,6 +19,9 @@ def humanize_ai_response(original_response):
     Returns:
         list: A list of dictionaries with messages and suggested typing/sending delays
     """
+    if local_humanizer.use_local(original_response):
+        return local_humanizer.humanize(original_response)
+
     # Use AI to split the response into natural conversation chunks
     prompt = f"""
     Convert the following AI message into a natural, human-like conversation as if typed by a real person.
@@ -44,8 +46,9 @@ def humanize_ai_response(original_response):
     """
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
+        response = chat_completion(
+            "humanize",
+            model=local_humanizer.HUMANIZE_MODEL,
             messages=[
                 {"role": "system", "content": "You are an expert in human conversation patterns who converts robotic AI responses into natural chat messages."},
                 {"role": "user", "content": prompt}
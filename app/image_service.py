@@ -0,0 +1,116 @@
+# app/image_service.py
+
+import io
+import os
+import math
+import base64
+import hashlib
+import logging
+import requests
+from .disk_cache import DiskCache
+from .retrieval_gate import normalize
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; images are then sent as downloaded
+    Image = None
+
+# Images are downloaded once, shrunk so the longest side is at most
+# IMAGE_MAX_SIDE and re-encoded as JPEG before going to the vision model
+# inline, so it never fetches (and bills) the full-resolution original.
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", 1024))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", 85))
+IMAGE_DETAIL = os.getenv("IMAGE_DETAIL", "auto")  # "low" is a flat 85 tokens
+IMAGE_MAX_BYTES = 20 * 1024 * 1024
+IMAGE_DOWNLOAD_TIMEOUT = 15
+
+# Analyses keyed by a content hash of the image (of the downscaled pixels,
+# or of the downloaded bytes without Pillow) and the normalized question,
+# so the same picture asked about the same way is analysed once. Not a
+# perceptual hash: receipts and app screenshots share a layout and differ
+# only in text, and one customer's analysis must never answer another's.
+image_cache = DiskCache(
+    os.getenv("IMAGE_CACHE_DIR", "data/cache/images"),
+    max_entries=int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", 5000)),
+    max_bytes=int(float(os.getenv("IMAGE_CACHE_MAX_MB", 20)) * 1024 * 1024)
+)
+
+
+def download_image(url, timeout=IMAGE_DOWNLOAD_TIMEOUT):
+    """Download an image into memory, refusing anything over IMAGE_MAX_BYTES."""
+    data = bytearray()
+    with requests.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        for block in response.iter_content(64 * 1024):
+            data.extend(block)
+            if len(data) > IMAGE_MAX_BYTES:
+                raise ValueError(f"Image larger than {IMAGE_MAX_BYTES // (1024 * 1024)} MB")
+        content_type = response.headers.get("Content-Type", "image/jpeg").split(";")[0]
+    return bytes(data), content_type
+
+
+def vision_tokens(width, height, detail=IMAGE_DETAIL):
+    """Estimate the vision tokens for an image of this size (OpenAI's tiling rule)."""
+    if detail == "low":
+        return 85
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def prepare_image(url):
+    """
+    Download and shrink an image for the vision model.
+    Returns {"data_url", "hash", "bytes_in", "bytes_out", "tokens_in", "tokens_out"}.
+    """
+    data, content_type = download_image(url)
+    prepared = {"bytes_in": len(data), "tokens_in": None, "tokens_out": None}
+
+    if Image is None:
+        prepared["hash"] = "sha256:" + hashlib.sha256(data).hexdigest()
+    else:
+        image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+        prepared["tokens_in"] = vision_tokens(*image.size)
+
+        if image.mode in ("RGBA", "LA", "P"):
+            # Flatten transparency onto white; JPEG has no alpha channel
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.split()[-1])
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE), Image.LANCZOS)
+        pixels = hashlib.sha256(f"{image.size[0]}x{image.size[1]}:".encode())
+        pixels.update(image.tobytes())
+        prepared["hash"] = "pixels:" + pixels.hexdigest()
+
+        encoded = io.BytesIO()
+        image.save(encoded, format="JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+        prepared["tokens_out"] = vision_tokens(*image.size)
+        if encoded.tell() < len(data) or prepared["tokens_out"] < prepared["tokens_in"]:
+            data, content_type = encoded.getvalue(), "image/jpeg"
+        else:
+            prepared["tokens_out"] = prepared["tokens_in"]
+
+    prepared["bytes_out"] = len(data)
+    prepared["data_url"] = f"data:{content_type};base64,{base64.b64encode(data).decode('ascii')}"
+    return prepared
+
+
+def analysis_cache_key(prepared, question):
+    return f"{prepared['hash']}:{normalize(question or '')}"
+
+
+def log_prepared(prepared, elapsed):
+    tokens = ""
+    if prepared["tokens_in"] is not None:
+        tokens = f", ~{prepared['tokens_in']} -> {prepared['tokens_out']} vision tokens"
+    logger.info(
+        f"Image prepared in {elapsed:.2f}s: {prepared['bytes_in'] / 1024:.0f} KB -> "
+        f"{prepared['bytes_out'] / 1024:.0f} KB{tokens}"
+    )
@@ -0,0 +1,219 @@
+# app/knowledge_base.py
+
+import os
+import json
+import time
+import fcntl
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+from app.vector_index import build_index, load_index, normalize_rows
+from app import retrieval_gate
+
+logger = logging.getLogger(__name__)
+
+# Each ingestion publishes a complete version directory under KB_DIR and
+# then swaps the CURRENT pointer file with os.replace, so readers only
+# ever see fully written versions.
+KB_DIR = "data/kb"
+CURRENT_FILE = os.path.join(KB_DIR, "CURRENT")
+LOCK_FILE = os.path.join(KB_DIR, ".lock")
+KEEP_VERSIONS = int(os.getenv("KB_KEEP_VERSIONS", 3))
+
+# Vector index settings: "exact" scans every chunk, "ivf" only scans the
+# IVF_NPROBE closest of IVF_N_LISTS clusters (0 = pick from corpus size).
+VECTOR_INDEX = os.getenv("VECTOR_INDEX", "exact")
+IVF_N_LISTS = int(os.getenv("IVF_N_LISTS", 0))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", 8))
+IVF_MIN_VECTORS = int(os.getenv("IVF_MIN_VECTORS", 5000))
+
+# First-pass vector storage: "float32", "float16" (2x smaller) or "int8"
+# (4x smaller). Quantized searches re-rank top_k * RERANK_FACTOR candidates
+# against the exact float32 vectors, which stay on disk and are mmapped.
+VECTOR_STORE_DTYPE = os.getenv("VECTOR_STORE_DTYPE", "float32")
+RERANK_FACTOR = int(os.getenv("RERANK_FACTOR", 4))
+
+EMPTY = {"version": None, "chunks": [], "index": None, "vectors": None, "manifest": {}}
+
+# The version this process is serving. Replaced as a whole on reload, so
+# a caller holding a reference keeps a consistent view for its query.
+_current = EMPTY
+_load_lock = threading.Lock()
+
+
+def version_file(version, name):
+    return os.path.join(KB_DIR, version, name)
+
+
+def read_current_version():
+    try:
+        with open(CURRENT_FILE, 'r') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+@contextmanager
+def ingestion_lock(blocking=True):
+    """
+    Cross-process lock so only one gunicorn worker ingests at a time.
+    Yields False when blocking=False and another process holds it.
+    """
+    os.makedirs(KB_DIR, exist_ok=True)
+    with open(LOCK_FILE, 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def publish_version(embeddings, manifest):
+    """
+    Write a new knowledge base version and atomically make it current.
+
+    embeddings is a list of {"chunk", "embedding", "source"} dicts and
+    manifest maps each source PDF to its fingerprint.
+    """
+    version = datetime.now().strftime("v%Y%m%d-%H%M%S-%f")
+    staging = os.path.join(KB_DIR, f".{version}.tmp")
+    os.makedirs(staging)
+
+    if embeddings:
+        vectors = normalize_rows([item["embedding"] for item in embeddings])
+    else:
+        vectors = np.zeros((0, 1), dtype=np.float32)
+    kind = VECTOR_INDEX if len(vectors) >= IVF_MIN_VECTORS else "exact"
+    options = {"n_lists": IVF_N_LISTS or None, "nprobe": IVF_NPROBE} if kind == "ivf" else {}
+    index = build_index(vectors, kind, dtype=VECTOR_STORE_DTYPE, **options)
+
+    with open(os.path.join(staging, "embeddings.json"), 'w') as f:
+        json.dump(embeddings, f)
+    with open(os.path.join(staging, "chunks.json"), 'w') as f:
+        json.dump([item["chunk"] for item in embeddings], f)
+    with open(os.path.join(staging, "manifest.json"), 'w') as f:
+        json.dump(manifest, f)
+    np.save(os.path.join(staging, "vectors.npy"), vectors)
+    index.save(os.path.join(staging, "index.npz"))
+
+    # Directory rename and pointer replace are both atomic on POSIX
+    os.rename(staging, os.path.join(KB_DIR, version))
+    pointer = f"{CURRENT_FILE}.tmp"
+    with open(pointer, 'w') as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer, CURRENT_FILE)
+
+    logger.info(f"Published knowledge base {version}: {len(embeddings)} chunks, {index.kind}/{index.store.dtype} index")
+    prune_versions(version)
+    return version
+
+
+def prune_versions(current):
+    """
+    Delete all but the newest KEEP_VERSIONS versions (mmapped files stay
+    valid), plus staging directories left behind by a crashed ingestion;
+    callers hold the ingestion lock, so no staging directory is in use.
+    """
+    names = os.listdir(KB_DIR)
+    versions = sorted(name for name in names if name.startswith("v"))
+    stale = [name for name in names if name.startswith(".v") and name.endswith(".tmp")]
+    for name in versions[:-KEEP_VERSIONS] + stale:
+        if name != current:
+            shutil.rmtree(os.path.join(KB_DIR, name), ignore_errors=True)
+
+
+def load_version(version):
+    with open(version_file(version, "chunks.json"), 'r') as f:
+        chunks = json.load(f)
+    with open(version_file(version, "manifest.json"), 'r') as f:
+        manifest = json.load(f)
+    index = load_index(version_file(version, "index.npz"))
+    vectors = np.load(version_file(version, "vectors.npy"), mmap_mode="r")
+    if chunks:
+        logger.info(
+            f"Loaded knowledge base {version}: {len(chunks)} chunks, "
+            f"{index.store.nbytes / len(chunks):.0f} bytes/chunk in RAM ({index.store.dtype})"
+        )
+    return {"version": version, "chunks": chunks, "index": index, "vectors": vectors, "manifest": manifest}
+
+
+def current():
+    """
+    Return the knowledge base version this process should serve.
+    Costs one small file read per call; a new version is loaded once and
+    swapped in with a single reference assignment.
+    """
+    global _current
+    version = read_current_version()
+    if version is None or version == _current["version"]:
+        return _current if version else EMPTY
+
+    with _load_lock:
+        if version != _current["version"]:
+            try:
+                loaded = load_version(version)
+                # Build the lexical fallback now rather than in the first request that needs it
+                retrieval_gate.get_lexical_index(loaded["chunks"])
+                _current = loaded
+            except FileNotFoundError:
+                # Pruned between the pointer read and the load; next call retries
+                logger.warning(f"Knowledge base {version} disappeared while loading")
+    return _current
+
+
+def load_embeddings():
+    """Return the raw embeddings of the current version."""
+    version = read_current_version()
+    if version is None:
+        return []
+    with open(version_file(version, "embeddings.json"), 'r') as f:
+        return json.load(f)
+
+
+def snapshot(pdf_dir):
+    """Cheap fingerprint of the PDF folder: size and mtime of each file."""
+    files = {}
+    for name in sorted(os.listdir(pdf_dir)) if os.path.isdir(pdf_dir) else []:
+        if name.lower().endswith(".pdf"):
+            stat = os.stat(os.path.join(pdf_dir, name))
+            files[name] = [stat.st_size, stat.st_mtime_ns]
+    return files
+
+
+def published_snapshot():
+    return {name: entry["stat"] for name, entry in current()["manifest"].items()}
+
+
+def start_watcher(pdf_dir, reindex, interval):
+    """
+    Poll pdf_dir every interval seconds and call reindex() when its
+    contents differ from the current version's manifest. Every worker
+    runs a watcher; the ingestion lock makes only one of them reindex,
+    so reindex must not take the lock itself.
+    """
+    def watch():
+        while True:
+            time.sleep(interval)
+            try:
+                if snapshot(pdf_dir) == published_snapshot():
+                    continue
+                with ingestion_lock(blocking=False) as acquired:
+                    # Re-check under the lock: another worker may have just published
+                    if acquired and snapshot(pdf_dir) != published_snapshot():
+                        logger.info(f"Change detected in {pdf_dir}, re-ingesting")
+                        reindex()
+            except Exception as e:
+                logger.error(f"Knowledge base watcher error: {e}")
+
+    thread = threading.Thread(target=watch, name="kb-watcher", daemon=True)
+    thread.start()
+    return thread
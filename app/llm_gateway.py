@@ -0,0 +1,334 @@
+# app/llm_gateway.py
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as FutureTimeout
+import httpx
+from openai import OpenAI, APIConnectionError, APITimeoutError, RateLimitError, InternalServerError
+from dotenv import load_dotenv
+from app import llm_metrics
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Every OpenAI call in the project goes through this module: one pooled
+# HTTP client, a timeout per kind of call and a process-wide cap on calls
+# in flight, so a slow provider can't hold a worker for the SDK default.
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 20))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 16))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 1))
+
+# Seconds per attempt for each call type; LLM_TIMEOUT_<TYPE> overrides
+CALL_TIMEOUTS = {
+    "reply": 20.0,
+    "vision": 30.0,
+    "humanize": 10.0,
+    "split": 10.0,
+    "embedding": float(os.getenv("EMBEDDING_TIMEOUT", 3)),  # query embeddings, on the reply path
+    "embedding_batch": 60.0,  # ingestion
+    "campaign_variants": 90.0,  # n= rewrites in one call
+}
+for call_type in CALL_TIMEOUTS:
+    if os.getenv(f"LLM_TIMEOUT_{call_type.upper()}"):
+        CALL_TIMEOUTS[call_type] = float(os.getenv(f"LLM_TIMEOUT_{call_type.upper()}"))
+
+# SDK retries per call type, where they differ from LLM_MAX_RETRIES. Query
+# embeddings have a lexical fallback, so a retry would only stretch
+# EMBEDDING_TIMEOUT into a multiple of itself on the reply path; replies
+# already have their own timeout budget and a canned answer on failure.
+CALL_RETRIES = {"embedding": 0, "reply": 0}
+
+# Call types that give up after a timeout instead of trying the fallback
+# models: the user is already waiting, and a second full timeout on another
+# model doubles that wait. The timeout still counts against the breaker.
+NO_FALLBACK_ON_TIMEOUT = {"reply"}
+
+# Hedged requests: when a call of a hedged type is still running after the
+# p95 latency of its last LATENCY_WINDOW calls, a second identical attempt
+# is fired and whichever answers first wins. Off by default (it can double
+# the cost of the slowest 5% of calls).
+LLM_HEDGE = os.getenv("LLM_HEDGE", "false").lower() in ("true", "1", "t")
+HEDGED_CALLS = set(filter(None, os.getenv("LLM_HEDGE_CALLS", "reply,embedding").split(",")))
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+# Circuit breakers, one per endpoint and model: over the last BREAKER_WINDOW
+# seconds, once BREAKER_MIN_CALLS calls were made and at least
+# BREAKER_FAILURE_RATE of them failed or took longer than BREAKER_SLOW_RATIO
+# of their timeout, the breaker opens and calls skip that model for
+# BREAKER_COOLDOWN seconds. Then a single probe call decides whether it
+# closes again.
+BREAKER_WINDOW = float(os.getenv("BREAKER_WINDOW", 60))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", 10))
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", 0.5))
+BREAKER_SLOW_RATIO = 0.8
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", 30))
+
+# Models tried, in order, when a model's breaker is open or its call fails
+# with a provider error. LLM_MODEL_FALLBACKS="gpt-4o-mini=gpt-4.1-mini,gpt-3.5-turbo;..."
+MODEL_FALLBACKS = {"gpt-4o-mini": ["gpt-3.5-turbo"]}
+for entry in filter(None, os.getenv("LLM_MODEL_FALLBACKS", "").split(";")):
+    primary, _, fallbacks = entry.partition("=")
+    MODEL_FALLBACKS[primary.strip()] = [model.strip() for model in fallbacks.split(",") if model.strip()]
+
+# Provider-side failures: they count against the breaker and move on to the
+# next model. Anything else (bad request, auth) is raised as is.
+PROVIDER_ERRORS = (APIConnectionError, RateLimitError, InternalServerError)
+
+_client = None
+_clients = {}
+_client_lock = threading.Lock()
+_semaphore = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+_latencies = {}
+_latency_lock = threading.Lock()
+_hedge_pool = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY * 2, thread_name_prefix="llm")
+
+
+class ConcurrencyLimitError(RuntimeError):
+    pass
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """Rolling error/latency window for one endpoint and model."""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = deque()  # (time, failed)
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go through now; lets one probe through after the cooldown."""
+        with self.lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.time() - self.opened_at >= BREAKER_COOLDOWN:
+                self.state = "half_open"
+            if self.state == "half_open" and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def record(self, failed):
+        now = time.time()
+        with self.lock:
+            if self.state == "half_open":
+                self.probing = False
+                if failed:
+                    self.trip(now)
+                else:
+                    self.state = "closed"
+                    self.calls.clear()
+                    logger.info(f"Circuit {self.name} closed")
+                return
+
+            self.calls.append((now, failed))
+            while self.calls and now - self.calls[0][0] > BREAKER_WINDOW:
+                self.calls.popleft()
+            failures = sum(failed for _, failed in self.calls)
+            if (self.state == "closed" and len(self.calls) >= BREAKER_MIN_CALLS
+                    and failures / len(self.calls) >= BREAKER_FAILURE_RATE):
+                self.trip(now)
+
+    def release(self):
+        """Free the probe slot when the probe ended without a verdict (e.g. a bad request)."""
+        with self.lock:
+            if self.state == "half_open":
+                self.probing = False
+
+    def trip(self, now):
+        self.state = "open"
+        self.opened_at = now
+        self.calls.clear()
+        logger.warning(f"Circuit {self.name} opened for {BREAKER_COOLDOWN:.0f}s")
+
+    def status(self):
+        with self.lock:
+            return {
+                "state": self.state,
+                "calls": len(self.calls),
+                "failures": sum(failed for _, failed in self.calls),
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def breaker_name(endpoint, model):
+    return f"{endpoint}:{model}"
+
+
+def get_status():
+    """Breaker states and recent p95 latency per call type, for the admin endpoint."""
+    with _breakers_lock:
+        breakers = {name: breaker.status() for name, breaker in _breakers.items()}
+    return {
+        "breakers": breakers,
+        "p95_latency": {call_type: latency_percentile(call_type) for call_type in list(_latencies)},
+    }
+
+
+def get_client(call_type=None):
+    """
+    The shared OpenAI client, created on first use. For call types in
+    CALL_RETRIES, a copy (same connection pool) with their retry count.
+    """
+    global _client
+    if call_type in CALL_RETRIES:
+        if call_type not in _clients:
+            _clients[call_type] = get_client().with_options(max_retries=CALL_RETRIES[call_type])
+        return _clients[call_type]
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=LLM_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                        keepalive_expiry=60
+                    ),
+                    timeout=httpx.Timeout(max(CALL_TIMEOUTS.values()), connect=5.0)
+                )
+                _client = OpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    base_url=OPENAI_BASE_URL,
+                    http_client=http_client,
+                    max_retries=LLM_MAX_RETRIES
+                )
+    return _client
+
+
+def record_latency(call_type, seconds):
+    with _latency_lock:
+        _latencies.setdefault(call_type, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+
+def latency_percentile(call_type, percentile=95):
+    """Latency percentile over the recent successful calls of a type, or None."""
+    with _latency_lock:
+        samples = sorted(_latencies.get(call_type, ()))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    return samples[min(len(samples) - 1, int(len(samples) * percentile / 100))]
+
+
+def attempt(call_type, send, timeout, breaker=None, acquired=False, model=None):
+    """One call under the concurrency limit; records its latency, usage and outcome."""
+    if not acquired and not _semaphore.acquire(timeout=timeout):
+        raise ConcurrencyLimitError(f"{LLM_MAX_CONCURRENCY} LLM calls already in flight")
+    try:
+        start = time.time()
+        try:
+            response = send(get_client(call_type), timeout)
+        except Exception as e:
+            llm_metrics.record(call_type, model, time.time() - start, error=e)
+            if breaker and isinstance(e, PROVIDER_ERRORS):
+                breaker.record(failed=True)
+            raise
+        elapsed = time.time() - start
+        llm_metrics.record(call_type, getattr(response, "model", None) or model, elapsed, getattr(response, "usage", None))
+        record_latency(call_type, elapsed)
+        if breaker:
+            breaker.record(failed=elapsed > BREAKER_SLOW_RATIO * timeout)
+        return response
+    finally:
+        _semaphore.release()
+
+
+def request(call_type, send, breaker=None, model=None):
+    """
+    Run send(client, timeout) for a call type, hedging it when enabled.
+    send must be safe to run twice (all our calls are reads).
+    """
+    timeout = CALL_TIMEOUTS[call_type]
+    threshold = latency_percentile(call_type) if LLM_HEDGE and call_type in HEDGED_CALLS else None
+    if threshold is None:
+        return attempt(call_type, send, timeout, breaker, model=model)
+
+    first = _hedge_pool.submit(attempt, call_type, send, timeout, breaker, model=model)
+    try:
+        return first.result(timeout=threshold)
+    except FutureTimeout:
+        pass
+    # Only hedge with spare capacity; under load the extra call would queue anyway
+    if not _semaphore.acquire(blocking=False):
+        return first.result()
+    logger.info(f"Hedging {call_type} call after {threshold:.2f}s (p95)")
+    pending = {first, _hedge_pool.submit(attempt, call_type, send, timeout, breaker, acquired=True, model=model)}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = error or future.exception()
+    raise error
+
+
+def with_fallbacks(endpoint, call_type, models, make_send):
+    """
+    Try each model in order, skipping those whose breaker is open and
+    moving on after provider errors. Raises CircuitOpenError at once when
+    every breaker is open, so callers can go straight to local fallbacks.
+    """
+    error = None
+    for model in models:
+        breaker = get_breaker(breaker_name(endpoint, model))
+        if not breaker.allow():
+            continue
+        try:
+            response = request(call_type, make_send(model), breaker, model)
+        except PROVIDER_ERRORS as e:
+            logger.warning(f"{call_type} call to {model} failed: {e}")
+            if isinstance(e, APITimeoutError) and call_type in NO_FALLBACK_ON_TIMEOUT:
+                raise
+            error = e
+            continue
+        except Exception:
+            breaker.release()
+            raise
+        if model != models[0]:
+            logger.info(f"{call_type} call served by fallback model {model}")
+        return response
+    if error is not None:
+        raise error
+    raise CircuitOpenError(f"Circuit open for {endpoint} models {', '.join(models)}")
+
+
+def model_chain(model, fallbacks):
+    return [model] + (MODEL_FALLBACKS.get(model, []) if fallbacks is None else list(fallbacks))
+
+
+def chat_completion(call_type, model, fallbacks=None, **kwargs):
+    """
+    client.chat.completions.create through the gateway. fallbacks
+    overrides the configured fallback models ([] for none).
+    """
+    def make_send(name):
+        return lambda client, timeout: client.chat.completions.create(model=name, timeout=timeout, **kwargs)
+    return with_fallbacks("chat", call_type, model_chain(model, fallbacks), make_send)
+
+
+def embedding(call_type, model, **kwargs):
+    """client.embeddings.create through the gateway (no fallback: vectors must match the index)."""
+    def make_send(name):
+        return lambda client, timeout: client.embeddings.create(model=name, timeout=timeout, **kwargs)
+    return with_fallbacks("embeddings", call_type, [model], make_send)
@@ -0,0 +1,158 @@
+# app/llm_metrics.py
+
+import os
+import json
+import time
+import atexit
+import sqlite3
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# One record per OpenAI call (every attempt, including hedges and failed
+# fallbacks) is kept in a ring buffer for rolling aggregates and appended
+# to LLM_METRICS_FILE every LLM_METRICS_FLUSH_INTERVAL seconds. The file is
+# JSONL, or SQLite (table llm_calls) when it ends in .db or .sqlite.
+LLM_METRICS_BUFFER = int(os.getenv("LLM_METRICS_BUFFER", 5000))
+LLM_METRICS_FILE = os.getenv("LLM_METRICS_FILE", "data/metrics/llm_calls.jsonl")
+LLM_METRICS_FLUSH_INTERVAL = float(os.getenv("LLM_METRICS_FLUSH_INTERVAL", 10))
+
+# USD per million tokens (input, output), for rough cost estimates only
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "text-embedding-3-small": (0.02, 0.0),
+}
+
+FIELDS = ("time", "call_site", "model", "latency", "prompt_tokens", "completion_tokens", "error")
+
+_records = deque(maxlen=LLM_METRICS_BUFFER)
+_pending = []
+_totals = {}
+_lock = threading.Lock()
+_flusher = None
+
+
+def price(model, prompt_tokens, completion_tokens):
+    if not model:
+        return 0.0
+    for name, (input_price, output_price) in MODEL_PRICES.items():
+        # Responses name dated snapshots ("gpt-4o-mini-2024-07-18")
+        if model == name or model.startswith(name + "-"):
+            return (prompt_tokens * input_price + completion_tokens * output_price) / 1e6
+    return 0.0
+
+
+def record(call_site, model, latency, usage=None, error=None):
+    """Record one call. usage is the response's usage object (None on errors)."""
+    entry = {
+        "time": time.time(),
+        "call_site": call_site,
+        "model": model,
+        "latency": round(latency, 4),
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "error": type(error).__name__ if error is not None else None,
+    }
+    with _lock:
+        _records.append(entry)
+        if LLM_METRICS_FLUSH_INTERVAL > 0:
+            _pending.append(entry)
+        totals = _totals.setdefault(call_site, {"calls": 0, "errors": 0, "prompt_tokens": 0,
+                                                "completion_tokens": 0, "cost_usd": 0.0})
+        totals["calls"] += 1
+        totals["errors"] += error is not None
+        totals["prompt_tokens"] += entry["prompt_tokens"]
+        totals["completion_tokens"] += entry["completion_tokens"]
+        totals["cost_usd"] += price(model, entry["prompt_tokens"], entry["completion_tokens"])
+    start_flusher()
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else None
+
+
+def summary(window=None):
+    """
+    Aggregates per call site over the buffered calls of the last window
+    seconds (all buffered calls when None), plus per-process totals.
+    """
+    since = time.time() - window if window else 0
+    with _lock:
+        records = [entry for entry in _records if entry["time"] >= since]
+        totals = {site: dict(values, cost_usd=round(values["cost_usd"], 6)) for site, values in _totals.items()}
+
+    sites = {}
+    for entry in records:
+        sites.setdefault(entry["call_site"], []).append(entry)
+    report = {}
+    for site, entries in sorted(sites.items()):
+        latencies = sorted(entry["latency"] for entry in entries if entry["error"] is None)
+        prompt_tokens = sum(entry["prompt_tokens"] for entry in entries)
+        completion_tokens = sum(entry["completion_tokens"] for entry in entries)
+        models = {}
+        for entry in entries:
+            models[entry["model"]] = models.get(entry["model"], 0) + 1
+        report[site] = {
+            "calls": len(entries),
+            "errors": sum(entry["error"] is not None for entry in entries),
+            "p50_latency": percentile(latencies, 0.5),
+            "p95_latency": percentile(latencies, 0.95),
+            "total_latency": round(sum(latencies), 2),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost_usd": round(sum(
+                price(entry["model"], entry["prompt_tokens"], entry["completion_tokens"]) for entry in entries
+            ), 6),
+            "models": models,
+        }
+    return {"window_seconds": window, "buffered_calls": len(records), "call_sites": report, "totals": totals}
+
+
+def flush():
+    """Append the calls recorded since the last flush to LLM_METRICS_FILE."""
+    global _pending
+    with _lock:
+        pending, _pending = _pending, []
+    if not pending:
+        return
+    try:
+        os.makedirs(os.path.dirname(LLM_METRICS_FILE) or ".", exist_ok=True)
+        if LLM_METRICS_FILE.endswith((".db", ".sqlite")):
+            with sqlite3.connect(LLM_METRICS_FILE, timeout=10) as db:
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_calls (time REAL, call_site TEXT, model TEXT, latency REAL, "
+                    "prompt_tokens INTEGER, completion_tokens INTEGER, error TEXT)"
+                )
+                db.executemany(
+                    "INSERT INTO llm_calls VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [tuple(entry[field] for field in FIELDS) for entry in pending]
+                )
+            db.close()
+        else:
+            # One write call, so lines from several workers don't interleave
+            with open(LLM_METRICS_FILE, 'a') as f:
+                f.write("".join(json.dumps(entry) + "\n" for entry in pending))
+    except Exception as e:
+        logger.error(f"Failed to flush {len(pending)} LLM metrics records: {e}")
+
+
+def start_flusher():
+    global _flusher
+    if _flusher is not None or LLM_METRICS_FLUSH_INTERVAL <= 0:
+        return
+    with _lock:
+        if _flusher is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(LLM_METRICS_FLUSH_INTERVAL)
+                flush()
+
+        _flusher = threading.Thread(target=run, name="llm-metrics", daemon=True)
+        _flusher.start()
+        atexit.register(flush)
@@ -0,0 +1,141 @@
+# app/local_humanizer.py
+
+import os
+import re
+import random
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# When to split replies locally instead of asking the model:
+#   "always" - never call the model for humanizing/splitting
+#   "short"  - locally for replies up to HUMANIZER_SHORT_CHARS characters
+#   "slow"   - locally while the model's humanize p95 is above
+#              HUMANIZER_SLOW_SECONDS or its circuit is not closed
+#   "never"  - always use the model (default)
+HUMANIZER_POLICY = os.getenv("HUMANIZER_POLICY", "never")
+HUMANIZER_SHORT_CHARS = int(os.getenv("HUMANIZER_SHORT_CHARS", 300))
+HUMANIZER_SLOW_SECONDS = float(os.getenv("HUMANIZER_SLOW_SECONDS", 2.5))
+# Model behind the humanize and split calls, whose breaker the "slow" policy watches
+HUMANIZE_MODEL = "gpt-4o-mini"
+
+# Typing model: characters per second with +-JITTER, plus a pause between
+# messages that grows a little with the length of the next one. Delays are
+# clamped to the same ranges humanize_ai_response enforces.
+TYPING_CPS = float(os.getenv("HUMANIZER_TYPING_CPS", 14))
+JITTER = 0.2
+TYPING_DELAY_RANGE = (1, 6)
+SEND_DELAY_RANGE = (1, 4)
+
+MAX_CHUNK_CHARS = 160
+MAX_SENTENCES = 3
+MAX_CHUNKS = 6
+
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?…])\s+(?=\S)")
+# A bullet needs a space after it, so "*Oferta*" (WhatsApp bold) and
+# "1.5 litros" stay prose; emoji bullets can't be mistaken for either
+LIST_ITEM_PATTERN = re.compile(r"^\s*([-•*▪◦]\s+|\d+[.)]\s+|[✅👉]\s*)")
+# Pictographs, dingbats and flags, plus the joiners and modifiers they combine with
+EMOJI_ONLY_PATTERN = re.compile(
+    "^[\\s\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF\uFE0F\u200D\U0001F1E6-\U0001F1FF]+$"
+)
+
+
+def use_local(text):
+    """Whether the policy says to humanize/split this reply locally."""
+    if HUMANIZER_POLICY == "always":
+        return True
+    if HUMANIZER_POLICY == "short":
+        return len(text) <= HUMANIZER_SHORT_CHARS
+    if HUMANIZER_POLICY == "slow":
+        from app import llm_gateway
+        p95 = llm_gateway.latency_percentile("humanize")
+        return (p95 is not None and p95 > HUMANIZER_SLOW_SECONDS) or (
+            llm_gateway.get_breaker(llm_gateway.breaker_name("chat", HUMANIZE_MODEL)).state != "closed"
+        )
+    return False
+
+
+def blocks(text):
+    """
+    Paragraphs of the reply, with list items kept together and a line
+    ending in ":" kept with the list it introduces.
+    """
+    result = []
+    for paragraph in re.split(r"\n\s*\n", text.strip()):
+        lines = [line.strip() for line in paragraph.split("\n") if line.strip()]
+        if not lines:
+            continue
+        if len(lines) > 1 and (
+            any(LIST_ITEM_PATTERN.match(line) for line in lines) or lines[0].endswith(":")
+        ):
+            result.append(("list", "\n".join(lines)))
+        else:
+            result.append(("text", " ".join(lines)))
+    return result
+
+
+def sentences(text):
+    """Split prose into sentences, folding emoji-only fragments into the previous one."""
+    parts = []
+    for sentence in SENTENCE_PATTERN.split(text):
+        if parts and EMOJI_ONLY_PATTERN.match(sentence):
+            parts[-1] += " " + sentence
+        else:
+            parts.append(sentence)
+    return parts
+
+
+def segment(text, max_chars=MAX_CHUNK_CHARS, max_chunks=MAX_CHUNKS):
+    """Split a reply into WhatsApp-sized messages at paragraph and sentence boundaries."""
+    chunks = []
+    for kind, block in blocks(text):
+        if kind == "list":
+            # Keep a list in one message unless it's too long, then cut between items
+            current = []
+            for line in block.split("\n"):
+                if current and len("\n".join(current + [line])) > max_chars:
+                    chunks.append("\n".join(current))
+                    current = []
+                current.append(line)
+            chunks.append("\n".join(current))
+            continue
+        current = []
+        for sentence in sentences(block):
+            candidate = " ".join(current + [sentence])
+            if current and (len(candidate) > max_chars or len(current) >= MAX_SENTENCES):
+                chunks.append(" ".join(current))
+                current = []
+            current.append(sentence)
+        if current:
+            chunks.append(" ".join(current))
+
+    # Too many bubbles reads as spam: merge the shortest neighbouring pair
+    while len(chunks) > max_chunks:
+        sizes = [len(chunks[i]) + len(chunks[i + 1]) for i in range(len(chunks) - 1)]
+        i = sizes.index(min(sizes))
+        separator = "\n" if "\n" in chunks[i] or "\n" in chunks[i + 1] else " "
+        chunks[i:i + 2] = [chunks[i] + separator + chunks[i + 1]]
+    return chunks
+
+
+def humanize(text):
+    """
+    Local equivalent of humanize_ai_response: the same list of
+    {"message", "typing_delay", "send_delay"} dicts. Jitter is seeded from
+    the text, so the same reply always gets the same delays.
+    """
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).hexdigest())
+    chunks = segment(text) or [text]
+    result = []
+    for i, message in enumerate(chunks):
+        typing = len(message) / TYPING_CPS * rng.uniform(1 - JITTER, 1 + JITTER)
+        following = len(chunks[i + 1]) if i + 1 < len(chunks) else 0
+        pause = (1.0 + following / 200) * rng.uniform(1 - JITTER, 1 + JITTER)
+        result.append({
+            "message": message,
+            "typing_delay": round(min(max(typing, TYPING_DELAY_RANGE[0]), TYPING_DELAY_RANGE[1]), 1),
+            "send_delay": round(min(max(pause, SEND_DELAY_RANGE[0]), SEND_DELAY_RANGE[1]), 1),
+        })
+    return result
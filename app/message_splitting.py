@@ -1,14 +1,12 @@
-import os
 import re
 import logging
-from openai import OpenAI
 from dotenv import load_dotenv
+from app.llm_gateway import chat_completion
+from app import local_humanizer
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
 def ai_split_message(message, max_length=280):
     """
     Use AI to split a message into multiple parts, each no longer than max_length.
@@ -16,6 +14,8 @@ def ai_split_message(message, max_length=280):
     """
     if len(message) <= max_length:
         return [message]
+    if local_humanizer.use_local(message):
+        return split_message(message, max_length)
 
     prompt = f"""
     Split the following message into multiple parts. Each part should be no longer than {max_length} characters. 
@@ -33,8 +33,9 @@ def ai_split_message(message, max_length=280):
     """
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
+        response = chat_completion(
+            "split",
+            model=local_humanizer.HUMANIZE_MODEL,
             messages=[
                 {"role": "system", "content": "You are a helpful assistant that splits long messages into shorter, logical parts."},
                 {"role": "user", "content": prompt}
@@ -56,8 +57,8 @@ def ai_split_message(message, max_length=280):
 
     except Exception as e:
         logger.error(f"Error using AI to split message: {str(e)}")
-        # Fallback to a simple split if AI splitting fails
-        return [message[i:i+max_length] for i in range(0, len(message), max_length)]
+        # Fallback to local sentence-aware splitting (also taken at once while the circuit is open)
+        return split_message(message, max_length)
 
 def split_message(message, max_length=280):
     """
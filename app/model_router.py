@@ -0,0 +1,103 @@
+# app/model_router.py
+
+import os
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Generation settings per request class. Entries in MODEL_ROUTES_FILE
+# (JSON, same shape) override single fields, so the table can be tuned
+# from the stats below without a deploy.
+ROUTE_CLASSES = {
+    "small_talk": {"model": "gpt-4o-mini", "max_tokens": 120, "temperature": 0.8},
+    "first_contact": {"model": "gpt-4o-mini", "max_tokens": 250, "temperature": 0.7},
+    "question": {"model": "gpt-4o-mini", "max_tokens": 300, "temperature": 0.7},
+    "grounded": {"model": "gpt-4o-mini", "max_tokens": 400, "temperature": 0.4},
+    "long_message": {"model": "gpt-4o-mini", "max_tokens": 450, "temperature": 0.6},
+    "audio": {"model": "gpt-4o-mini", "max_tokens": 350, "temperature": 0.6},
+    "image": {"model": "gpt-4o-mini", "max_tokens": 300, "temperature": 0.6},
+}
+MODEL_ROUTES_FILE = os.getenv("MODEL_ROUTES_FILE", "data/model_routes.json")
+
+SMALL_TALK_WORDS = 6
+LONG_MESSAGE_WORDS = 80
+
+try:
+    with open(MODEL_ROUTES_FILE, "r") as f:
+        for name, settings in json.load(f).items():
+            ROUTE_CLASSES.setdefault(name, {}).update(settings)
+    logger.info(f"Loaded model routes from {MODEL_ROUTES_FILE}")
+except FileNotFoundError:
+    pass
+except Exception as e:
+    logger.error(f"Failed to load model routes: {e}")
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def classify(message, pdf_context="", origin="text", history_length=0, user_state=None):
+    """
+    Pick the request class from cheap local signals: where the message
+    came from, whether retrieval found context, its length and whether
+    this is the start of the conversation (history_length = earlier
+    user messages in the thread, user_state = the welcome flow state,
+    still "new_user" when the flow hasn't run for this number).
+    """
+    words = len(message.split())
+    if origin == "image":
+        return "image"
+    if pdf_context:
+        return "grounded"
+    if origin == "audio":
+        return "audio"
+    if words > LONG_MESSAGE_WORDS:
+        return "long_message"
+    if words <= SMALL_TALK_WORDS and "?" not in message:
+        return "small_talk"
+    if history_length == 0 or user_state == "new_user":
+        return "first_contact"
+    return "question"
+
+
+def route(message, pdf_context="", origin="text", history_length=0, user_state=None):
+    """Return (class name, generation settings) for a request."""
+    name = classify(message, pdf_context, origin, history_length, user_state)
+    return name, dict(ROUTE_CLASSES[name])
+
+
+def record(name, latency, usage=None, finish_reason=None):
+    """Fold one completion into the class's stats."""
+    with _stats_lock:
+        stats = _stats.setdefault(name, {
+            "requests": 0, "total_latency": 0.0, "max_latency": 0.0,
+            "prompt_tokens": 0, "completion_tokens": 0, "truncated": 0,
+        })
+        stats["requests"] += 1
+        stats["total_latency"] += latency
+        stats["max_latency"] = max(stats["max_latency"], latency)
+        if usage is not None:
+            stats["prompt_tokens"] += usage.prompt_tokens
+            stats["completion_tokens"] += usage.completion_tokens
+        if finish_reason == "length":
+            stats["truncated"] += 1
+
+
+def get_stats():
+    """Per-class averages; a high truncated share means max_tokens is too low."""
+    with _stats_lock:
+        report = {}
+        for name, stats in _stats.items():
+            requests = stats["requests"]
+            report[name] = {
+                "settings": ROUTE_CLASSES[name],
+                "requests": requests,
+                "avg_latency": round(stats["total_latency"] / requests, 3),
+                "max_latency": round(stats["max_latency"], 3),
+                "avg_prompt_tokens": round(stats["prompt_tokens"] / requests, 1),
+                "avg_completion_tokens": round(stats["completion_tokens"] / requests, 1),
+                "truncated": round(stats["truncated"] / requests, 3),
+            }
+        return report
@@ -1,15 +1,16 @@
 # app/openai_service.py
 
-import os
-from openai import OpenAI
-from .utils import check_if_thread_exists, store_thread, process_text_for_whatsapp, make_text_conversational
-from .pdf_service import load_embeddings, find_relevant_chunks
+import time
+from .utils import check_if_thread_exists, store_thread, process_text_for_whatsapp, make_text_conversational, get_user_state
+from .pdf_service import find_relevant_chunks, load_knowledge_base
+from .retrieval_gate import should_retrieve, lexical_search, record_retrieval, record_skip
+from .llm_gateway import chat_completion
+from . import model_router
+from .image_service import prepare_image, image_cache, analysis_cache_key, log_prepared, IMAGE_DETAIL
 import logging
 
 logger = logging.getLogger(__name__)
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
 # Load prompt
 try:
     with open("data/prompt.txt", "r") as f:
@@ -19,10 +20,15 @@ except Exception as e:
     logger.error(f"Failed to load prompt: {e}")
     prompt = "You are a helpful assistant."
 
-def generate_response(user_message, wa_id, image_url=None):
+def generate_response(user_message, wa_id, image_url=None, pdf_context=None, origin=None):
+    """
+    Reply to a user message. origin ("text", "audio" or "image") and the
+    retrieved context pick the model settings through the model router.
+    """
     try:
-        # Check if the query needs PDF context
-        pdf_context = query_pdfs(user_message)
+        # Check if the query needs PDF context, unless the caller already looked it up
+        if pdf_context is None:
+            pdf_context = query_pdfs(user_message)
         context = f"Context from PDFs:\n{pdf_context}\n" if pdf_context else ""
 
         # Add instruction to make responses more conversational
@@ -36,20 +42,31 @@ def generate_response(user_message, wa_id, image_url=None):
         if not thread_messages:
             thread_messages = [{"role": "system", "content": prompt}]
 
+        history_length = sum(1 for message in thread_messages if message["role"] == "user")
         thread_messages.append({"role": "user", "content": user_message})
-        
-        chat_completion = client.chat.completions.create(
-            model="gpt-4o-mini",
+
+        route, settings = model_router.route(
+            user_message, pdf_context, origin or ("image" if image_url else "text"), history_length,
+            get_user_state(wa_id)
+        )
+        start = time.time()
+        completion = chat_completion(
+            "reply",
+            model=settings["model"],
             messages=[
                 {"role": "system", "content": prompt + "\n\n" + conversational_instruction},
                 {"role": "assistant", "content": context},
                 {"role": "user", "content": user_message},
             ],
-            max_tokens=300,
-            temperature=0.7  # Increased temperature for more varied responses
+            max_tokens=settings["max_tokens"],
+            temperature=settings["temperature"]
+        )
+        model_router.record(
+            route, time.time() - start, getattr(completion, "usage", None), completion.choices[0].finish_reason
         )
+        logger.info(f"Reply routed as {route} ({settings['model']}, max_tokens={settings['max_tokens']})")
         
-        ai_response = chat_completion.choices[0].message.content
+        ai_response = completion.choices[0].message.content
         
         # Add to conversation history
         thread_messages.append({"role": "assistant", "content": ai_response})
@@ -62,6 +79,23 @@ def generate_response(user_message, wa_id, image_url=None):
         return "Desculpe, não consegui processar isso agora."
 
 def analyze_image(image_url, question):
+    """
+    Describe an image with the vision model. The image is downloaded and
+    shrunk here and sent inline; analyses are cached per image and question.
+    """
+    prepared = None
+    try:
+        start = time.time()
+        prepared = prepare_image(image_url)
+        log_prepared(prepared, time.time() - start)
+        cached = image_cache.get(analysis_cache_key(prepared, question))
+        if cached is not None:
+            logger.info(f"Image analysis cache hit ({prepared['hash']})")
+            return cached["text"]
+    except Exception as e:
+        # The model can still fetch the original URL itself
+        logger.warning(f"Could not prepare image, sending the URL instead: {e}")
+
     try:
         # Add conversational instruction for image analysis
         conversational_instruction = """
@@ -69,8 +103,10 @@ def analyze_image(image_url, question):
         Use simple language, short sentences, and an occasional emoji.
         """
         
-        response = client.chat.completions.create(
+        response = chat_completion(
+            "vision",
             model="gpt-4o-mini",
+            fallbacks=[],  # the fallback chat models can't read images
             messages=[
                 {
                     "role": "system",
@@ -80,20 +116,43 @@ def analyze_image(image_url, question):
                     "role": "user",
                     "content": [
                         {"type": "text", "text": question},
-                        {"type": "image_url", "image_url": {"url": image_url}}
+                        {"type": "image_url", "image_url": {
+                            "url": prepared["data_url"] if prepared else image_url,
+                            "detail": IMAGE_DETAIL
+                        }}
                     ]
                 }
             ],
             max_tokens=300,
             temperature=0.6
         )
-        return response.choices[0].message.content
+        analysis = response.choices[0].message.content
+        if prepared:
+            image_cache.set(analysis_cache_key(prepared, question), {"text": analysis})
+        return analysis
     except Exception as e:
         logger.error(f"Error analyzing image: {e}")
         return "Desculpe, não consegui analisar a imagem."
 
 def query_pdfs(user_query):
-    """Query the PDFs for relevant context."""
-    embeddings = load_embeddings()
-    relevant_chunks = find_relevant_chunks(user_query, embeddings)
+    """
+    Query the PDFs for relevant context.
+    Small talk is gated out locally, and a failed or slow embeddings call
+    falls back to BM25 over the same chunks.
+    """
+    current = load_knowledge_base()
+    chunks = current["chunks"]
+    retrieve, reason = should_retrieve(user_query, chunks)
+    if not retrieve:
+        record_skip(user_query, reason)
+        return ""
+
+    start = time.time()
+    try:
+        relevant_chunks = find_relevant_chunks(user_query, current=current)
+        record_retrieval(time.time() - start)
+        logger.info(f"Retrieval ({reason}) took {time.time() - start:.2f}s")
+    except Exception as e:
+        logger.warning(f"Vector retrieval failed after {time.time() - start:.2f}s ({e}), using lexical fallback")
+        relevant_chunks = lexical_search(user_query, chunks)
     return "\n".join(relevant_chunks)
\ No newline at end of file
@@ -1,29 +1,32 @@
 import os
-import json
+import shutil
+import hashlib
 import numpy as np
 from datetime import datetime
 from PyPDF2 import PdfReader
-from openai import OpenAI
-from sklearn.metrics.pairwise import cosine_similarity
-from app.utils import split_message
+from app.chunking import strip_repeated_lines, iter_chunks, dedupe_chunks
+from app.vector_index import ExactIndex, rerank
+from app import knowledge_base
+from app.llm_gateway import embedding
 import logging
-import glob
 
 logger = logging.getLogger(__name__)
-EMBEDDINGS_FILE = "data/embeddings.json"
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+PDF_DIR = "data/pdfs"
+CHUNK_SIZE_TOKENS = int(os.getenv("CHUNK_SIZE_TOKENS", 300))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", 50))
 
 def clear_embeddings():
     """Force clear all embeddings"""
-    if os.path.exists(EMBEDDINGS_FILE):
-        os.remove(EMBEDDINGS_FILE)
-        logger.info("Cleared existing embeddings file")
+    if os.path.exists(knowledge_base.CURRENT_FILE):
+        os.remove(knowledge_base.CURRENT_FILE)
+        logger.info("Cleared current knowledge base pointer")
 
 def generate_embeddings(text_chunks):
     """Generate embeddings for a list of text chunks."""
     embeddings = []
     for chunk in text_chunks:
-        response = client.embeddings.create(
+        response = embedding(
+            "embedding_batch",
             input=chunk,
             model="text-embedding-3-small"
         )
@@ -34,80 +37,148 @@ def generate_embeddings(text_chunks):
         })
     return embeddings
 
-def find_relevant_chunks(query, embeddings, top_k=3):
-    """Find the most relevant chunks for a query using cosine similarity."""
-    if not embeddings:
-        logger.warning("No embeddings found")
-        return []
-        
-    response = client.embeddings.create(
+def find_relevant_chunks(query, embeddings=None, top_k=3, current=None):
+    """
+    Find the most relevant chunks for a query using cosine similarity.
+
+    Searches the current knowledge base version (or the one passed as
+    current, so a caller that already holds it doesn't load it twice)
+    unless a list of embeddings is passed explicitly. With a quantized store the first
+    pass fetches top_k * RERANK_FACTOR candidates, which are re-scored
+    with the exact float32 vectors.
+    """
+    if embeddings is not None:
+        if not embeddings:
+            logger.warning("No embeddings found")
+            return []
+        chunks = [item["chunk"] for item in embeddings]
+        index = ExactIndex([item["embedding"] for item in embeddings])
+        exact_vectors = None
+    else:
+        # One reference for the whole query, even if a reload swaps versions meanwhile
+        current = current or load_knowledge_base()
+        if not current["chunks"]:
+            logger.warning("No embeddings found")
+            return []
+        chunks = current["chunks"]
+        index = current["index"]
+        exact_vectors = current["vectors"]
+
+    # Times out after EMBEDDING_TIMEOUT (not retried); the caller then falls back to lexical search
+    response = embedding(
+        "embedding",
         input=query,
         model="text-embedding-3-small"
     )
-    query_embedding = np.array(response.data[0].embedding)
-    
-    similarities = []
-    for item in embeddings:
-        chunk_embedding = np.array(item["embedding"])
-        similarity = cosine_similarity([query_embedding], [chunk_embedding])[0][0]
-        similarities.append((item["chunk"], similarity))
-    
-    similarities = sorted(similarities, key=lambda x: x[1], reverse=True)
-    return [chunk for chunk, _ in similarities[:top_k]]
+    query_embedding = np.array(response.data[0].embedding, dtype=np.float32)
 
-def extract_text_from_pdf(pdf_path):
+    if exact_vectors is not None and index.store.dtype != "float32":
+        candidate_ids, _ = index.search(query_embedding, top_k * knowledge_base.RERANK_FACTOR)
+        ids, _ = rerank(candidate_ids, query_embedding, exact_vectors, top_k)
+    else:
+        ids, _ = index.search(query_embedding, top_k)
+    return [chunks[i] for i in ids]
+
+def load_knowledge_base():
+    """Return the chunks, vector index and exact vectors of the current version."""
+    return knowledge_base.current()
+
+def extract_pages_from_pdf(pdf_path):
     reader = PdfReader(pdf_path)
-    text = ""
-    for page in reader.pages:
-        text += page.extract_text()
-    return text
+    return [page.extract_text() or "" for page in reader.pages]
 
-def chunk_text(text, chunk_size=500, overlap=50):
-    chunks = split_message(text, chunk_size)
-    return chunks
+def extract_text_from_pdf(pdf_path):
+    """Extract the text of a PDF with repeated headers/footers removed."""
+    pages = strip_repeated_lines(extract_pages_from_pdf(pdf_path))
+    return "\n\n".join(pages)
 
-def save_embeddings_to_file(embeddings):
-    os.makedirs(os.path.dirname(EMBEDDINGS_FILE), exist_ok=True)
-    with open(EMBEDDINGS_FILE, 'w') as f:
-        json.dump(embeddings, f)
-    logger.info(f"Embeddings saved to {EMBEDDINGS_FILE}")
+def chunk_text(text, chunk_size=CHUNK_SIZE_TOKENS, overlap=CHUNK_OVERLAP_TOKENS):
+    """Split text into overlapping token-sized chunks, dropping near duplicates."""
+    return dedupe_chunks(iter_chunks(text, chunk_size, overlap))
 
 def load_embeddings():
-    if not os.path.exists(EMBEDDINGS_FILE):
-        logger.warning("No embeddings file found - processing PDFs")
-        process_all_pdfs()
     try:
-        with open(EMBEDDINGS_FILE, 'r') as f:
-            return json.load(f)
+        return knowledge_base.load_embeddings()
     except Exception as e:
         logger.error(f"Error loading embeddings: {e}")
         return []
 
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def ingest_pdfs(force_refresh=False, pdf_dir=PDF_DIR):
+    """
+    Re-ingest the PDF folder and publish a new knowledge base version.
+
+    Embeddings of PDFs whose content hash is unchanged are reused from
+    the current version, so only new or modified files are chunked and
+    embedded. Returns None when nothing changed. Callers must hold
+    knowledge_base.ingestion_lock().
+    """
+    previous = {} if force_refresh else knowledge_base.current()["manifest"]
+    if previous and knowledge_base.snapshot(pdf_dir) == knowledge_base.published_snapshot():
+        logger.info("Knowledge base is up to date with the PDF folder")
+        return None
+
+    reusable = {}
+    if previous:
+        for item in load_embeddings():
+            reusable.setdefault(item.get("source"), []).append(item)
+
+    stats = knowledge_base.snapshot(pdf_dir)
+    # A deleted PDF may have owned chunks that were deduped away from the
+    # remaining ones, so re-chunk everything; embeddings are still reused
+    # by chunk text below
+    removed = set(previous) - set(stats)
+    if removed:
+        logger.info(f"Removed PDFs {', '.join(sorted(removed))}, re-chunking the remaining ones")
+    manifest = {}
+    kept, new_chunks = [], []
+    for name in stats:
+        sha256 = file_sha256(os.path.join(pdf_dir, name))
+        manifest[name] = {"sha256": sha256, "stat": stats[name]}
+        if not removed and previous.get(name, {}).get("sha256") == sha256 and name in reusable:
+            kept.extend(reusable[name])
+            continue
+        logger.info(f"Processing PDF: {name}")
+        text = extract_text_from_pdf(os.path.join(pdf_dir, name))
+        new_chunks.extend((name, chunk) for chunk in chunk_text(text))
+
+    # Dedupe across PDFs too, boilerplate is often shared between documents;
+    # kept chunks come first so only genuinely new text gets embedded
+    kept_texts = {item["chunk"] for item in kept}
+    unique = set(dedupe_chunks([item["chunk"] for item in kept] + [chunk for _, chunk in new_chunks]))
+    to_embed = {}
+    for name, chunk in new_chunks:
+        if chunk in unique and chunk not in kept_texts:
+            to_embed.setdefault(chunk, name)
+
+    cached = {item["chunk"]: item for items in reusable.values() for item in items}
+    reembedded = [dict(cached[chunk], source=name) for chunk, name in to_embed.items() if chunk in cached]
+    embeddings = generate_embeddings([chunk for chunk in to_embed if chunk not in cached])
+    for item in embeddings:
+        item["source"] = to_embed[item["chunk"]]
+
+    logger.info(f"Ingestion: reused {len(kept) + len(reembedded)} chunks, embedded {len(embeddings)} new chunks")
+    all_embeddings = kept + reembedded + embeddings
+    knowledge_base.publish_version(all_embeddings, manifest)
+    return all_embeddings
+
 def process_all_pdfs(force_refresh=True):
     """Process all PDFs in the pdfs directory"""
-    if force_refresh:
-        clear_embeddings()
-    
-    pdf_dir = "data/pdfs"
-    pdf_files = glob.glob(os.path.join(pdf_dir, "*.pdf"))
-    
-    all_embeddings = []
-    for pdf_file in pdf_files:
-        logger.info(f"Processing PDF: {pdf_file}")
-        text = extract_text_from_pdf(pdf_file)
-        chunks = chunk_text(text)
-        embeddings = generate_embeddings(chunks)
-        all_embeddings.extend(embeddings)
-    
-    save_embeddings_to_file(all_embeddings)
-    return all_embeddings
+    with knowledge_base.ingestion_lock():
+        return ingest_pdfs(force_refresh=force_refresh)
 
 def process_and_store_pdf(pdf_path):
-    """Process a single PDF and update embeddings"""
-    clear_embeddings()  # Force clear existing embeddings
-    
-    text = extract_text_from_pdf(pdf_path)
-    chunks = chunk_text(text)
-    embeddings = generate_embeddings(chunks)
-    save_embeddings_to_file(embeddings)
-    return embeddings
\ No newline at end of file
+    """Add a single PDF to the PDF folder and re-ingest, keeping the other sources"""
+    target = os.path.join(PDF_DIR, os.path.basename(pdf_path))
+    if os.path.abspath(pdf_path) != os.path.abspath(target):
+        os.makedirs(PDF_DIR, exist_ok=True)
+        shutil.copy2(pdf_path, target)
+    with knowledge_base.ingestion_lock():
+        ingest_pdfs()
+    return load_embeddings()
@@ -0,0 +1,45 @@
+# app/pipeline.py
+
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Shared by every request for stages that can run alongside each other
+# (e.g. retrieval while a long voice note is still being transcribed)
+PIPELINE_THREADS = int(os.getenv("PIPELINE_THREADS", 8))
+executor = ThreadPoolExecutor(max_workers=PIPELINE_THREADS, thread_name_prefix="pipeline")
+
+
+class StageTimer:
+    """
+    Times the stages of one message. Stages run inline with run() or on
+    the shared pool with submit(); log() reports each stage and the total,
+    so overlapping stages show up as a total below their sum.
+    """
+
+    def __init__(self, label):
+        self.label = label
+        self.started = time.time()
+        self.timings = {}
+
+    def run(self, name, function, *args, **kwargs):
+        start = time.time()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.timings[name] = time.time() - start
+
+    def submit(self, name, function, *args, **kwargs):
+        return executor.submit(self.run, name, function, *args, **kwargs)
+
+    def server_timing(self):
+        """The timings as a Server-Timing header value (milliseconds)."""
+        stages = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.timings.items()]
+        return ", ".join(stages + [f"total;dur={(time.time() - self.started) * 1000:.1f}"])
+
+    def log(self):
+        stages = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.timings.items())
+        logger.info(f"{self.label}: {stages}; total {(time.time() - self.started) * 1000:.0f}ms")
@@ -0,0 +1,178 @@
+# app/retrieval_gate.py
+
+import re
+import math
+import logging
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Messages that never need knowledge base context
+STOP_PHRASES = {
+    "oi", "ola", "opa", "eai", "e ai", "oie", "hey", "alo",
+    "bom dia", "boa tarde", "boa noite", "tudo bem", "tudo bom", "td bem", "tudo otimo",
+    "obrigado", "obrigada", "obg", "brigado", "brigada", "muito obrigado", "muito obrigada",
+    "valeu", "vlw", "tmj", "ok", "okay", "blz", "beleza", "certo", "ta bom", "ta", "ok obrigada",
+    "sim", "nao", "s", "n", "claro", "show", "top", "legal", "massa", "perfeito", "otimo",
+    "entendi", "ah entendi", "hmm", "hum", "aham", "uhum", "tchau", "ate mais", "bjs", "beijos",
+}
+# Flat alternation: a nested quantifier here backtracks exponentially on "hahaha... serio?"
+LAUGHTER_PATTERN = re.compile(r"^(?:k|h[aeiu]|rs|ksk|\s)+$")
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Short Portuguese function words ignored when matching against the corpus
+STOPWORDS = {
+    "a", "o", "as", "os", "e", "de", "do", "da", "dos", "das", "em", "no", "na", "nos", "nas",
+    "um", "uma", "uns", "umas", "que", "para", "pra", "por", "com", "se", "eu", "voce", "vc",
+    "me", "te", "ele", "ela", "isso", "isto", "esse", "essa", "mas", "ou", "ja", "tem", "ter",
+    "foi", "ser", "sou", "esta", "to", "muito", "mais", "meu", "minha", "seu", "sua",
+}
+
+# Words that signal a question; such messages always retrieve
+QUESTION_WORDS = {
+    "qual", "quais", "quanto", "quanta", "quantos", "quantas", "como", "quando", "onde",
+    "porque", "pq", "oque", "quem", "pode", "posso", "consigo", "funciona", "duvida",
+}
+
+# Longer messages always retrieve; the lexical check only applies below this
+MAX_GATED_WORDS = 6
+
+
+def normalize(text):
+    """Lowercase, strip accents and squeeze repeated letters ("oiii" -> "oi")."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r"(\w)\1{2,}", r"\1", text)
+    return re.sub(r"[^\w\s]", " ", text).strip()
+
+
+def tokenize(text):
+    """Content words of a text, normalized for lexical matching."""
+    return [word for word in WORD_PATTERN.findall(normalize(text)) if word not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over the knowledge base chunks, built in memory."""
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(list)  # term -> [(doc, term frequency)]
+        self.doc_lengths = []
+
+        for doc_id, document in enumerate(documents):
+            terms = Counter(tokenize(document))
+            self.doc_lengths.append(sum(terms.values()))
+            for term, frequency in terms.items():
+                self.postings[term].append((doc_id, frequency))
+
+        self.avg_length = sum(self.doc_lengths) / len(self.doc_lengths) if self.doc_lengths else 0.0
+        total = len(self.doc_lengths)
+        self.idf = {
+            term: math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def __contains__(self, term):
+        return term in self.postings
+
+    def scores(self, query):
+        """BM25 score of every document that shares a term with the query."""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            for doc_id, frequency in self.postings.get(term, ()):
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / self.avg_length
+                scores[doc_id] += self.idf[term] * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+        return scores
+
+    def top_k(self, query, top_k=3):
+        """Ids of the top_k documents for the query, best first."""
+        scores = self.scores(query)
+        return sorted(scores, key=scores.get, reverse=True)[:top_k]
+
+
+# (chunks, index) for the chunks currently loaded, replaced as a whole when
+# they change so readers never see an index paired with other chunks
+_lexical_index = (None, None)
+_lexical_lock = threading.Lock()
+
+# Rolling retrieval latency, used to estimate how much a skip saves
+_stats = {"retrievals": 0, "skipped": 0, "fallbacks": 0, "avg_latency": None}
+_stats_lock = threading.Lock()
+
+
+def get_lexical_index(chunks):
+    """BM25 index over chunks, built once per chunk list even when requests race for it."""
+    global _lexical_index
+    indexed, index = _lexical_index
+    if indexed is chunks:
+        return index
+    with _lexical_lock:
+        if _lexical_index[0] is not chunks:
+            _lexical_index = (chunks, BM25Index(chunks))
+            logger.info(f"Built BM25 index over {len(chunks)} chunks")
+        return _lexical_index[1]
+
+
+def should_retrieve(message, chunks=None):
+    """
+    Decide locally whether a message is worth a knowledge base lookup.
+    Returns (decision, reason).
+    """
+    normalized = normalize(message or "")
+    if not normalized:
+        return False, "empty_or_emoji"
+    if normalized in STOP_PHRASES:
+        return False, "stop_phrase"
+    if LAUGHTER_PATTERN.match(normalized):
+        return False, "laughter"
+
+    terms = tokenize(message)
+    if not terms:
+        return False, "no_content_words"
+    if "?" in message or QUESTION_WORDS.intersection(normalized.split()):
+        return True, "question"
+
+    if len(normalized.split()) <= MAX_GATED_WORDS and chunks:
+        lexical_index = get_lexical_index(chunks)
+        if not any(term in lexical_index for term in terms):
+            return False, "no_corpus_overlap"
+
+    return True, "content"
+
+
+def lexical_search(query, chunks, top_k=3):
+    """Return the top_k chunks by BM25; used when vector search is unavailable."""
+    if not chunks:
+        return []
+    with _stats_lock:
+        _stats["fallbacks"] += 1
+    return [chunks[i] for i in get_lexical_index(chunks).top_k(query, top_k)]
+
+
+def record_retrieval(latency):
+    """Fold a retrieval latency (seconds) into the rolling average."""
+    with _stats_lock:
+        _stats["retrievals"] += 1
+        previous = _stats["avg_latency"]
+        _stats["avg_latency"] = latency if previous is None else 0.9 * previous + 0.1 * latency
+
+
+def record_skip(message, reason):
+    """Log a gated message and the retrieval latency it avoided."""
+    with _stats_lock:
+        _stats["skipped"] += 1
+        stats = dict(_stats)
+    saved = stats["avg_latency"]
+    saved_text = f"~{saved * 1000:.0f}ms saved" if saved is not None else "no latency estimate yet"
+    logger.info(
+        f"Retrieval skipped ({reason}) for {message[:40]!r}: {saved_text} "
+        f"[skipped {stats['skipped']}, retrieved {stats['retrievals']}]"
+    )
+
+
+def get_stats():
+    with _stats_lock:
+        return dict(_stats)
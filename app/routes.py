@@ -1,18 +1,32 @@
 # app/routes.py
 
-from flask import current_app, request, jsonify
-from .openai_service import generate_response, analyze_image
-from .audio_service import handle_audio_message
+from flask import current_app, request, jsonify, g
+from .openai_service import generate_response, analyze_image, query_pdfs
+from .audio_service import iter_audio_message, transcription_cache, get_vad_stats, FIXED_REPLIES
+from .image_service import image_cache
+from .pipeline import StageTimer
+from . import llm_gateway, llm_metrics, model_router, webhook_recorder
 from .utils import get_chat_state, set_chat_state, send_message, get_user_state, set_user_state, send_custom_message
 from .flow_service import handle_welcome_flow, should_initiate_welcome_flow
 from .humanize_service import send_humanized_response
+from .pdf_service import process_all_pdfs, load_knowledge_base
 import logging
 import traceback
+import hmac
+import time
 import os
 
 logger = logging.getLogger(__name__)
 
 def init_routes(app):
+    @app.after_request
+    def add_server_timing(response):
+        """Expose per-stage timings (used by the replay tool) as a Server-Timing header"""
+        timer = g.get('stage_timer')
+        if timer is not None:
+            response.headers['Server-Timing'] = timer.server_timing()
+        return response
+
     @app.route('/webhook-test', methods=['GET', 'POST'])
     def webhook_test():
         """Test endpoint to verify the server is working"""
@@ -42,6 +56,7 @@ def init_routes(app):
             # Parse the JSON data
             data = request.json
             logger.info(f"Received webhook data: {data}")
+            webhook_recorder.record(data)
             
             # Determine webhook type for better logging
             webhook_type = "unknown"
@@ -124,16 +139,20 @@ def init_routes(app):
             if get_chat_state(user_number):
                 logger.info(f"Generating AI response for {user_number}")
                 try:
-                    ai_response = generate_response(user_message, user_number)
+                    timer = g.stage_timer = StageTimer(f"Text message from {user_number}")
+                    ai_response = timer.run("generation", generate_response, user_message, user_number)
                     if ai_response:
                         logger.info(f"AI response generated: {ai_response[:100]}...")  # Log first 100 chars
                         
                         # Use humanized response instead of direct message sending
-                        send_results = send_humanized_response(
+                        send_results = timer.run(
+                            "send",
+                            send_humanized_response,
                             user_number, 
                             ai_response,
                             send_custom_message
                         )
+                        timer.log()
                         
                         logger.info(f"Humanized AI responses sent: {len(send_results)} messages")
                         
@@ -165,6 +184,80 @@ def init_routes(app):
             # Always return 200 to Z-API to prevent retries
             return jsonify({"status": "error", "message": "Internal processing error"}), 200
 
+    @app.route('/admin/reindex', methods=['POST'])
+    def admin_reindex():
+        """Re-ingest data/pdfs and publish a new knowledge base version"""
+        if not is_admin_request():
+            return jsonify({"status": "error", "message": "Unauthorized"}), 403
+        try:
+            force = bool((request.get_json(silent=True) or {}).get('force', False))
+            logger.info(f"Admin reindex requested (force={force})")
+            result = process_all_pdfs(force_refresh=force)
+            current = load_knowledge_base()
+            return jsonify({
+                "status": "success",
+                "changed": result is not None,
+                "version": current["version"],
+                "chunks": len(current["chunks"])
+            }), 200
+        except Exception as e:
+            logger.error(f"Admin reindex failed: {str(e)}")
+            logger.error(traceback.format_exc())
+            return jsonify({"status": "error", "message": str(e)}), 500
+
+    @app.route('/admin/knowledge-base', methods=['GET'])
+    def admin_knowledge_base():
+        """Report the knowledge base version served by this worker"""
+        if not is_admin_request():
+            return jsonify({"status": "error", "message": "Unauthorized"}), 403
+        current = load_knowledge_base()
+        return jsonify({
+            "status": "success",
+            "version": current["version"],
+            "chunks": len(current["chunks"]),
+            "index": current["index"].kind if current["index"] is not None else None,
+            "pdfs": sorted(current["manifest"])
+        }), 200
+
+    @app.route('/admin/caches', methods=['GET'])
+    def admin_caches():
+        """Hit rates of this worker's caches"""
+        if not is_admin_request():
+            return jsonify({"status": "error", "message": "Unauthorized"}), 403
+        return jsonify({
+            "status": "success",
+            "transcription": transcription_cache.stats(),
+            "image_analysis": image_cache.stats()
+        }), 200
+
+    @app.route('/admin/audio', methods=['GET'])
+    def admin_audio():
+        """Voice activity trimming totals for this worker"""
+        if not is_admin_request():
+            return jsonify({"status": "error", "message": "Unauthorized"}), 403
+        return jsonify({"status": "success", "vad": get_vad_stats()}), 200
+
+    @app.route('/admin/llm', methods=['GET'])
+    def admin_llm():
+        """Circuit breaker states and recent OpenAI latency for this worker"""
+        if not is_admin_request():
+            return jsonify({"status": "error", "message": "Unauthorized"}), 403
+        return jsonify({"status": "success", "routes": model_router.get_stats(), **llm_gateway.get_status()}), 200
+
+    @app.route('/admin/llm/usage', methods=['GET'])
+    def admin_llm_usage():
+        """Token usage, latency and estimated cost per OpenAI call site (?minutes= limits the window)"""
+        if not is_admin_request():
+            return jsonify({"status": "error", "message": "Unauthorized"}), 403
+        minutes = request.args.get('minutes', type=float)
+        return jsonify({"status": "success", **llm_metrics.summary(minutes * 60 if minutes else None)}), 200
+
+    def is_admin_request():
+        """Admin endpoints require the X-Admin-Token header to match ADMIN_TOKEN."""
+        expected = current_app.config.get('ADMIN_TOKEN')
+        provided = request.headers.get('X-Admin-Token', '')
+        return bool(expected) and hmac.compare_digest(provided, expected)
+
     def is_user_message(data):
         """
         Determine if the webhook payload is an actual message from a user.
@@ -214,18 +307,51 @@ def init_routes(app):
         try:
             if get_chat_state(user_number):
                 logger.info(f"Received audio message from {user_number}")
-                transcription = handle_audio_message(audio_data)
+                timer = g.stage_timer = StageTimer(f"Audio message from {user_number}")
+                parts = []
+                prefetch = None
+                start = time.time()
+                for text in iter_audio_message(audio_data):
+                    parts.append(text)
+                    if prefetch is None and not text.startswith("Erro:"):
+                        # The opening of a voice note usually carries the question:
+                        # look up PDF context while the rest is still transcribing
+                        prefetch = timer.submit("retrieval", query_pdfs, text)
+                timer.timings["transcription"] = time.time() - start
+                transcription = " ".join(parts)
                 logger.info(f"Transcription result: {transcription}")
+
+                if transcription in FIXED_REPLIES:
+                    # No speech or no transcription: ask for the message again without calling the model
+                    reply = FIXED_REPLIES[transcription]
+                    send_results = timer.run("send", send_custom_message, user_number, reply)
+                    timer.log()
+                    return jsonify({
+                        "status": "success",
+                        "transcription": "",
+                        "ai_response": reply,
+                        "send_results": [send_results]
+                    }), 200
                 
-                ai_response = generate_response(transcription, user_number)
+                pdf_context = prefetch.result() if prefetch else None
+                if not pdf_context and len(parts) > 1:
+                    # The opening alone was gated out or matched nothing: let
+                    # generate_response retrieve on the whole transcription
+                    pdf_context = None
+                ai_response = timer.run(
+                    "generation", generate_response, transcription, user_number, pdf_context=pdf_context, origin="audio"
+                )
                 logger.info(f"AI response generated for audio: {ai_response[:100]}...")
                 
                 # Use humanized response for audio responses too
-                send_results = send_humanized_response(
+                send_results = timer.run(
+                    "send",
+                    send_humanized_response,
                     user_number, 
                     ai_response,
                     send_custom_message
                 )
+                timer.log()
                 
                 logger.info(f"Humanized audio response sent: {len(send_results)} messages")
                 
@@ -254,22 +380,36 @@ def init_routes(app):
                     logger.warning(f"Missing image URL for {user_number}")
                     return jsonify({"error": "Missing image URL"}), 200
                 
-                # First, analyze the image
+                # Vision analysis and caption retrieval don't depend on each other,
+                # so they run side by side; only generation waits for both
+                timer = g.stage_timer = StageTimer(f"Image message from {user_number}")
                 logger.info(f"Analyzing image: {image_url}")
-                image_analysis = analyze_image(image_url, caption)
+                analysis_future = timer.submit("vision", analyze_image, image_url, caption)
+                retrieval_future = None
+                if image_data.get('caption'):
+                    retrieval_future = timer.submit("retrieval", query_pdfs, caption)
+
+                image_analysis = analysis_future.result()
                 logger.info(f"Image analysis result: {image_analysis[:100]}...")
+                # Without a caption, retrieval needs the analysis text and runs inside generate_response
+                pdf_context = retrieval_future.result() if retrieval_future else None
                 
                 # Then, generate a response based on the analysis and caption
                 context = f"Image analysis: {image_analysis}\nUser's caption or question: {caption}"
-                ai_response = generate_response(context, user_number, image_url)
+                ai_response = timer.run(
+                    "generation", generate_response, context, user_number, image_url, pdf_context=pdf_context, origin="image"
+                )
                 logger.info(f"AI response generated for image: {ai_response[:100]}...")
                 
                 # Use humanized response for image responses too
-                send_results = send_humanized_response(
+                send_results = timer.run(
+                    "send",
+                    send_humanized_response,
                     user_number, 
                     ai_response,
                     send_custom_message
                 )
+                timer.log()
                 
                 logger.info(f"Humanized image response sent: {len(send_results)} messages")
                 
@@ -0,0 +1,232 @@
+# app/transcription_worker.py
+#
+# Local transcription worker. Loads Whisper once and serves every web
+# worker over a Unix socket, batching segments across requests:
+#
+#     python -m app.transcription_worker --processes 1 --max-batch 8 --max-wait-ms 50
+
+import os
+import sys
+import time
+import fcntl
+import signal
+import logging
+import queue
+import argparse
+import threading
+import traceback
+import multiprocessing
+from concurrent.futures import Future
+from multiprocessing.connection import Listener
+from app import audio_service
+
+logger = logging.getLogger(__name__)
+
+
+class BatchScheduler:
+    """
+    Collects 30 s mel segments from concurrent requests and decodes them
+    together. A batch runs as soon as it has max_batch segments or the
+    oldest segment has waited max_wait seconds.
+    """
+
+    def __init__(self, model, max_batch=8, max_wait=0.05, profile=None):
+        import torch
+        import whisper
+        self.torch = torch
+        self.whisper = whisper
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.options = whisper.DecodingOptions(
+            without_timestamps=True, **audio_service.decode_options(profile or audio_service.get_profile())
+        )
+        self.queue = queue.Queue()
+        threading.Thread(target=self.run, name="whisper-batcher", daemon=True).start()
+
+    def segments(self, audio):
+        """Split audio at silences into padded 30 s windows and compute their log-mel spectrograms."""
+        for segment in audio_service.split_at_silence(audio):
+            mel = self.whisper.log_mel_spectrogram(
+                self.whisper.pad_or_trim(segment), n_mels=self.model.dims.n_mels
+            )
+            yield mel, len(segment) / audio_service.SAMPLE_RATE
+
+    def iter_transcribe(self, audio):
+        """Queue every segment of the audio and yield the decoded texts in order."""
+        futures = []
+        for mel, seconds in self.segments(audio):
+            future = Future()
+            self.queue.put((mel, seconds, future))
+            futures.append(future)
+        for future in futures:
+            yield future.result().strip()
+
+    def transcribe(self, audio):
+        return " ".join(self.iter_transcribe(audio)).strip()
+
+    def run(self):
+        while True:
+            items = [self.queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(items) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.run_batch(items)
+
+    def run_batch(self, items):
+        start = time.time()
+        try:
+            mels = self.torch.stack([mel for mel, _, _ in items]).to(self.model.device)
+            results = self.whisper.decode(self.model, mels, self.options)
+        except Exception as e:
+            logger.error(f"Batch decode failed: {e}")
+            for _, _, future in items:
+                future.set_exception(e)
+            return
+
+        for (_, _, future), result in zip(items, results):
+            future.set_result(result.text)
+
+        elapsed = time.time() - start
+        audio_seconds = sum(seconds for _, seconds, _ in items)
+        logger.info(
+            f"Decoded batch of {len(items)} segments ({audio_seconds:.1f}s audio) in {elapsed:.2f}s: "
+            f"{len(items) / elapsed:.2f} segments/s, {audio_seconds / elapsed:.1f}x realtime"
+        )
+
+
+def handle_request(request, scheduler):
+    """
+    Run one transcription request and yield the response dicts: a single
+    {"text"} normally, or one {"partial", "index"} per segment followed
+    by {"done"} when the request asks to stream.
+    """
+    if "pcm" in request:
+        audio = audio_service.pcm_to_float32(request["pcm"])
+    elif "path" in request:
+        audio = scheduler.whisper.load_audio(request["path"])
+    else:
+        yield {"error": f"Unknown request: {sorted(request)}"}
+        return
+    if request.get("stream"):
+        for index, text in enumerate(scheduler.iter_transcribe(audio)):
+            yield {"partial": text, "index": index}
+        yield {"done": True}
+    else:
+        yield {"text": scheduler.transcribe(audio)}
+
+
+def handle_connection(conn, scheduler):
+    """Answer a single client; runs in its own thread so requests can batch."""
+    with conn:
+        try:
+            request = conn.recv()
+            start = time.time()
+            for response in handle_request(request, scheduler):
+                conn.send(response)
+            logger.info(f"Request handled in {time.time() - start:.2f}s")
+            return
+        except EOFError:
+            return
+        except (BrokenPipeError, ConnectionResetError):
+            logger.warning("Client disconnected before the response was sent")
+            return
+        except Exception as e:
+            logger.error(f"Transcription failed: {e}")
+            logger.error(traceback.format_exc())
+            response = {"error": str(e)}
+        try:
+            conn.send(response)
+        except (BrokenPipeError, EOFError, OSError):
+            logger.warning("Client disconnected before the response was sent")
+
+
+def serve(listener, max_batch, max_wait, processes):
+    """Accept connections forever; runs in each child process."""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    model = audio_service.get_model(processes)
+    if model is None:
+        logger.error("Whisper model failed to load, worker exiting")
+        sys.exit(1)
+    scheduler = BatchScheduler(model, max_batch=max_batch, max_wait=max_wait)
+
+    while True:
+        try:
+            conn = listener.accept()
+        except Exception as e:
+            # Failed handshakes (wrong authkey, client went away) are not fatal
+            logger.warning(f"Rejected connection: {e}")
+            continue
+        threading.Thread(target=handle_connection, args=(conn, scheduler), daemon=True).start()
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    parser = argparse.ArgumentParser(description='Local Whisper transcription worker')
+    parser.add_argument('--processes', type=int, default=int(os.getenv('TRANSCRIPTION_PROCESSES', 1)),
+                        help='Number of model processes (each holds its own copy of the model)')
+    parser.add_argument('--max-batch', type=int, default=int(os.getenv('TRANSCRIPTION_MAX_BATCH', 8)),
+                        help='Maximum 30 s segments decoded together')
+    parser.add_argument('--max-wait-ms', type=float, default=float(os.getenv('TRANSCRIPTION_MAX_WAIT_MS', 50)),
+                        help='How long the first queued segment waits for a batch to fill')
+    args = parser.parse_args()
+    batch_args = (args.max_batch, args.max_wait_ms / 1000, args.processes)
+
+    os.makedirs(os.path.dirname(audio_service.TRANSCRIPTION_SOCKET) or ".", exist_ok=True)
+
+    # Only one worker per host: extra copies spawned by web workers exit here
+    lock = open(audio_service.TRANSCRIPTION_LOCK_FILE, 'w')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        logger.info("Transcription worker already running")
+        return
+
+    if os.path.exists(audio_service.TRANSCRIPTION_SOCKET):
+        os.remove(audio_service.TRANSCRIPTION_SOCKET)
+    listener = Listener(
+        audio_service.TRANSCRIPTION_SOCKET, family="AF_UNIX", authkey=audio_service.create_authkey()
+    )
+    os.chmod(audio_service.TRANSCRIPTION_SOCKET, 0o600)
+    logger.info(f"Listening on {audio_service.TRANSCRIPTION_SOCKET} with {args.processes} process(es)")
+
+    # Pre-fork: children share the listening socket and each load the model
+    # after the fork, so torch is never imported in the supervisor.
+    context = multiprocessing.get_context("fork")
+    children = []
+
+    def shutdown(signum, frame):
+        for child in children:
+            child.terminate()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    for _ in range(args.processes):
+        child = context.Process(target=serve, args=(listener, *batch_args), daemon=True)
+        child.start()
+        children.append(child)
+
+    # Restart children that die (e.g. OOM while loading a large model)
+    while True:
+        time.sleep(1)
+        for i, child in enumerate(children):
+            if not child.is_alive():
+                logger.warning(f"Transcription process {child.pid} exited ({child.exitcode}), restarting")
+                time.sleep(5)
+                children[i] = context.Process(target=serve, args=(listener, *batch_args), daemon=True)
+                children[i].start()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+# app/vector_index.py
+
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_rows(vectors):
+    """Return float32 copies of the vectors scaled to unit length."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k_indices(scores, top_k):
+    """Indices of the top_k highest scores, best first, without a full sort."""
+    top_k = min(top_k, len(scores))
+    if top_k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+def kmeans(vectors, n_clusters, n_iter=20, seed=0, batch_size=8192):
+    """
+    Spherical k-means on unit vectors (cosine similarity).
+    Returns unit-length centroids of shape (n_clusters, dim).
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+
+    for iteration in range(n_iter):
+        assignments = assign_to_centroids(vectors, centroids, batch_size)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_clusters)
+
+        # Re-seed empty clusters with random points so every list gets used
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+
+        centroids = normalize_rows(sums)
+
+    return centroids
+
+
+def assign_to_centroids(vectors, centroids, batch_size=8192):
+    """Nearest centroid for every vector, computed in batches to bound memory."""
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), batch_size):
+        batch = vectors[start:start + batch_size]
+        assignments[start:start + batch_size] = np.argmax(batch @ centroids.T, axis=1)
+    return assignments
+
+
+class QuantizedVectors:
+    """
+    Compact storage for the first-pass search.
+
+    float32 keeps vectors as is, float16 halves them, and int8 stores each
+    row as int8 codes plus one float32 scale (max |x| / 127), a quarter of
+    float32. Scores are computed in blocks so the float32 upcast never
+    materialises the whole matrix at once.
+    """
+
+    DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+    def __init__(self, data, scales=None):
+        self.data = data
+        self.scales = scales
+
+    @classmethod
+    def from_vectors(cls, vectors, dtype="float32"):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            codes = np.round(vectors / scales[:, None]).astype(np.int8)
+            return cls(codes, scales.astype(np.float32))
+        return cls(vectors.astype(cls.DTYPES[dtype]))
+
+    @property
+    def dtype(self):
+        return self.data.dtype.name
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __len__(self):
+        return len(self.data)
+
+    def scores(self, query, rows=None, block_size=16384):
+        """Approximate dot products between the query and the stored rows."""
+        count = len(self.data) if rows is None else len(rows)
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, block_size):
+            block = slice(start, start + block_size)
+            data = self.data[block] if rows is None else self.data[rows[block]]
+            scores[block] = data.astype(np.float32, copy=False) @ query
+        if self.scales is not None:
+            scores *= self.scales if rows is None else self.scales[rows]
+        return scores
+
+    def to_arrays(self, prefix):
+        arrays = {f"{prefix}data": self.data}
+        if self.scales is not None:
+            arrays[f"{prefix}scales"] = self.scales
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix):
+        return cls(arrays[f"{prefix}data"], arrays.get(f"{prefix}scales"))
+
+
+def rerank(ids, query, exact_vectors, top_k):
+    """
+    Re-score candidate ids with exact float32 vectors and keep the top_k.
+    exact_vectors may be a read-only memmap; only the candidate rows are read.
+    """
+    ids = np.sort(ids)
+    scores = normalize_rows(exact_vectors[ids]) @ normalize_rows(query)
+    best = top_k_indices(scores, top_k)
+    return ids[best], scores[best]
+
+
+class ExactIndex:
+    """Brute-force cosine search over every vector."""
+
+    kind = "exact"
+
+    def __init__(self, vectors, dtype="float32"):
+        self.store = QuantizedVectors.from_vectors(normalize_rows(vectors), dtype)
+
+    def __len__(self):
+        return len(self.store)
+
+    def search(self, query, top_k=3):
+        """Return (ids, scores) of the top_k most similar vectors."""
+        scores = self.store.scores(normalize_rows(query))
+        ids = top_k_indices(scores, top_k)
+        return ids, scores[ids]
+
+    def save(self, path):
+        np.savez(path, kind=self.kind, **self.store.to_arrays("store_"))
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        index = cls.__new__(cls)
+        index.store = QuantizedVectors.from_arrays(arrays, "store_")
+        return index
+
+
+class IVFIndex:
+    """
+    Inverted-file index: vectors are clustered with k-means and a query only
+    scans the nprobe lists whose centroids are closest to it.
+
+    n_lists trades build time and memory for speed; nprobe trades latency
+    for recall at query time (nprobe == n_lists is an exact search).
+    """
+
+    kind = "ivf"
+
+    def __init__(self, centroids, store, ids, offsets, nprobe=8):
+        self.centroids = centroids
+        self.store = store        # QuantizedVectors, rows grouped by list
+        self.ids = ids            # original id of each row
+        self.offsets = offsets    # list i spans rows offsets[i]:offsets[i + 1]
+        self.nprobe = nprobe
+
+    def __len__(self):
+        return len(self.store)
+
+    @classmethod
+    def build(cls, vectors, n_lists=None, nprobe=8, n_iter=20, max_train_points=50000, seed=0,
+              dtype="float32"):
+        """Cluster the vectors and group them into inverted lists."""
+        vectors = normalize_rows(vectors)
+        if n_lists is None:
+            n_lists = max(1, int(4 * np.sqrt(len(vectors))))
+        n_lists = min(n_lists, len(vectors))
+
+        rng = np.random.default_rng(seed)
+        train = vectors
+        if len(vectors) > max_train_points:
+            train = vectors[rng.choice(len(vectors), max_train_points, replace=False)]
+
+        logger.info(f"Training IVF index: {len(vectors)} vectors, {n_lists} lists")
+        centroids = kmeans(train, n_lists, n_iter=n_iter, seed=seed)
+        assignments = assign_to_centroids(vectors, centroids)
+
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=n_lists)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        store = QuantizedVectors.from_vectors(vectors[order], dtype)
+        return cls(centroids, store, order, offsets, nprobe=nprobe)
+
+    def search(self, query, top_k=3, nprobe=None):
+        """Return (ids, scores) of the top_k most similar vectors in the probed lists."""
+        query = normalize_rows(query)
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        lists = top_k_indices(self.centroids @ query, nprobe)
+
+        rows = np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in lists])
+        scores = self.store.scores(query, rows)
+        best = top_k_indices(scores, top_k)
+        return self.ids[rows[best]], scores[best]
+
+    def save(self, path):
+        np.savez(
+            path, kind=self.kind, centroids=self.centroids, ids=self.ids,
+            offsets=self.offsets, nprobe=self.nprobe, **self.store.to_arrays("store_")
+        )
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(
+            arrays["centroids"], QuantizedVectors.from_arrays(arrays, "store_"), arrays["ids"],
+            arrays["offsets"], nprobe=int(arrays["nprobe"])
+        )
+
+
+INDEX_TYPES = {index.kind: index for index in (ExactIndex, IVFIndex)}
+
+
+def build_index(vectors, kind="exact", dtype="float32", **options):
+    """Build an index of the given kind ("exact" or "ivf") storing vectors as dtype."""
+    if kind == "ivf":
+        return IVFIndex.build(vectors, dtype=dtype, **options)
+    return ExactIndex(vectors, dtype=dtype)
+
+
+def load_index(path):
+    """Load an index saved with .save(); the file records its own kind."""
+    with np.load(path) as arrays:
+        arrays = {name: arrays[name] for name in arrays.files}
+    return INDEX_TYPES[str(arrays["kind"])].from_arrays(arrays)
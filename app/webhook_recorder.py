@@ -0,0 +1,61 @@
+# app/webhook_recorder.py
+
+import os
+import hmac
+import json
+import time
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Incoming /webhook payloads are appended to WEBHOOK_RECORD_FILE (off when
+# unset) for replay with benchmarks/webhook_replay.py. Phone numbers are
+# replaced with stable fake numbers derived from WEBHOOK_RECORD_SALT, so a
+# user's messages still belong together but can't be traced back; names
+# and profile photos are dropped.
+WEBHOOK_RECORD_FILE = os.getenv("WEBHOOK_RECORD_FILE")
+WEBHOOK_RECORD_SALT = os.getenv("WEBHOOK_RECORD_SALT", "atendflow-replay").encode()
+
+PHONE_FIELDS = {"phone", "participantPhone", "connectedPhone", "senderLid", "chatLid"}
+NAME_FIELDS = {"senderName", "chatName"}
+PHOTO_FIELDS = {"senderPhoto", "photo"}
+
+_lock = threading.Lock()
+
+
+def fake_phone(value):
+    """A stable fake Brazilian-looking number for a real one."""
+    digest = hmac.new(WEBHOOK_RECORD_SALT, str(value).encode(), hashlib.sha256).hexdigest()
+    return "5599" + str(int(digest[:15], 16) % 10**9).zfill(9)
+
+
+def anonymise(value, key=None):
+    if isinstance(value, dict):
+        return {k: anonymise(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [anonymise(item, key) for item in value]
+    if value in (None, ""):
+        return value
+    if key in PHONE_FIELDS:
+        return fake_phone(value)
+    if key in NAME_FIELDS:
+        return f"Contato {fake_phone(value)[-4:]}"
+    if key in PHOTO_FIELDS:
+        return None
+    return value
+
+
+def record(payload):
+    """Append an anonymised payload with its arrival time; no-op unless recording is on."""
+    if not WEBHOOK_RECORD_FILE or not isinstance(payload, dict):
+        return
+    line = json.dumps({"time": time.time(), "payload": anonymise(payload)}, ensure_ascii=False) + "\n"
+    try:
+        with _lock:
+            os.makedirs(os.path.dirname(WEBHOOK_RECORD_FILE) or ".", exist_ok=True)
+            with open(WEBHOOK_RECORD_FILE, 'a') as f:
+                f.write(line)
+    except OSError as e:
+        logger.warning(f"Could not record webhook payload: {e}")
@@ -0,0 +1,77 @@
+"""
+Recall and latency of the IVF index against the exact (brute-force) search.
+
+Uses synthetic clustered vectors by default, or the real chunk embeddings
+with --embeddings data/embeddings.json (queries are then perturbed chunks).
+
+    python -m benchmarks.ann_benchmark --n 100000 --dim 384 --nprobe 4 8 16 32
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+from app.vector_index import ExactIndex, IVFIndex
+
+
+def synthetic_vectors(n, dim, n_topics, seed):
+    """Vectors drawn around n_topics random directions, like chunks of many documents."""
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    labels = rng.integers(0, n_topics, n)
+    return topics[labels] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def measure(index, queries, top_k, **options):
+    """Return (results, mean latency in ms) for searching every query."""
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        ids, _ = index.search(query, top_k, **options)
+        results.append(set(ids.tolist()))
+    return results, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF vs exact recall benchmark")
+    parser.add_argument("--n", type=int, default=100000, help="Number of synthetic vectors")
+    parser.add_argument("--dim", type=int, default=384, help="Synthetic vector dimension")
+    parser.add_argument("--topics", type=int, default=500, help="Synthetic topic clusters")
+    parser.add_argument("--embeddings", type=str, help="Use vectors from an embeddings.json file")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--n-lists", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed + 1)
+    if args.embeddings:
+        with open(args.embeddings) as f:
+            vectors = np.array([item["embedding"] for item in json.load(f)], dtype=np.float32)
+        picks = vectors[rng.integers(0, len(vectors), args.queries)]
+        queries = picks + 0.02 * rng.standard_normal(picks.shape).astype(np.float32)
+    else:
+        vectors = synthetic_vectors(args.n, args.dim, args.topics, args.seed)
+        queries = synthetic_vectors(args.queries, args.dim, args.topics, args.seed)[:args.queries]
+        queries += 0.1 * rng.standard_normal(queries.shape).astype(np.float32)
+
+    print(f"{len(vectors)} vectors, dim {vectors.shape[1]}, {len(queries)} queries, top_k={args.top_k}")
+
+    exact = ExactIndex(vectors)
+    truth, exact_ms = measure(exact, queries, args.top_k)
+    print(f"exact: {exact_ms:.2f} ms/query")
+
+    start = time.perf_counter()
+    ivf = IVFIndex.build(vectors, n_lists=args.n_lists, seed=args.seed)
+    print(f"ivf build: {time.perf_counter() - start:.1f} s, {len(ivf.centroids)} lists")
+
+    print(f"{'nprobe':>8} {'recall@k':>10} {'ms/query':>10} {'speedup':>8}")
+    for nprobe in args.nprobe:
+        found, ivf_ms = measure(ivf, queries, args.top_k, nprobe=nprobe)
+        recall = np.mean([len(f & t) / len(t) for f, t in zip(found, truth)])
+        print(f"{nprobe:>8} {recall:>10.3f} {ivf_ms:>10.2f} {exact_ms / ivf_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
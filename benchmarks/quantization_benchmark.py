@@ -0,0 +1,56 @@
+"""
+Memory per chunk and recall of float16 / int8 vector storage, with and
+without exact float32 re-ranking, against exact float32 search.
+
+    python -m benchmarks.quantization_benchmark --n 50000 --dim 1536
+"""
+
+import argparse
+import numpy as np
+from app.vector_index import ExactIndex, rerank, normalize_rows
+from benchmarks.ann_benchmark import synthetic_vectors
+
+
+def recall(found, truth):
+    return np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantized storage benchmark")
+    parser.add_argument("--n", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=1536, help="text-embedding-3-small is 1536")
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed + 1)
+    vectors = normalize_rows(synthetic_vectors(args.n, args.dim, args.topics, args.seed))
+    queries = synthetic_vectors(args.queries, args.dim, args.topics, args.seed)
+    queries += 0.1 * rng.standard_normal(queries.shape).astype(np.float32)
+
+    # A json-loaded embedding is a list of Python floats: 8-byte pointer + 24-byte float object
+    print(f"{args.n} vectors, dim {args.dim}, top_k={args.top_k}")
+    print(f"python list of floats: ~{args.dim * 32 + 56} bytes/chunk")
+
+    exact = ExactIndex(vectors)
+    truth = [exact.search(q, args.top_k)[0] for q in queries]
+
+    print(f"{'store':>8} {'bytes/chunk':>12} {'recall@k':>10} {'reranked':>10}")
+    for dtype in ("float32", "float16", "int8"):
+        index = ExactIndex(vectors, dtype=dtype)
+        first_pass = [index.search(q, args.top_k)[0] for q in queries]
+        reranked = [
+            rerank(index.search(q, args.top_k * args.rerank_factor)[0], q, vectors, args.top_k)[0]
+            for q in queries
+        ]
+        print(
+            f"{dtype:>8} {index.store.nbytes / len(index):>12.0f} "
+            f"{recall(first_pass, truth):>10.3f} {recall(reranked, truth):>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Real-time factor and word error rate of each transcription profile.
+
+Reads every audio file in --samples (wav/ogg/opus/mp3/m4a) that has a
+reference transcript next to it with the same name and a .txt extension:
+
+    benchmarks/samples/pedido_01.ogg
+    benchmarks/samples/pedido_01.txt
+
+    python -m benchmarks.transcription_benchmark --profiles fast,default,quantized --threads 4
+
+RTF is transcription time / audio duration (below 1 is faster than real
+time). WER is word-level edit distance / reference words, after the same
+normalization the retrieval gate uses (lowercase, no accents or punctuation).
+
+Each profile is timed twice: model.transcribe one clip after another (the
+in-process path), and through the worker's BatchScheduler, which decodes
+30 s mel windows together with without_timestamps=True while --concurrency
+clips are in flight. The batched RTF is wall-clock time over all the audio.
+--worker also times a running transcription worker through the same client
+the web app uses, with whatever profile the worker was started with.
+"""
+
+import os
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from app import audio_service
+from app.retrieval_gate import normalize
+
+AUDIO_EXTENSIONS = (".wav", ".ogg", ".opus", ".mp3", ".m4a")
+
+
+def load_samples(directory):
+    """(path, reference text) of every audio file with a transcript."""
+    samples = []
+    for name in sorted(os.listdir(directory)):
+        stem, extension = os.path.splitext(name)
+        reference = os.path.join(directory, stem + ".txt")
+        if extension.lower() in AUDIO_EXTENSIONS and os.path.exists(reference):
+            with open(reference, 'r') as f:
+                samples.append((os.path.join(directory, name), f.read()))
+    return samples
+
+
+def word_errors(reference, hypothesis):
+    """(edit distance in words, reference word count)."""
+    ref = normalize(reference).split()
+    hyp = normalize(hypothesis).split()
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1], len(ref)
+
+
+def error_rate(samples, texts):
+    """WER over all samples together."""
+    errors = words = 0
+    for (_, reference), text in zip(samples, texts):
+        sample_errors, sample_words = word_errors(reference, text)
+        errors += sample_errors
+        words += sample_words
+    return errors / max(words, 1)
+
+
+def audio_duration(audio):
+    return sum(len(clip) for clip in audio) / audio_service.SAMPLE_RATE
+
+
+def transcribe_concurrently(transcribe, audio, concurrency):
+    """(texts, wall-clock seconds) with up to concurrency clips in flight."""
+    start = time.time()
+    with ThreadPoolExecutor(concurrency) as pool:
+        texts = list(pool.map(transcribe, audio))
+    return texts, time.time() - start
+
+
+def measure(profile, samples, audio):
+    """Load the profile's model, warm it up, then transcribe every sample. Returns the model too."""
+    start = time.time()
+    model = audio_service.load_model(profile)
+    load_seconds = time.time() - start
+    options = audio_service.decode_options(profile)
+    model.transcribe(audio[0][:audio_service.SAMPLE_RATE], **options)
+
+    texts = []
+    seconds = 0.0
+    for clip in audio:
+        start = time.time()
+        texts.append(model.transcribe(clip, **options)["text"])
+        seconds += time.time() - start
+    return model, load_seconds, seconds / audio_duration(audio), error_rate(samples, texts)
+
+
+def measure_batched(model, profile, samples, audio, max_batch, max_wait, concurrency):
+    """RTF and WER of the worker's batched decode path, run in this process."""
+    from app.transcription_worker import BatchScheduler
+    scheduler = BatchScheduler(model, max_batch=max_batch, max_wait=max_wait, profile=profile)
+    scheduler.transcribe(audio[0][:audio_service.SAMPLE_RATE])
+    texts, seconds = transcribe_concurrently(scheduler.transcribe, audio, concurrency)
+    return seconds / audio_duration(audio), error_rate(samples, texts)
+
+
+def measure_worker(samples, audio, concurrency):
+    """RTF and WER of a running transcription worker, streamed as the web app does."""
+    def transcribe(clip):
+        pcm = (clip.clip(-1.0, 1.0) * 32767).astype("int16").tobytes()
+        return " ".join(audio_service.request_transcription_stream({"pcm": pcm}))
+
+    transcribe(audio[0][:audio_service.SAMPLE_RATE])
+    texts, seconds = transcribe_concurrently(transcribe, audio, concurrency)
+    return seconds / audio_duration(audio), error_rate(samples, texts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcription profile benchmark")
+    parser.add_argument("--samples", default=os.path.join(os.path.dirname(__file__), "samples"))
+    parser.add_argument("--profiles", default=",".join(audio_service.TRANSCRIPTION_PROFILES))
+    parser.add_argument("--threads", type=int, default=0, help="torch threads (0 = all cores)")
+    parser.add_argument("--max-batch", type=int, default=8, help="BatchScheduler segments per batch")
+    parser.add_argument("--max-wait-ms", type=float, default=50, help="BatchScheduler wait for a fuller batch")
+    parser.add_argument("--concurrency", type=int, default=4, help="clips in flight on the batched and worker paths")
+    parser.add_argument("--worker", action="store_true", help="also time the running transcription worker")
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples) if os.path.isdir(args.samples) else []
+    if not samples:
+        print(f"No audio files with .txt transcripts in {args.samples}")
+        return
+
+    import whisper
+    audio = [whisper.load_audio(path) for path, _ in samples]
+    audio_service.TRANSCRIPTION_THREADS = args.threads
+    threads = audio_service.set_torch_threads()
+    print(f"{len(samples)} samples, {audio_duration(audio):.0f}s of audio, {threads} torch threads")
+    print(
+        f"{'profile':>10} {'model':>7} {'int8':>5} {'beam':>5} {'load s':>7} {'RTF':>6} {'WER':>6} "
+        f"{'batch RTF':>10} {'batch WER':>10}"
+    )
+
+    for name in args.profiles.split(","):
+        profile = audio_service.get_profile(name)
+        model, load_seconds, rtf, wer = measure(profile, samples, audio)
+        batch_rtf, batch_wer = measure_batched(
+            model, profile, samples, audio, args.max_batch, args.max_wait_ms / 1000, args.concurrency
+        )
+        print(
+            f"{name:>10} {profile['model']:>7} {str(profile['quantize']):>5} "
+            f"{profile['beam_size'] or 'greedy':>5} {load_seconds:>7.1f} {rtf:>6.3f} {wer:>6.1%} "
+            f"{batch_rtf:>10.3f} {batch_wer:>10.1%}"
+        )
+
+    if args.worker:
+        rtf, wer = measure_worker(samples, audio, args.concurrency)
+        print(f"{'worker':>10} {'':>7} {'':>5} {'':>5} {'':>7} {'':>6} {'':>6} {rtf:>10.3f} {wer:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
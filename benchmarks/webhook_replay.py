@@ -0,0 +1,148 @@
+"""
+Replay recorded webhook payloads against a running instance.
+
+Record production traffic with WEBHOOK_RECORD_FILE (phones anonymised, see
+app/webhook_recorder.py), then send it back at 1x, 10x or 100x speed with
+the original gaps between messages:
+
+    python -m benchmarks.webhook_replay data/webhooks.jsonl --url http://localhost:8080/webhook --speed 10
+
+Point the instance at the simulator (python -m simulator) unless the
+replies should really go out. Reports throughput, latency percentiles,
+error rate, how far sends fell behind schedule and the per-stage
+breakdown the app returns in its Server-Timing header.
+"""
+
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+
+def load_records(path, limit=None):
+    """(arrival time, payload) pairs in arrival order."""
+    records = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entry = json.loads(line)
+                records.append((entry["time"], entry["payload"]))
+    records.sort(key=lambda record: record[0])
+    return records[:limit] if limit else records
+
+
+def parse_server_timing(header):
+    """{"generation": seconds, ...} from a Server-Timing header."""
+    stages = {}
+    for metric in filter(None, (part.strip() for part in (header or "").split(","))):
+        name, *params = [field.strip() for field in metric.split(";")]
+        for param in params:
+            key, _, value = param.partition("=")
+            if key == "dur":
+                try:
+                    stages[name] = float(value) / 1000
+                except ValueError:
+                    pass
+    return stages
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else None
+
+
+def send(session, url, payload, timeout):
+    """POST one payload; returns (latency, error or None, stage timings)."""
+    start = time.time()
+    try:
+        response = session.post(url, json=payload, timeout=timeout)
+        latency = time.time() - start
+        if response.status_code >= 400:
+            return latency, f"HTTP {response.status_code}", {}
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        error = "status error" if isinstance(body, dict) and body.get("status") == "error" else None
+        return latency, error, parse_server_timing(response.headers.get("Server-Timing"))
+    except requests.RequestException as e:
+        return time.time() - start, type(e).__name__, {}
+
+
+def replay(records, url, speed, concurrency, timeout):
+    """Send every record at its scaled offset from the first one; returns the results."""
+    results = []
+    results_lock = threading.Lock()
+    local = threading.local()
+
+    def run(payload, lag):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        latency, error, stages = send(local.session, url, payload, timeout)
+        with results_lock:
+            results.append({"latency": latency, "error": error, "stages": stages, "lag": lag})
+
+    first = records[0][0]
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for arrival, payload in records:
+            due = start + (arrival - first) / speed
+            delay = due - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(run, payload, max(0.0, time.time() - due))
+    return results, time.time() - start
+
+
+def report(results, elapsed, speed):
+    latencies = sorted(result["latency"] for result in results)
+    errors = {}
+    for result in results:
+        if result["error"]:
+            errors[result["error"]] = errors.get(result["error"], 0) + 1
+    lags = sorted(result["lag"] for result in results)
+
+    print(f"\nReplayed {len(results)} requests at {speed:g}x in {elapsed:.1f}s "
+          f"({len(results) / elapsed:.1f} req/s)")
+    print(f"Latency  p50 {percentile(latencies, 0.5):.3f}s  p95 {percentile(latencies, 0.95):.3f}s  "
+          f"p99 {percentile(latencies, 0.99):.3f}s  max {latencies[-1]:.3f}s")
+    print(f"Errors   {sum(errors.values())} ({sum(errors.values()) / len(results):.1%})"
+          + "".join(f"  {name}: {count}" for name, count in sorted(errors.items())))
+    print(f"Schedule lag  p95 {percentile(lags, 0.95):.3f}s  max {lags[-1]:.3f}s "
+          f"(high lag means --concurrency is the bottleneck)")
+
+    stages = {}
+    for result in results:
+        for name, seconds in result["stages"].items():
+            stages.setdefault(name, []).append(seconds)
+    if stages:
+        print(f"\n{'stage':<16}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for name, values in sorted(stages.items(), key=lambda item: item[0] == "total"):
+            values.sort()
+            print(f"{name:<16}{len(values):>7}{percentile(values, 0.5):>9.3f}s"
+                  f"{percentile(values, 0.95):>9.3f}s{percentile(values, 0.99):>9.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", help="JSONL written by WEBHOOK_RECORD_FILE")
+    parser.add_argument("--url", default="http://localhost:8080/webhook")
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression, e.g. 1, 10 or 100")
+    parser.add_argument("--concurrency", type=int, default=64, help="maximum requests in flight")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--limit", type=int, help="replay only the first N payloads")
+    args = parser.parse_args()
+
+    records = load_records(args.file, args.limit)
+    if not records:
+        parser.error(f"no payloads in {args.file}")
+    span = records[-1][0] - records[0][0]
+    print(f"{len(records)} payloads over {span:.0f}s of traffic, replaying in ~{span / args.speed:.0f}s")
+    results, elapsed = replay(records, args.url, args.speed, args.concurrency, args.timeout)
+    report(results, elapsed, args.speed)
+
+
+if __name__ == "__main__":
+    main()
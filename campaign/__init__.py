@@ -0,0 +1,5 @@
+"""
+Campaign sending for disparar_mensagens.py: an asyncio engine that
+generates messages ahead of the senders and spreads leads across one or
+more Z-API instances, each paced on its own.
+"""
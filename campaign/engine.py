@@ -0,0 +1,288 @@
+"""
+Asyncio campaign engine.
+
+Leads flow through two bounded queues:
+
+    leads -> generator workers (LLM, in threads) -> ready messages -> one sender per Z-API instance
+
+Generation runs ahead of sending, so the model's latency is hidden behind
+the pacing delays instead of adding to them. Each instance sleeps its own
+jittered delay between sends, so N instances send about N times as
+fast as one without any single number exceeding its pace.
+
+Instances come from a JSON file (--instances):
+
+    [{"name": "chip1", "url": "https://api.z-api.io/instances/ID/token/TOKEN/send-text",
+      "client_token": "...", "min_delay": 15, "max_delay": 35}]
+
+or from CAMPAIGN_ZAPI_URLS (comma-separated send-text URLs), falling back
+to ZAPI_URL_NEW. client_token defaults to CLIENT_TOKEN.
+"""
+
+import os
+import json
+import time
+import random
+import signal
+import asyncio
+import logging
+import httpx
+
+logger = logging.getLogger(__name__)
+
+SEND_TIMEOUT = 30
+DELAY_TYPING = 3
+# Seconds each instance waits between its own sends, unless configured
+DEFAULT_DELAY_RANGE = (15, 35)
+
+
+class Instance:
+    """One Z-API instance (WhatsApp number) with its own pacing."""
+
+    def __init__(self, name, url, client_token=None, min_delay=DEFAULT_DELAY_RANGE[0],
+                 max_delay=DEFAULT_DELAY_RANGE[1]):
+        self.name = name
+        self.url = url
+        self.headers = {
+            'client-token': client_token or os.getenv("CLIENT_TOKEN", ""),
+            'Content-Type': 'application/json'
+        }
+        self.min_delay = float(min_delay)
+        self.max_delay = float(max_delay)
+        self.sent = 0
+        self.failed = 0
+
+    def delay(self):
+        return random.uniform(self.min_delay, self.max_delay)
+
+
+def load_instances(path=None, delay_range=DEFAULT_DELAY_RANGE):
+    """Instances from a JSON file, or from CAMPAIGN_ZAPI_URLS / ZAPI_URL_NEW."""
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        return [
+            Instance(
+                entry.get("name", f"instance{i + 1}"),
+                entry["url"],
+                entry.get("client_token"),
+                entry.get("min_delay", delay_range[0]),
+                entry.get("max_delay", delay_range[1])
+            )
+            for i, entry in enumerate(entries)
+        ]
+    urls = [url.strip() for url in os.getenv("CAMPAIGN_ZAPI_URLS", "").split(",") if url.strip()]
+    urls = urls or [os.getenv("ZAPI_URL_NEW")]
+    return [Instance(f"instance{i + 1}", url, None, *delay_range) for i, url in enumerate(urls)]
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+
+class Progress:
+    """Counters for the live report: sent/s over the last interval, ETA and failure reasons."""
+
+    def __init__(self, total=None):
+        self.total = total
+        self.sent = 0
+        self.failed = 0
+        self.reasons = {}
+        self.started = time.time()
+        self.last = (self.started, 0)
+
+    def success(self):
+        self.sent += 1
+
+    def failure(self, reason):
+        self.failed += 1
+        self.reasons[reason] = self.reasons.get(reason, 0) + 1
+
+    def report(self):
+        now = time.time()
+        done = self.sent + self.failed
+        last_time, last_done = self.last
+        rate = (done - last_done) / max(now - last_time, 1e-9)
+        self.last = (now, done)
+        line = f"Progress: {self.sent} sent, {self.failed} failed, {rate:.2f} msg/s"
+        if self.total:
+            overall = done / max(now - self.started, 1e-9)
+            remaining = self.total - done
+            eta = format_duration(remaining / overall) if overall > 0 else "?"
+            line += f", {done}/{self.total} ({done / self.total:.0%}), ETA {eta}"
+        if self.reasons:
+            line += " | " + ", ".join(f"{reason}: {count}" for reason, count in sorted(self.reasons.items()))
+        logger.info(line)
+
+
+class CampaignEngine:
+    """
+    generate(lead, index) returns the message for the index-th lead (or
+    None); it is called in a thread, so the blocking OpenAI gateway can be
+    used as is. on_result(lead, instance, error), when given, is called
+    with every lead's outcome (instance is None and error "generation"
+    when no message could be produced; error is None on success).
+    flush(), when given, is called every flush_interval seconds and once
+    more when the run ends, however it ends. SIGTERM stops a run the way
+    Ctrl+C does.
+    """
+
+    def __init__(self, instances, generate, generators=4, queue_size=None, progress_interval=10, on_result=None,
+                 flush=None, flush_interval=1.0):
+        if not instances:
+            raise ValueError("At least one Z-API instance is required")
+        self.instances = instances
+        self.generate = generate
+        self.generators = generators
+        # Keep just enough messages ready to feed every instance, so a
+        # stopped campaign hasn't generated far ahead of what was sent
+        self.queue_size = queue_size or max(2 * len(instances), generators)
+        self.progress_interval = progress_interval
+        self.on_result = on_result
+        self.flush = flush
+        self.flush_interval = flush_interval
+        self.progress = None
+
+    async def run(self, leads, total=None):
+        """Send to every lead; returns (successes, failures)."""
+        self.progress = Progress(total)
+        pending = asyncio.Queue(maxsize=self.queue_size)
+        ready = asyncio.Queue(maxsize=self.queue_size)
+
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        except (NotImplementedError, RuntimeError):
+            pass  # no signal handlers on this platform or outside the main thread
+
+        async with httpx.AsyncClient(timeout=SEND_TIMEOUT) as client:
+            producers = [asyncio.create_task(self.feed(leads, pending))]
+            workers = [asyncio.create_task(self.generate_worker(pending, ready)) for _ in range(self.generators)]
+            senders = [asyncio.create_task(self.sender(instance, ready, client, i))
+                       for i, instance in enumerate(self.instances)]
+            background = [asyncio.create_task(self.report_progress())]
+            if self.flush:
+                background.append(asyncio.create_task(self.flush_periodically()))
+            tasks = producers + workers + senders
+            try:
+                await self.supervise(asyncio.gather(*producers), tasks)
+                await self.supervise(self.close(pending, len(workers)), tasks)
+                await self.supervise(asyncio.gather(*workers), tasks)
+                await self.supervise(self.close(ready, len(senders)), tasks)
+                await self.supervise(asyncio.gather(*senders), tasks)
+            finally:
+                for task in background + tasks:
+                    task.cancel()
+                if self.flush:
+                    self.flush()
+                try:
+                    loop.remove_signal_handler(signal.SIGTERM)
+                except (NotImplementedError, RuntimeError):
+                    pass
+
+        self.progress.report()
+        for instance in self.instances:
+            logger.info(f"{instance.name}: {instance.sent} sent, {instance.failed} failed")
+        return self.progress.sent, self.progress.failed
+
+    async def supervise(self, step, tasks):
+        """
+        Await one stage of the pipeline, raising as soon as any task fails:
+        with a dead sender or worker the queues never drain and the stage
+        would otherwise wait forever.
+        """
+        step = asyncio.ensure_future(step)
+        try:
+            while not step.done():
+                running = [task for task in tasks if not task.done()]
+                await asyncio.wait([step, *running], return_when=asyncio.FIRST_COMPLETED)
+                for task in tasks:
+                    if task.done() and not task.cancelled() and task.exception():
+                        raise task.exception()
+            return step.result()
+        finally:
+            if not step.done():
+                step.cancel()
+                # Mark the outcome as retrieved: the run is being torn down anyway
+                step.add_done_callback(lambda future: future.cancelled() or future.exception())
+
+    async def close(self, queue, consumers):
+        for _ in range(consumers):
+            await queue.put(None)
+
+    async def feed(self, leads, pending):
+        for index, lead in enumerate(leads):
+            await pending.put((index, lead))
+
+    async def generate_worker(self, pending, ready):
+        while True:
+            item = await pending.get()
+            if item is None:
+                return
+            index, lead = item
+            try:
+                message = await asyncio.to_thread(self.generate, lead, index)
+            except Exception as e:
+                logger.error(f"Error generating message for {lead.get('phone')}: {e}")
+                message = None
+            if not message:
+                self.finish(lead, None, "generation")
+                continue
+            await ready.put((lead, message))
+
+    async def sender(self, instance, ready, client, index):
+        # Stagger the instances so they don't all fire at the same moment
+        await asyncio.sleep(random.uniform(0, instance.min_delay) if index else 0)
+        next_send = 0
+        while True:
+            item = await ready.get()
+            if item is None:
+                # No pacing delay after the last message
+                return
+            # Sleep out the rest of the delay only once there is something to send
+            await asyncio.sleep(max(0, next_send - time.monotonic()))
+            lead, message = item
+            error = await self.send(instance, client, lead["phone"], message)
+            self.finish(lead, instance, error)
+            next_send = time.monotonic() + instance.delay()
+
+    def finish(self, lead, instance, error):
+        if error is None:
+            instance.sent += 1
+            self.progress.success()
+        else:
+            if instance is not None:
+                instance.failed += 1
+            self.progress.failure(error)
+        if self.on_result:
+            self.on_result(lead, instance, error)
+
+    async def send(self, instance, client, phone, message):
+        """Send one message to a normalized phone; returns None on success or a short failure reason."""
+        payload = {"phone": phone, "message": message, "delayTyping": DELAY_TYPING}
+        try:
+            response = await client.post(instance.url, headers=instance.headers, json=payload)
+        except httpx.TimeoutException:
+            logger.error(f"Timeout when sending message to {phone} via {instance.name}")
+            return "timeout"
+        except httpx.HTTPError as e:
+            logger.error(f"Error sending message to {phone} via {instance.name}: {e}")
+            return type(e).__name__
+        if response.status_code != 200:
+            logger.error(f"Failed to send message to {phone} via {instance.name}. "
+                         f"Status: {response.status_code}, Response: {response.text[:200]}")
+            return f"HTTP {response.status_code}"
+        logger.info(f"Message successfully sent to {phone} via {instance.name}")
+        return None
+
+    async def flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    async def report_progress(self):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            self.progress.report()
@@ -0,0 +1,187 @@
+"""
+SQLite journal of campaign sends, so a crashed or killed campaign can be
+resumed without messaging anyone twice.
+
+Every lead's outcome (sent or failed, variant, instance, failure reason)
+is buffered and committed in groups of GROUP_SIZE, and the campaign
+engine flushes the buffer every GROUP_INTERVAL seconds and when the
+campaign stops (also on Ctrl+C or SIGTERM). A SIGKILL loses at most the
+last GROUP_INTERVAL seconds of outcomes; a power cut can lose a few more
+commits (synchronous=NORMAL).
+
+    python -m campaign.journal                # list campaigns
+    python -m campaign.journal <campaign-id>  # throughput and failure reasons
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import logging
+
+logger = logging.getLogger(__name__)
+
+CAMPAIGN_JOURNAL = os.getenv("CAMPAIGN_JOURNAL", "data/campaign/journal.db")
+GROUP_SIZE = 50
+GROUP_INTERVAL = 1.0
+LOOKUP_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaigns (
+    id TEXT PRIMARY KEY, created REAL, leads_file TEXT, options TEXT, status TEXT
+);
+CREATE TABLE IF NOT EXISTS leads (
+    campaign_id TEXT, phone TEXT, status TEXT, variant INTEGER, instance TEXT, reason TEXT, time REAL,
+    PRIMARY KEY (campaign_id, phone)
+);
+"""
+
+
+class Journal:
+    def __init__(self, path=CAMPAIGN_JOURNAL):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.pending = []
+        self.last_flush = time.time()
+
+    def start(self, leads_file, options=None, campaign_id=None):
+        """Register a new campaign; returns its id."""
+        campaign_id = campaign_id or time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        with self.db:
+            self.db.execute(
+                "INSERT INTO campaigns VALUES (?, ?, ?, ?, 'running')",
+                (campaign_id, time.time(), leads_file, json.dumps(options or {}))
+            )
+        return campaign_id
+
+    def get_campaign(self, campaign_id):
+        row = self.db.execute(
+            "SELECT id, created, leads_file, options, status FROM campaigns WHERE id = ?", (campaign_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"id": row[0], "created": row[1], "leads_file": row[2], "options": json.loads(row[3]), "status": row[4]}
+
+    def set_status(self, campaign_id, status):
+        with self.db:
+            self.db.execute("UPDATE campaigns SET status = ? WHERE id = ?", (status, campaign_id))
+
+    def record(self, campaign_id, phone, status, variant=None, instance=None, reason=None):
+        self.pending.append((campaign_id, phone, status, variant, instance, reason, time.time()))
+        if len(self.pending) >= GROUP_SIZE or time.time() - self.last_flush >= GROUP_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Commit the buffered outcomes in one transaction."""
+        if self.pending:
+            with self.db:
+                self.db.executemany("INSERT OR REPLACE INTO leads VALUES (?, ?, ?, ?, ?, ?, ?)", self.pending)
+            self.pending = []
+        self.last_flush = time.time()
+
+    def skip_done(self, campaign_id, leads, retry_failed=False):
+        """Leads not yet journaled for the campaign (failed ones too when retry_failed), looked up in batches."""
+        statuses = ("sent",) if retry_failed else ("sent", "failed")
+        batch = []
+        for lead in leads:
+            batch.append(lead)
+            if len(batch) >= LOOKUP_BATCH:
+                yield from self.filter_batch(campaign_id, batch, statuses)
+                batch = []
+        yield from self.filter_batch(campaign_id, batch, statuses)
+
+    def filter_batch(self, campaign_id, batch, statuses):
+        if not batch:
+            return
+        phones = [lead["phone"] for lead in batch]
+        done = {row[0] for row in self.db.execute(
+            f"SELECT phone FROM leads WHERE campaign_id = ? AND status IN ({','.join('?' * len(statuses))}) "
+            f"AND phone IN ({','.join('?' * len(phones))})",
+            (campaign_id, *statuses, *phones)
+        )}
+        for lead in batch:
+            if lead["phone"] not in done:
+                yield lead
+
+    def summary(self, campaign_id):
+        campaign = self.get_campaign(campaign_id)
+        if campaign is None:
+            return None
+        counts = dict(self.db.execute(
+            "SELECT status, COUNT(*) FROM leads WHERE campaign_id = ? GROUP BY status", (campaign_id,)
+        ).fetchall())
+        first, last = self.db.execute(
+            "SELECT MIN(time), MAX(time) FROM leads WHERE campaign_id = ?", (campaign_id,)
+        ).fetchone()
+        span = (last - first) if first is not None else 0.0
+
+        def grouped(column, where=""):
+            return dict(self.db.execute(
+                f"SELECT {column}, COUNT(*) FROM leads WHERE campaign_id = ? {where} GROUP BY {column} ORDER BY 2 DESC",
+                (campaign_id,)
+            ).fetchall())
+
+        return dict(
+            campaign,
+            sent=counts.get("sent", 0),
+            failed=counts.get("failed", 0),
+            first_send=first,
+            last_send=last,
+            per_minute=round(sum(counts.values()) / span * 60, 2) if span else None,
+            failure_reasons=grouped("reason", "AND status = 'failed'"),
+            instances=grouped("instance", "AND status = 'sent'"),
+            variants=grouped("variant", "AND status = 'sent'"),
+        )
+
+    def campaigns(self):
+        return [
+            {"id": row[0], "created": row[1], "leads_file": row[2], "status": row[3], "journaled": row[4]}
+            for row in self.db.execute(
+                "SELECT c.id, c.created, c.leads_file, c.status, COUNT(l.phone) FROM campaigns c "
+                "LEFT JOIN leads l ON l.campaign_id = c.id GROUP BY c.id ORDER BY c.created"
+            )
+        ]
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+
+def print_summary(journal, campaign_id):
+    summary = journal.summary(campaign_id)
+    if summary is None:
+        print(f"Unknown campaign {campaign_id}")
+        return False
+    started = time.strftime("%Y-%m-%d %H:%M", time.localtime(summary["created"]))
+    print(f"Campaign {summary['id']} ({summary['status']}), started {started}, leads {summary['leads_file']}")
+    print(f"  sent {summary['sent']}, failed {summary['failed']}, "
+          f"{summary['per_minute'] if summary['per_minute'] is not None else '-'} messages/min")
+    for title, key in (("Failure reasons", "failure_reasons"), ("Sent per instance", "instances"),
+                       ("Sent per variant", "variants")):
+        if summary[key]:
+            print(f"  {title}:")
+            for name, count in summary[key].items():
+                print(f"    {name}: {count}")
+    return True
+
+
+def main():
+    journal = Journal()
+    try:
+        if len(sys.argv) > 1:
+            sys.exit(0 if print_summary(journal, sys.argv[1]) else 1)
+        for campaign in journal.campaigns():
+            started = time.strftime("%Y-%m-%d %H:%M", time.localtime(campaign["created"]))
+            print(f"{campaign['id']}  {started}  {campaign['status']:<12}{campaign['journaled']:>8} leads  "
+                  f"{campaign['leads_file']}")
+    finally:
+        journal.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Streaming lead loader.
+
+Reads leads from JSONL, CSV or a JSON array without loading the file,
+normalizes phones a batch at a time, drops invalid numbers and duplicates
+(a NumPy Bloom filter sized from the file, so memory stays flat for
+multi-million-row lists) and suppresses numbers that turned the
+assistant off (chat_states false). With skip_active, numbers already in a
+conversation (any user_states entry past "new_user") are skipped too.
+Rows that can't be decoded count as invalid instead of stopping the load.
+
+    for lead in LeadLoader("leads.csv"):
+        lead["phone"]  # "5521999999999"
+"""
+
+import os
+import re
+import csv
+import json
+import math
+import shelve
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+SAMPLE_BYTES = 1 << 20  # read to estimate the row count
+DEDUPE_ERROR_RATE = 1e-6  # share of unique numbers wrongly skipped as duplicates
+PHONE_COLUMNS = ("phone", "telefone", "celular", "whatsapp", "numero")
+NAME_COLUMNS = ("name", "nome")
+CHAT_STATES_FILE = "data/chat_states"
+USER_STATES_FILE = "data/user_states"
+
+NON_DIGITS = re.compile(r"[^0-9]")
+SEPARATORS = re.compile(r"[\s,]*")
+
+
+def normalize_phones(values):
+    """
+    Normalize a batch of raw phone values: digits only, leading zeros
+    (trunk prefix) dropped and Brazil's country code added to 10/11-digit
+    numbers. Numbers that can't be a Brazilian phone come back as None.
+    """
+    result = []
+    for value in values:
+        digits = NON_DIGITS.sub("", str(value)).lstrip("0") if value is not None else ""
+        if len(digits) in (10, 11):
+            digits = "55" + digits
+        result.append(digits if len(digits) in (12, 13) and digits.startswith("55") else None)
+    return result
+
+
+def normalize_phone(phone):
+    """Single-number normalize_phones; falls back to the digits when the number doesn't validate."""
+    return normalize_phones([phone])[0] or NON_DIGITS.sub("", str(phone))
+
+
+def mix(values):
+    """splitmix64 finalizer over a uint64 array."""
+    with np.errstate(over="ignore"):
+        z = values + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+class BloomFilter:
+    """
+    Set of phone numbers in a fixed bit array, checked a batch at a time.
+    May answer "seen" wrongly at error_rate, never "new".
+    """
+
+    def __init__(self, capacity, error_rate=DEDUPE_ERROR_RATE):
+        capacity = max(capacity, 1000)
+        self.size = int(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    def add_many(self, numbers):
+        """Add a batch of numbers; returns a bool array, True where one was (probably) already present."""
+        keys = np.asarray(numbers, dtype=np.uint64)
+        present = np.ones(len(keys), dtype=bool)
+        # Only the first occurrence within the batch can be new
+        unique, first = np.unique(keys, return_index=True)
+        h1 = mix(unique)
+        h2 = mix(h1) | np.uint64(1)
+        with np.errstate(over="ignore"):
+            steps = np.arange(self.hashes, dtype=np.uint64)[:, None]
+            positions = (h1[None, :] + steps * h2[None, :]) % np.uint64(self.size)
+        byte = (positions >> np.uint64(3)).astype(np.int64)
+        mask = (np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8))
+        seen = ((self.bits[byte] & mask) != 0).all(axis=0)
+        new = ~seen
+        np.bitwise_or.at(self.bits, byte[:, new].ravel(), mask[:, new].ravel())
+        present[first[new]] = False
+        return present
+
+
+def load_suppressed(skip_active=False):
+    """Normalized numbers that must not be messaged, from the app's shelves."""
+    suppressed = {}
+    try:
+        with shelve.open(CHAT_STATES_FILE, flag='r') as db:
+            for key in db:
+                if db[key] is False:
+                    suppressed[key] = "opted_out"
+    except Exception as e:
+        logger.warning(f"Could not read {CHAT_STATES_FILE}: {e}")
+    if skip_active:
+        try:
+            with shelve.open(USER_STATES_FILE, flag='r') as db:
+                for key in db:
+                    if db[key] != 'new_user':
+                        suppressed.setdefault(key, "in_conversation")
+        except Exception as e:
+            logger.warning(f"Could not read {USER_STATES_FILE}: {e}")
+    keys = list(suppressed)
+    return {phone: suppressed[key] for key, phone in zip(keys, normalize_phones(keys)) if phone}
+
+
+def iter_json_array(f, chunk_size=1 << 16):
+    """
+    Objects of a top-level JSON array, decoded one at a time. An element
+    that doesn't decode is read on until it does, however many chunks it
+    spans; only at end of file is it malformed, coming out as None and
+    skipped up to its closing brace.
+    """
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("Expected a JSON array")
+    pos = 1
+    eof = False
+    while True:
+        pos = SEPARATORS.match(buffer, pos).end()
+        if buffer.startswith("]", pos):
+            return
+        try:
+            if len(buffer) - pos < chunk_size and not eof:
+                raise json.JSONDecodeError("refill", buffer, pos)
+            item, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if not eof:
+                # Partial element, possibly longer than a chunk: drop what
+                # was consumed and read on
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            # The whole rest of the file is buffered: a broken element
+            yield None
+            end = buffer.find("}", pos)
+            if end < 0:
+                return
+            pos = end + 1
+            continue
+        yield item
+
+
+def pick(row, columns):
+    for column in columns:
+        for key in (column, column.capitalize(), column.upper()):
+            if row.get(key) not in (None, ""):
+                return row[key]
+    return None
+
+
+class LeadLoader:
+    """Iterable of {"phone", "name", ...} leads; stats holds the counts once iterated."""
+
+    def __init__(self, path, skip_active=False, capacity=None):
+        self.path = path
+        self.skip_active = skip_active
+        self.capacity = capacity or self.estimate_rows()
+        self.stats = {"rows": 0, "valid": 0, "invalid": 0, "duplicates": 0, "opted_out": 0, "in_conversation": 0}
+
+    def estimate_rows(self):
+        """
+        Row count extrapolated from the average row length of the first
+        SAMPLE_BYTES, with 25% headroom, to size the Bloom filter. Erring
+        high only costs memory; erring low raises the duplicate error rate.
+        """
+        extension = os.path.splitext(self.path)[1].lower()
+        size = os.path.getsize(self.path)
+        with open(self.path, 'rb') as f:
+            sample = f.read(SAMPLE_BYTES)
+        rows = sample.count(b"\n" if extension in (".csv", ".jsonl", ".ndjson") else b"{") + 1
+        if len(sample) >= size:
+            return rows
+        return int(size / len(sample) * rows * 1.25)
+
+    def rows(self):
+        """Raw rows; an undecodable row comes out as None, or is counted here when it can't be yielded."""
+        extension = os.path.splitext(self.path)[1].lower()
+        if extension == ".csv":
+            with open(self.path, 'rb') as f:
+                reader = csv.DictReader(self.text_lines(f))
+                while True:
+                    try:
+                        yield next(reader)
+                    except StopIteration:
+                        return
+                    except csv.Error:
+                        yield None
+        elif extension in (".jsonl", ".ndjson"):
+            with open(self.path, 'rb') as f:
+                for line in self.text_lines(f):
+                    if line.strip():
+                        try:
+                            yield json.loads(line)
+                        except ValueError:
+                            yield None
+        else:
+            with open(self.path, 'r', encoding='utf-8-sig', errors='replace') as f:
+                yield from iter_json_array(f)
+
+    def text_lines(self, f):
+        """UTF-8 lines of a binary file; undecodable lines are counted as invalid rows and skipped."""
+        for line in f:
+            try:
+                yield line.decode("utf-8-sig")
+            except UnicodeDecodeError:
+                self.stats["rows"] += 1
+                self.stats["invalid"] += 1
+
+    def estimate_total(self):
+        """Row count without parsing (line count for JSONL/CSV), for progress ETAs; None if unknown."""
+        extension = os.path.splitext(self.path)[1].lower()
+        if extension not in (".csv", ".jsonl", ".ndjson"):
+            return None
+        with open(self.path, 'rb') as f:
+            lines = sum(block.count(b"\n") for block in iter(lambda: f.read(1 << 20), b""))
+        return max(0, lines - (extension == ".csv"))
+
+    def __iter__(self):
+        suppressed = load_suppressed(self.skip_active)
+        seen = BloomFilter(self.capacity)
+        batch = []
+        for row in self.rows():
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                yield from self.process(batch, seen, suppressed)
+                batch = []
+        yield from self.process(batch, seen, suppressed)
+        logger.info("Leads from {}: {}".format(self.path, ", ".join(f"{k} {v}" for k, v in self.stats.items())))
+
+    def process(self, batch, seen, suppressed):
+        self.stats["rows"] += len(batch)
+        rows = [row for row in batch if isinstance(row, dict)]
+        self.stats["invalid"] += len(batch) - len(rows)
+        phones = normalize_phones([pick(row, PHONE_COLUMNS) for row in rows])
+        valid = [i for i, phone in enumerate(phones) if phone is not None]
+        duplicate = dict(zip(valid, seen.add_many([int(phones[i]) for i in valid]).tolist()))
+        for i, (row, phone) in enumerate(zip(rows, phones)):
+            if phone is None:
+                self.stats["invalid"] += 1
+            elif duplicate[i]:
+                self.stats["duplicates"] += 1
+            elif phone in suppressed:
+                self.stats[suppressed[phone]] += 1
+            else:
+                self.stats["valid"] += 1
+                lead = dict(row, phone=phone)
+                name = pick(row, NAME_COLUMNS)
+                if name:
+                    lead["name"] = str(name).strip()
+                yield lead
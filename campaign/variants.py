@@ -0,0 +1,187 @@
+"""
+Pre-generated pool of campaign message variants.
+
+Instead of one chat completion per lead, the template is rewritten up front
+in a few batched calls (n= completions each), near-duplicates are dropped
+and the pool is saved next to the campaign data. Leads then get a variant
+round-robin or at random, with their name filled in, so a campaign makes
+O(variants) LLM calls instead of O(leads).
+
+The template marks where the lead's name goes with NAME_MARKER; variants
+that lose the marker or any of the template's links are rejected.
+"""
+
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import logging
+from app.llm_gateway import chat_completion
+from app.retrieval_gate import normalize
+
+logger = logging.getLogger(__name__)
+
+VARIANT_POOL_SIZE = int(os.getenv("CAMPAIGN_VARIANTS", 30))
+VARIANT_BATCH = int(os.getenv("CAMPAIGN_VARIANT_BATCH", 8))
+# Word 3-gram Jaccard above which a rewrite counts as a duplicate. Rewrites
+# only change a few words, so this is deliberately close to 1.
+VARIANT_MAX_SIMILARITY = float(os.getenv("CAMPAIGN_VARIANT_MAX_SIMILARITY", 0.95))
+VARIANTS_DIR = os.getenv("CAMPAIGN_VARIANTS_DIR", "data/campaign")
+
+NAME_MARKER = "[NOME]"
+URL_PATTERN = re.compile(r"https?://\S+")
+
+
+def shingles(text, size=3):
+    words = normalize(text).split()
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+
+def similarity(a, b):
+    """Jaccard similarity of two shingle sets."""
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def pool_digest(variants):
+    """Content hash of an ordered list of variants."""
+    return hashlib.sha256(json.dumps(variants, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def personalize(message, name):
+    return message.replace(NAME_MARKER, name.upper())
+
+
+class VariantPool:
+    """
+    Rewrites of one template. prompt and system are the messages sent to
+    the model; fallback() produces a local rewrite when the model is
+    unavailable or keeps repeating itself.
+    """
+
+    def __init__(self, template, prompt, system=None, fallback=None, path=None,
+                 model="gpt-4o-mini", fallbacks=("gpt-3.5-turbo",)):
+        self.template = template
+        self.prompt = prompt
+        self.system = system
+        self.fallback = fallback
+        self.model = model
+        self.fallbacks = list(fallbacks)
+        self.required = [token for token in URL_PATTERN.findall(template)]
+        if NAME_MARKER in template:
+            self.required.append(NAME_MARKER)
+        key = hashlib.sha256(f"{template}\n{prompt}\n{system}".encode("utf-8")).hexdigest()[:12]
+        self.path = path or os.path.join(VARIANTS_DIR, f"variants-{key}.json")
+        self.variants = []
+        self._shingles = []
+
+    def add(self, text):
+        """Keep a rewrite unless it broke a link or the marker, or is too close to one we have."""
+        text = text.strip()
+        missing = [token for token in self.required if token not in text]
+        if not text or missing:
+            logger.info(f"Rejected variant missing {', '.join(missing) or 'text'}")
+            return False
+        candidate = shingles(text)
+        if any(similarity(candidate, kept) > VARIANT_MAX_SIMILARITY for kept in self._shingles):
+            return False
+        self.variants.append(text)
+        self._shingles.append(candidate)
+        return True
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        for text in data.get("variants", []):
+            self.add(text)
+        logger.info(f"Loaded {len(self.variants)} message variants from {self.path}")
+        return bool(self.variants)
+
+    def restore(self, variants, digest):
+        """
+        Use exactly these variants, in this order (a campaign's stored pool,
+        so journaled variant numbers keep pointing at the texts sent).
+        Raises ValueError when they don't match digest.
+        """
+        if pool_digest(list(variants)) != digest:
+            raise ValueError("Stored variant pool doesn't match its hash")
+        self.variants = list(variants)
+        self._shingles = [shingles(text) for text in self.variants]
+
+    def digest(self):
+        return pool_digest(self.variants)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({"created": time.time(), "template": self.template, "variants": self.variants},
+                      f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    def generate_batch(self, count):
+        """One completion call returning up to count rewrites; returns how many were kept."""
+        messages = [{"role": "user", "content": self.prompt}]
+        if self.system:
+            messages.insert(0, {"role": "system", "content": self.system})
+        response = chat_completion(
+            "campaign_variants",
+            model=self.model,
+            fallbacks=self.fallbacks,
+            messages=messages,
+            n=count,
+            max_tokens=600,
+            temperature=0.9
+        )
+        kept = sum(self.add(choice.message.content or "") for choice in response.choices)
+        logger.info(f"Variant batch from {response.model}: kept {kept}/{len(response.choices)}")
+        return kept
+
+    def fill(self, size=VARIANT_POOL_SIZE, batch_size=VARIANT_BATCH):
+        """
+        Exactly size variants where possible: a larger saved pool (see
+        load()) is cut down to its first size, a smaller one topped up.
+        """
+        if len(self.variants) > size:
+            logger.info(f"Using {size} of {len(self.variants)} saved variants")
+            del self.variants[size:]
+            del self._shingles[size:]
+        start = len(self.variants)
+        calls = 0
+        # Stop early when batches stop yielding new variants
+        max_calls = 2 * -(-size // batch_size)
+        while len(self.variants) < size and calls < max_calls:
+            calls += 1
+            try:
+                if not self.generate_batch(min(batch_size, size - len(self.variants))):
+                    break
+            except Exception as e:
+                logger.error(f"Error generating message variants: {e}")
+                break
+
+        attempts = 0
+        while self.fallback and len(self.variants) < size and attempts < 5 * size:
+            attempts += 1
+            self.add(self.fallback())
+        if not self.variants:
+            # Never fail a campaign over variety: the template itself is a valid message
+            self.add(self.template)
+
+        if len(self.variants) > start:
+            self.save()
+        logger.info(f"Variant pool ready: {len(self.variants)} variants ({len(self.variants) - start} new, "
+                    f"{calls} LLM calls)")
+        return self.variants
+
+    def assign(self, lead, index, strategy="round_robin"):
+        """(variant number, personalized message) for the index-th lead."""
+        if strategy == "random":
+            # Seeded by the phone, so a lead gets the same variant on every run
+            number = random.Random(str(lead.get("phone"))).randrange(len(self.variants))
+        else:
+            number = index % len(self.variants)
+        return number, personalize(self.variants[number], lead.get("name") or "Cliente")
@@ -15,5 +15,11 @@ class Config:
     ZAPI_URL = os.getenv('ZAPI_URL_NEW', 'https://api.z-api.io/instances/YOUR_INSTANCE/token/YOUR_TOKEN/send-text')
     ZAPI_REACTION = os.getenv('ZAPI_REACTION_NEW', 'https://api.z-api.io/instances/YOUR_INSTANCE/token/YOUR_TOKEN/send-reaction')
 
+    # Admin endpoints (disabled unless a token is set)
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+    # Knowledge base: seconds between checks of data/pdfs for changes (0 disables)
+    KB_WATCH_INTERVAL = float(os.getenv('KB_WATCH_INTERVAL', 30))
+
     # Other settings
     DEBUG = os.getenv('FLASK_DEBUG', 'False').lower() in ('true', '1', 't')
\ No newline at end of file
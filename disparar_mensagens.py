@@ -1,9 +1,7 @@
 import os
-import time
 import random
-import json
-import requests
-from openai import OpenAI
+import asyncio
+import itertools
 from dotenv import load_dotenv
 import logging
 
@@ -17,40 +15,17 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Check required environment variables
-required_vars = ["OPENAI_API_KEY", "ZAPI_URL_NEW", "CLIENT_TOKEN"]
-missing_vars = [var for var in required_vars if not os.getenv(var)]
-if missing_vars:
-    logger.error(f"Missing required environment variables: {', '.join(missing_vars)}")
-    logger.error("Please set these variables in your .env file")
-    exit(1)
+# Needed to send a campaign (not to print a summary)
+REQUIRED_VARS = ["OPENAI_API_KEY", "ZAPI_URL_NEW", "CLIENT_TOKEN"]
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from campaign.engine import CampaignEngine, load_instances, DEFAULT_DELAY_RANGE
+from campaign.leads import LeadLoader
+from campaign.variants import VariantPool, VARIANT_POOL_SIZE
+from campaign.journal import Journal, print_summary, GROUP_INTERVAL
 
-class BlackFridayMessageSender:
-    def __init__(self):
-        self.zapi_url = os.getenv("ZAPI_URL_NEW")
-        self.client_token = os.getenv("CLIENT_TOKEN")
-        self.headers = {
-            'client-token': self.client_token,
-            'Content-Type': 'application/json'
-        }
-        
-        # Message templates for variety
-        self.message_prompts = [
-            "Oferta Black Friday para Social Media",
-            "Método completo com 70% OFF",
-            "Transformação de carreira em Social Media",
-            "Pacote especial para Social Media Manager",
-        ]
-        
-        logger.info(f"BlackFridayMessageSender initialized with API URL: {self.zapi_url}")
-
-    def generate_message(self):
-        """Generate a unique marketing message using GPT with reliable fallback."""
-        base_template = """
-        🚨 NOVA CHANCE EXCLUSIVA! 🚨
+# [NOME] is replaced with each lead's name when the message is sent
+BASE_TEMPLATE = """
+        🚨 NOVA CHANCE EXCLUSIVA PARA [NOME]! 🚨
 
         Ontem você teve a oportunidade de dar um passo importante rumo ao sucesso como Social Media… mas, por algum motivo você não conseguiu, HOJE É O DIA DE MUDAR ISSO!
 
@@ -75,40 +50,16 @@ class BlackFridayMessageSender:
         ⚠️ *Não deixe passar novamente a oportunidade* que pode transformar sua trajetória profissional.
         """
 
-        prompt = f"""
-        Mantenha a template original, só mude uma ou outra palavra. Output apenas o template final
+SYSTEM_PROMPT = "Você é um especialista em marketing digital com foco em mensagens naturais e envolventes."
+PROMPT = f"""
+        Mantenha a template original, só mude uma ou outra palavra. Mantenha [NOME] e os links exatamente como estão. Output apenas o template final
         Template:
-        {base_template}
+        {BASE_TEMPLATE}
         """
 
-        try:
-            # Try with GPT models first
-            models_to_try = ["gpt-4o-mini", "gpt-3.5-turbo"] 
-            
-            for model in models_to_try:
-                try:
-                    logger.info(f"Generating message with model: {model}")
-                    response = client.chat.completions.create(
-                        model=model,
-                        messages=[
-                            {"role": "system", "content": "Você é um especialista em marketing digital com foco em mensagens naturais e envolventes."},
-                            {"role": "user", "content": prompt}
-                        ],
-                        max_tokens=600,
-                        temperature=0.7
-                    )
-                    message = response.choices[0].message.content.strip()
-                    logger.info(f"Successfully generated message with {model}")
-                    return message
-                except Exception as model_error:
-                    logger.warning(f"Error with model {model}: {model_error}")
-                    continue
-        except Exception as e:
-            logger.error(f"Error generating message with OpenAI: {e}")
-        
-        # If all OpenAI attempts fail, use manual randomization
-        logger.warning("All API models failed, using manual randomization")
-        
+class BlackFridayMessageSender:
+    def randomize_template(self):
+        """Local rewrite of the template from fixed word choices."""
         # Manual variations to replace in the template
         variations = {
             "NOVA CHANCE EXCLUSIVA": [
@@ -191,7 +142,7 @@ class BlackFridayMessageSender:
         }
         
         # Apply random variations
-        randomized_message = base_template
+        randomized_message = BASE_TEMPLATE
         for original, options in variations.items():
             replacement = random.choice(options)
             randomized_message = randomized_message.replace(original, replacement)
@@ -208,143 +159,134 @@ class BlackFridayMessageSender:
         
         return '\n'.join(lines)
 
-    def send_message(self, phone, message):
-        """Send a message using Z-API."""
-        if not message:
-            logger.error(f"Cannot send empty message to {phone}")
-            return False
-            
-        # Normalize phone number (remove spaces, ensure starts with country code)
-        phone = str(phone).strip()
-        if not phone.startswith("55"):
-            phone = "55" + phone
-            
-        # Remove any non-digit characters
-        phone = ''.join(filter(str.isdigit, phone))
-            
-        payload = {
-            "phone": phone,
-            "message": message,
-            "delayTyping": 3  # Adds typing delay for more natural appearance
-        }
+    def load_leads(self, filename='leads.json', skip_active=False):
+        """
+        Stream leads from a JSON array, JSONL or CSV file, with phones
+        normalized, duplicates dropped and opted-out numbers suppressed.
+        """
+        if not os.path.exists(filename):
+            logger.error(f"Leads file not found: {filename}")
+            return None
+        return LeadLoader(filename, skip_active=skip_active)
 
-        try:
-            logger.info(f"Sending message to {phone}")
-            response = requests.post(
-                self.zapi_url,
-                headers=self.headers,
-                json=payload,
-                timeout=30  # Add timeout
-            )
-            
-            # Log the response for debugging
-            logger.info(f"Z-API Response ({phone}): Status {response.status_code}")
-            logger.debug(f"Z-API Response body: {response.text[:200]}...")
-            
-            if response.status_code == 200:
-                logger.info(f"Message successfully sent to {phone}")
-                return True
-            else:
-                logger.error(f"Failed to send message. Status: {response.status_code}, Response: {response.text[:200]}")
-                return False
-        except requests.exceptions.Timeout:
-            logger.error(f"Timeout when sending message to {phone}")
-            return False
-        except Exception as e:
-            logger.error(f"Error sending message to {phone}: {e}")
-            return False
+    def build_variant_pool(self, size=VARIANT_POOL_SIZE, regenerate=False):
+        """Rewrites of the template, generated in a few batched calls and saved for reuse."""
+        pool = VariantPool(BASE_TEMPLATE, PROMPT, system=SYSTEM_PROMPT, fallback=self.randomize_template)
+        if not regenerate:
+            pool.load()
+        pool.fill(size)
+        return pool
 
-    def load_leads(self, filename='leads.json'):
-        """Load leads from JSON file."""
-        try:
-            # Check if file exists
-            if not os.path.exists(filename):
-                logger.error(f"Leads file not found: {filename}")
-                return []
-                
-            with open(filename, 'r', encoding='utf-8') as f:
-                leads = json.load(f)
-                
-            # Validate leads format
-            if not isinstance(leads, list):
-                logger.error(f"Invalid leads format in {filename}. Expected a list.")
-                return []
-                
-            valid_leads = []
-            for i, lead in enumerate(leads):
-                if not isinstance(lead, dict):
-                    logger.warning(f"Skip invalid lead at index {i}: not a dictionary")
-                    continue
-                    
-                if 'phone' not in lead:
-                    logger.warning(f"Skip lead at index {i}: missing phone number")
-                    continue
-                    
-                valid_leads.append(lead)
-                
-            logger.info(f"Loaded {len(valid_leads)} valid leads from {filename}")
-            return valid_leads
-        except json.JSONDecodeError:
-            logger.error(f"Error parsing {filename}: invalid JSON format")
-            return []
-        except Exception as e:
-            logger.error(f"Error loading leads from {filename}: {e}")
-            return []
+    def send_campaign(self, leads_file='leads.json', delay_range=DEFAULT_DELAY_RANGE, test_mode=False,
+                      instances_file=None, generators=4, variants=VARIANT_POOL_SIZE,
+                      assignment="round_robin", regenerate_variants=False, skip_active=False,
+                      resume=None, retry_failed=False):
+        """
+        Run the campaign for all leads. Each lead gets one of the pooled
+        message variants with its name filled in; messages are spread
+        across the Z-API instances, each waiting a random delay_range
+        pause between its own messages. Every outcome goes to the campaign
+        journal, so resume=<campaign id> skips the leads already handled
+        (failed ones are retried with retry_failed) and carries on with the
+        options and the exact variant texts the campaign was started with.
+        """
+        journal = Journal()
+        options = {
+            "variants": variants, "assignment": assignment, "skip_active": skip_active,
+            "instances_file": instances_file, "delay_range": list(delay_range), "test": test_mode
+        }
+        offset = 0
+        if resume:
+            campaign = journal.get_campaign(resume)
+            if campaign is None:
+                logger.error(f"Unknown campaign: {resume}")
+                journal.close()
+                return
+            campaign_id, leads_file = resume, campaign["leads_file"]
+            # Finish the campaign the way it started, whatever the flags say now
+            stored = {key: value for key, value in campaign["options"].items() if key not in ("test", "pool")}
+            changed = {key: value for key, value in stored.items() if options.get(key) != value}
+            if changed:
+                logger.warning(f"Resuming with the campaign's original options: {changed}")
+            options.update(stored)
+            variants, assignment, skip_active = options["variants"], options["assignment"], options["skip_active"]
+            instances_file, delay_range = options["instances_file"], tuple(options["delay_range"])
+            if regenerate_variants:
+                logger.warning("Ignoring --regenerate-variants on resume: the campaign keeps its variant pool")
+            # The exact texts the campaign started with: the shared pool file
+            # may have been regenerated or extended by another campaign since
+            pool = VariantPool(BASE_TEMPLATE, PROMPT, system=SYSTEM_PROMPT)
+            try:
+                stored_pool = campaign["options"]["pool"]
+                pool.restore(stored_pool["variants"], stored_pool["sha256"])
+            except (KeyError, ValueError) as e:
+                logger.error(f"Cannot resume {campaign_id}: its variant pool is missing or corrupt ({e!r})")
+                journal.close()
+                return
+            logger.info(f"Restored the campaign's {len(pool.variants)} message variants")
+            journal.set_status(campaign_id, "running")
+        else:
+            pool = self.build_variant_pool(variants, regenerate_variants)
+            options["pool"] = {"sha256": pool.digest(), "variants": list(pool.variants)}
+            campaign_id = journal.start(leads_file, options)
+        logger.info(f"Campaign {campaign_id} (resume with --resume {campaign_id})")
 
-    def send_campaign(self, leads_file='leads.json', delay_range=(30, 60), test_mode=False):
-        """Run the campaign for all leads with random delays."""
-        leads = self.load_leads(leads_file)
-        if not leads:
-            logger.error("No leads found or leads file not valid")
+        leads = self.load_leads(leads_file, skip_active)
+        if leads is None:
+            journal.close()
             return
+        total = leads.estimate_total()
+        if resume:
+            summary = journal.summary(campaign_id)
+            done = summary["sent"] + (0 if retry_failed else summary["failed"])
+            # Carry on the round-robin where the interrupted run stopped
+            offset = summary["sent"] + summary["failed"]
+            logger.info(f"Resuming: {summary['sent']} sent and {summary['failed']} failed so far")
+            total = max(0, total - done) if total is not None else None
+        leads = journal.skip_done(campaign_id, leads, retry_failed)
             
-        logger.info(f"Starting campaign with {len(leads)} leads")
-        
         # Limit to first lead if test mode
         if test_mode:
-            leads = leads[:1]
+            leads = list(itertools.islice(leads, 1))
+            if not leads:
+                logger.error("No valid leads found")
+                journal.close()
+                return
+            total = 1
             logger.info("TEST MODE: Sending to only the first lead")
 
-        # Track successes and failures
-        success_count = 0
-        failure_count = 0
+        logger.info(f"Starting campaign with {total if total is not None else 'an unknown number of'} leads")
 
-        for i, lead in enumerate(leads):
-            phone = lead.get('phone')
-            name = lead.get('name', 'Cliente')
-            
-            if not phone:
-                logger.warning(f"Skipping lead #{i+1} - no phone number")
-                continue
-
-            # Generate a unique message
-            logger.info(f"Generating message for lead #{i+1} ({phone})")
-            message = self.generate_message()
-            
-            if not message:
-                logger.error(f"Failed to generate message for lead #{i+1} ({phone})")
-                failure_count += 1
-                continue
+        if test_mode:
+            logger.info("Sample message:")
+            logger.info(pool.assign(leads[0], 0, assignment)[1])
 
-            # Personalize the message with the lead's name if available
-            if name:
-                message = message.replace("NOVA CHANCE EXCLUSIVA", f"NOVA CHANCE EXCLUSIVA PARA {name.upper()}")
+        def build_message(lead, index):
+            lead["variant"], message = pool.assign(lead, offset + index, assignment)
+            return message
 
-            # Send the message
-            success = self.send_message(phone, message)
-            if success:
-                logger.info(f"✅ Successfully sent message to lead #{i+1} ({phone})")
-                success_count += 1
-            else:
-                logger.error(f"❌ Failed to send message to lead #{i+1} ({phone})")
-                failure_count += 1
+        def record_result(lead, instance, error):
+            journal.record(campaign_id, lead["phone"], "sent" if error is None else "failed",
+                           lead.get("variant"), instance.name if instance else None, error)
 
-            # Check if we have more leads to process
-            if i < len(leads) - 1:
-                # Random delay between messages
-                delay = random.uniform(delay_range[0], delay_range[1])
-                logger.info(f"Waiting {delay:.1f} seconds before next message...")
-                time.sleep(delay)
+        instances = load_instances(instances_file, delay_range)
+        logger.info(f"Sending through {len(instances)} Z-API instance(s): {', '.join(i.name for i in instances)}")
+        engine = CampaignEngine(instances, build_message, generators=generators, on_result=record_result,
+                                flush=journal.flush, flush_interval=GROUP_INTERVAL)
+        try:
+            success_count, failure_count = asyncio.run(engine.run(leads, total=total))
+            journal.set_status(campaign_id, "completed")
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            # Ctrl+C, or SIGTERM cancelling the run
+            journal.set_status(campaign_id, "interrupted")
+            logger.warning(f"Campaign interrupted; continue with --resume {campaign_id}")
+            return
+        except Exception:
+            journal.set_status(campaign_id, "failed")
+            logger.error(f"Campaign failed; continue with --resume {campaign_id}")
+            raise
+        finally:
+            journal.close()
                 
         # Report campaign summary
         logger.info("Campaign completed!")
@@ -366,22 +308,50 @@ def main():
     import argparse
     parser = argparse.ArgumentParser(description='Send Black Friday campaign messages')
     parser.add_argument('--test', action='store_true', help='Run in test mode (only sends to first lead)')
-    parser.add_argument('--file', type=str, default='leads.json', help='Path to leads JSON file')
-    parser.add_argument('--min-delay', type=int, default=15, help='Minimum delay between messages (seconds)')
-    parser.add_argument('--max-delay', type=int, default=35, help='Maximum delay between messages (seconds)')
+    parser.add_argument('--file', type=str, default='leads.json', help='Path to leads file (JSON array, JSONL or CSV)')
+    parser.add_argument('--min-delay', type=int, default=DEFAULT_DELAY_RANGE[0],
+                        help='Minimum delay between messages of each instance (seconds)')
+    parser.add_argument('--max-delay', type=int, default=DEFAULT_DELAY_RANGE[1],
+                        help='Maximum delay between messages of each instance (seconds)')
+    parser.add_argument('--instances', type=str, help='JSON file with the Z-API instances to send from')
+    parser.add_argument('--generators', type=int, default=4, help='Messages prepared in parallel')
+    parser.add_argument('--variants', type=int, default=VARIANT_POOL_SIZE, help='Number of message variants to pre-generate')
+    parser.add_argument('--assignment', choices=['round_robin', 'random'], default='round_robin',
+                        help='How leads are assigned message variants')
+    parser.add_argument('--regenerate-variants', action='store_true', help='Ignore the saved variant pool')
+    parser.add_argument('--skip-active', action='store_true',
+                        help='Skip numbers already in a conversation with the assistant')
+    parser.add_argument('--resume', type=str, metavar='CAMPAIGN_ID', help='Continue an interrupted campaign')
+    parser.add_argument('--retry-failed', action='store_true', help='With --resume, also resend failed leads')
+    parser.add_argument('--summary', type=str, metavar='CAMPAIGN_ID', help='Show throughput and failure reasons of a campaign')
     args = parser.parse_args()
-    
-    # Example single message test
-    if args.test:
-        test_message = sender.generate_message()
-        logger.info(f"Sample message generated:")
-        logger.info(test_message)
+
+    if args.summary:
+        journal = Journal()
+        print_summary(journal, args.summary)
+        journal.close()
+        return
+
+    # Check required environment variables
+    missing_vars = [var for var in REQUIRED_VARS if not os.getenv(var)]
+    if missing_vars:
+        logger.error(f"Missing required environment variables: {', '.join(missing_vars)}")
+        logger.error("Please set these variables in your .env file")
+        exit(1)
     
     # Run campaign
     sender.send_campaign(
         leads_file=args.file,
         delay_range=(args.min_delay, args.max_delay),
-        test_mode=args.test
+        test_mode=args.test,
+        instances_file=args.instances,
+        generators=args.generators,
+        variants=args.variants,
+        assignment=args.assignment,
+        regenerate_variants=args.regenerate_variants,
+        skip_active=args.skip_active,
+        resume=args.resume,
+        retry_failed=args.retry_failed
     )
 
 if __name__ == "__main__":
@@ -0,0 +1,9 @@
+"""
+Local stand-ins for Z-API and the OpenAI API, for load tests that must
+not touch real WhatsApp numbers or spend OpenAI budget.
+
+    python -m simulator --port 8090 --openai-latency lognormal:0.8,0.5 --openai-error-rate 0.02
+
+See simulator/server.py for the environment variables that point the app
+and disparar_mensagens.py at it.
+"""
@@ -0,0 +1,43 @@
+"""python -m simulator --help"""
+
+import argparse
+import logging
+from simulator.server import create_app
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    parser = argparse.ArgumentParser(description="Local Z-API and OpenAI simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--record", help="Append every received request to this JSONL file")
+    parser.add_argument("--seed", type=int, help="Seed for latency and error sampling")
+    for service in ("zapi", "openai"):
+        parser.add_argument(f"--{service}-latency", default="fixed:0",
+                            help="fixed:S, uniform:MIN,MAX or lognormal:MEDIAN,SIGMA (seconds)")
+        parser.add_argument(f"--{service}-error-rate", type=float, default=0.0, help="Share of requests answered with 500")
+        parser.add_argument(f"--{service}-rate-limit", type=float, default=0.0,
+                            help="Requests per second before answering 429 (0 = unlimited)")
+    args = parser.parse_args()
+
+    def faults(service):
+        return {
+            "latency": getattr(args, f"{service}_latency"),
+            "error_rate": getattr(args, f"{service}_error_rate"),
+            "rate_limit": getattr(args, f"{service}_rate_limit"),
+            "seed": args.seed,
+        }
+
+    app = create_app(zapi=faults("zapi"), openai=faults("openai"), record_file=args.record)
+    base = f"http://{args.host}:{args.port}"
+    print(f"OPENAI_BASE_URL={base}/v1")
+    print(f"ZAPI_URL_NEW={base}/instances/sim/token/sim/send-text")
+    print(f"ZAPI_BASE_URL={base}/instances/sim")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
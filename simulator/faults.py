@@ -0,0 +1,85 @@
+"""Latency distributions, error injection and 429 rate limiting for the simulator."""
+
+import math
+import time
+import random
+import threading
+
+
+class Latency:
+    """
+    A latency distribution parsed from a spec string:
+
+        fixed:0.2             always 0.2 s
+        uniform:0.1,0.5       between 0.1 and 0.5 s
+        lognormal:0.8,0.5     median 0.8 s, sigma 0.5 (long right tail)
+    """
+
+    def __init__(self, spec="fixed:0"):
+        self.spec = spec
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(value) for value in params.split(",") if value]
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution {spec!r}")
+
+    def sample(self, rng=random):
+        if self.kind == "fixed":
+            return self.params[0] if self.params else 0.0
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        median, sigma = self.params
+        return median * math.exp(rng.gauss(0, sigma))
+
+
+class RateLimiter:
+    """
+    Token bucket: rate requests per second with a burst of the same size,
+    at least 1 so rates below 1/s still let a request through (0 = unlimited).
+    """
+
+    def __init__(self, rate=0.0):
+        self.rate = rate
+        self.capacity = max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Return 0 if the request may proceed, else the seconds until a token is available."""
+        if self.rate <= 0:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+class Faults:
+    """Everything that can go wrong with one simulated service."""
+
+    def __init__(self, latency="fixed:0", error_rate=0.0, rate_limit=0.0, seed=None):
+        self.latency = Latency(latency)
+        self.error_rate = error_rate
+        self.limiter = RateLimiter(rate_limit)
+        self.rng = random.Random(seed)
+
+    def apply(self):
+        """
+        Sleep for a sampled latency and decide the outcome:
+        ("ok", None), ("error", None) or ("rate_limited", retry_after).
+        """
+        retry_after = self.limiter.acquire()
+        if retry_after:
+            return "rate_limited", retry_after
+        time.sleep(max(0.0, self.latency.sample(self.rng)))
+        if self.rng.random() < self.error_rate:
+            return "error", None
+        return "ok", None
+
+    def describe(self):
+        return {"latency": self.latency.spec, "error_rate": self.error_rate, "rate_limit": self.limiter.rate}
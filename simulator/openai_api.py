@@ -0,0 +1,135 @@
+"""OpenAI-compatible stand-in: chat completions, embeddings and audio transcriptions."""
+
+import re
+import json
+import time
+import zlib
+import hashlib
+import numpy as np
+from flask import request, jsonify
+
+EMBEDDING_DIMENSIONS = {"text-embedding-3-small": 1536, "text-embedding-3-large": 3072}
+
+REPLIES = [
+    "Oi! 😊 O acesso é por 1 ano e você pode parcelar em até 12x. Quer que eu te mande o link?",
+    "Claro! A comunidade tem workshops ao vivo 2x por mês e um hub de conteúdo completo.",
+    "Boa pergunta! Os bônus incluem a masterclass de criação de conteúdo e o modelo de proposta comercial.",
+    "Perfeito, qualquer dúvida é só me chamar por aqui. 👍",
+]
+
+
+def count_tokens(text):
+    """Close enough for usage numbers: about 4 characters per token."""
+    return max(1, len(text) // 4)
+
+
+def message_text(message):
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if part.get("type") == "text")
+    return content
+
+
+def completion_text(messages, response_format, index):
+    """A plausible answer for the kind of prompt the app sends."""
+    prompt = message_text(messages[-1]) if messages else ""
+    if "Template:" in prompt:
+        # Campaign variants: return the template with a small change
+        template = prompt.split("Template:", 1)[1].strip()
+        return template.replace("NOVA CHANCE", ["NOVA CHANCE", "ÚLTIMA CHANCE", "CHANCE ÚNICA"][index % 3], 1)
+    if response_format and response_format.get("type") == "json_object":
+        original = prompt.split("Original message:", 1)[-1].split("Return JSON", 1)[0].strip()
+        sentences = [s for s in re.split(r"(?<=[.!?])\s+", original) if s] or [original]
+        return json.dumps([
+            {"message": sentence, "typing_delay": 2, "send_delay": 1} for sentence in sentences[:6]
+        ], ensure_ascii=False)
+    if "numbered list" in prompt:
+        body = prompt.split("Message to split:", 1)[-1].split("Output the split", 1)[0].strip()
+        parts = [s for s in re.split(r"(?<=[.!?])\s+", body) if s] or [body]
+        return "\n".join(f"{i + 1}. {part}" for i, part in enumerate(parts))
+    seed = zlib.crc32(prompt.encode("utf-8"))
+    return REPLIES[(seed + index) % len(REPLIES)]
+
+
+def embed(text, dimensions):
+    """Deterministic bag-of-words vector, so texts sharing words are similar."""
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for word in re.findall(r"\w+", text.lower()):
+        digest = hashlib.md5(word.encode("utf-8")).digest()
+        vector[int.from_bytes(digest[:4], "little") % dimensions] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).round(6).tolist()
+
+
+def init_openai_routes(app, faults, recorder):
+    def fail(outcome, retry_after):
+        if outcome == "rate_limited":
+            response = jsonify({"error": {
+                "message": "Rate limit reached (simulated)", "type": "requests", "code": "rate_limit_exceeded"
+            }})
+            response.headers["Retry-After"] = f"{max(retry_after, 0.1):.2f}"
+            return response, 429
+        return jsonify({"error": {"message": "Simulated server error", "type": "server_error"}}), 500
+
+    def guarded(endpoint, payload, build):
+        start = time.time()
+        outcome, retry_after = faults.apply()
+        recorder.record("openai", endpoint, payload, outcome, time.time() - start)
+        if outcome != "ok":
+            return fail(outcome, retry_after)
+        return jsonify(build()), 200
+
+    @app.route('/v1/chat/completions', methods=['POST'])
+    def openai_chat_completions():
+        payload = request.get_json(silent=True) or {}
+        messages = payload.get("messages", [])
+        model = payload.get("model", "gpt-4o-mini")
+
+        def build():
+            texts = [completion_text(messages, payload.get("response_format"), i) for i in range(payload.get("n") or 1)]
+            prompt_tokens = sum(count_tokens(message_text(message)) for message in messages)
+            completion_tokens = sum(count_tokens(text) for text in texts)
+            return {
+                "id": f"chatcmpl-sim-{time.time_ns()}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {"index": i, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+                    for i, text in enumerate(texts)
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }
+        return guarded("chat.completions", payload, build)
+
+    @app.route('/v1/embeddings', methods=['POST'])
+    def openai_embeddings():
+        payload = request.get_json(silent=True) or {}
+        model = payload.get("model", "text-embedding-3-small")
+        inputs = payload.get("input", "")
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        dimensions = payload.get("dimensions") or EMBEDDING_DIMENSIONS.get(model, 1536)
+
+        def build():
+            tokens = sum(count_tokens(text) for text in inputs)
+            return {
+                "object": "list",
+                "model": model,
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": embed(text, dimensions)}
+                    for i, text in enumerate(inputs)
+                ],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            }
+        return guarded("embeddings", {"model": model, "input": inputs}, build)
+
+    @app.route('/v1/audio/transcriptions', methods=['POST'])
+    def openai_audio_transcriptions():
+        upload = request.files.get("file")
+        size = len(upload.read()) if upload else 0
+        payload = {"model": request.form.get("model"), "file_bytes": size}
+        return guarded("audio.transcriptions", payload, lambda: {"text": "Oi, queria saber o valor do curso e como funciona o acesso."})
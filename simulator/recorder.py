@@ -0,0 +1,41 @@
+"""Records every request the simulator receives."""
+
+import os
+import json
+import time
+import threading
+from collections import Counter
+
+
+class Recorder:
+    """Counts requests per endpoint and outcome, and appends them to a JSONL file if one is given."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.counts = Counter()
+        self.lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def record(self, service, endpoint, payload, outcome, latency):
+        entry = {
+            "time": time.time(),
+            "service": service,
+            "endpoint": endpoint,
+            "outcome": outcome,
+            "latency": round(latency, 4),
+            "payload": payload,
+        }
+        with self.lock:
+            self.counts[f"{service} {endpoint} {outcome}"] += 1
+            if self.path:
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def reset(self):
+        with self.lock:
+            self.counts.clear()
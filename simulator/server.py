@@ -0,0 +1,69 @@
+"""
+Simulator app. Point the project at it with, for example:
+
+    OPENAI_BASE_URL=http://localhost:8090/v1
+    OPENAI_API_KEY=sim
+    ZAPI_URL_NEW=http://localhost:8090/instances/sim/token/sim/send-text
+    ZAPI_BASE_URL=http://localhost:8090/instances/sim
+    TOKEN=sim
+
+GET /_sim/stats returns request counts per endpoint and outcome, and
+POST /_sim/config changes the fault settings of a running simulator:
+
+    {"openai": {"latency": "lognormal:2,0.8", "error_rate": 0.1, "rate_limit": 5}}
+"""
+
+import logging
+from flask import Flask, request, jsonify
+from simulator.faults import Faults
+from simulator.recorder import Recorder
+from simulator.zapi import init_zapi_routes
+from simulator.openai_api import init_openai_routes
+
+logger = logging.getLogger(__name__)
+
+
+class FaultsProxy:
+    """Lets /_sim/config swap a service's Faults while routes keep their reference."""
+
+    def __init__(self, faults):
+        self.faults = faults
+
+    def apply(self):
+        return self.faults.apply()
+
+
+def create_app(zapi=None, openai=None, record_file=None):
+    """zapi and openai are Faults keyword arguments (latency, error_rate, rate_limit, seed)."""
+    app = Flask(__name__)
+    services = {"zapi": FaultsProxy(Faults(**(zapi or {}))), "openai": FaultsProxy(Faults(**(openai or {})))}
+    recorder = Recorder(record_file)
+
+    init_zapi_routes(app, services["zapi"], recorder)
+    init_openai_routes(app, services["openai"], recorder)
+
+    @app.route('/_sim/stats', methods=['GET'])
+    def sim_stats():
+        return jsonify({
+            "requests": recorder.stats(),
+            "faults": {name: proxy.faults.describe() for name, proxy in services.items()},
+        }), 200
+
+    @app.route('/_sim/config', methods=['POST'])
+    def sim_config():
+        settings = request.get_json(silent=True) or {}
+        try:
+            for name, options in settings.items():
+                current = services[name].faults.describe()
+                services[name].faults = Faults(**dict(current, **options))
+        except (KeyError, TypeError, ValueError) as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+        logger.info(f"Simulator faults updated: {settings}")
+        return jsonify({"status": "success"}), 200
+
+    @app.route('/_sim/reset', methods=['POST'])
+    def sim_reset():
+        recorder.reset()
+        return jsonify({"status": "success"}), 200
+
+    return app
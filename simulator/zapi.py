@@ -0,0 +1,32 @@
+"""Z-API stand-in: send-text and reaction endpoints."""
+
+import time
+import uuid
+from flask import request, jsonify
+
+
+def init_zapi_routes(app, faults, recorder):
+    def respond(endpoint):
+        start = time.time()
+        payload = request.get_json(silent=True) or {}
+        outcome, retry_after = faults.apply()
+        recorder.record("zapi", endpoint, payload, outcome, time.time() - start)
+        if outcome == "rate_limited":
+            response = jsonify({"error": "Too many requests"})
+            response.headers["Retry-After"] = f"{retry_after:.0f}" if retry_after >= 1 else "1"
+            return response, 429
+        if outcome == "error":
+            return jsonify({"error": "Simulated Z-API failure"}), 500
+        if not payload.get("phone"):
+            return jsonify({"error": "phone is required"}), 400
+        message_id = uuid.uuid4().hex[:20].upper()
+        return jsonify({"zaapId": uuid.uuid4().hex.upper(), "messageId": message_id, "id": message_id}), 200
+
+    @app.route('/instances/<instance>/token/<token>/send-text', methods=['POST'])
+    def zapi_send_text(instance, token):
+        return respond("send-text")
+
+    @app.route('/instances/<instance>/token/<token>/send-reaction', methods=['POST'])
+    @app.route('/instances/<instance>/token/<token>/messages/reaction', methods=['POST'])
+    def zapi_send_reaction(instance, token):
+        return respond("reaction")
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from app import audio_service
+from app.disk_cache import DiskCache
+
+
+@pytest.fixture(autouse=True)
+def worker_down(monkeypatch, tmp_path):
+    def refuse(**kwargs):
+        raise ConnectionRefusedError("worker socket refused")
+
+    monkeypatch.setattr(audio_service, "TRANSCRIPTION_MODE", "worker")
+    monkeypatch.setattr(audio_service, "VAD_ENABLED", False)
+    monkeypatch.setattr(audio_service, "connect_worker", refuse)
+    monkeypatch.setattr(audio_service, "decode_audio_url", lambda url, digest=None: np.zeros(16000, np.float32))
+    monkeypatch.setattr(audio_service, "transcription_cache", DiskCache(str(tmp_path / "cache")))
+
+
+def test_worker_down_falls_back_to_local_transcription(monkeypatch):
+    monkeypatch.setattr(audio_service, "TRANSCRIPTION_LOCAL_FALLBACK", True)
+    monkeypatch.setattr(audio_service, "transcribe_locally", lambda audio: " quanto custa o curso ")
+
+    assert list(audio_service.iter_transcription(np.zeros(16000, np.float32))) == ["quanto custa o curso"]
+
+
+def test_worker_down_without_fallback_yields_fixed_reply_marker(monkeypatch):
+    monkeypatch.setattr(audio_service, "TRANSCRIPTION_LOCAL_FALLBACK", False)
+
+    parts = list(audio_service.iter_audio_message({"audioUrl": "https://example.com/note.ogg"}))
+
+    assert parts == [audio_service.TRANSCRIPTION_FAILED]
+    assert audio_service.FIXED_REPLIES[parts[0]] == audio_service.TRANSCRIPTION_FAILED_REPLY
+
+
+def test_failed_transcription_is_not_cached(monkeypatch):
+    monkeypatch.setattr(audio_service, "TRANSCRIPTION_LOCAL_FALLBACK", False)
+    list(audio_service.iter_audio_message({"audioUrl": "https://example.com/note.ogg"}))
+
+    assert audio_service.transcription_cache.get("url:https://example.com/note.ogg") is None
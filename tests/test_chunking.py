@@ -0,0 +1,69 @@
+import pytest
+from app.chunking import count_tokens, dedupe_chunks, is_heading, iter_chunks
+
+
+def sentence(number):
+    return f"Frase número {number} fala sobre o curso de social media e seus bônus."
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("1. Introdução", True),
+    ("2) Preços", True),
+    ("3.1 Módulos", True),
+    ("PERGUNTAS FREQUENTES", True),
+    ("Formas de pagamento:", True),
+    ("10 parcelas de R$ 49,90 sem juros no cartão", False),
+    ("2024 foi o ano em que lançamos o curso", False),
+    ("3 módulos extras", False),
+    ("Uma frase comum termina com ponto.", False),
+])
+def test_is_heading(line, expected):
+    assert is_heading(line) == expected
+
+
+def test_chunks_respect_the_size_and_carry_the_overlap():
+    text = " ".join(sentence(i) for i in range(20))
+    chunks = list(iter_chunks(text, chunk_size=60, overlap=20))
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 60 + len(chunk.splitlines()) for chunk in chunks)
+    for previous, following in zip(chunks, chunks[1:]):
+        # The last sentence of a chunk opens the next one
+        assert following.splitlines()[0] == previous.splitlines()[-1]
+
+
+def test_no_overlap_when_disabled():
+    text = " ".join(sentence(i) for i in range(20))
+    chunks = list(iter_chunks(text, chunk_size=60, overlap=0))
+    lines = [line for chunk in chunks for line in chunk.splitlines()]
+    assert lines == [sentence(i) for i in range(20)]
+
+
+def test_heading_starts_a_new_chunk():
+    text = f"{sentence(1)}\n\n2. Preços\n{sentence(2)}"
+    assert list(iter_chunks(text, chunk_size=300, overlap=50)) == [sentence(1), f"2. Preços\n{sentence(2)}"]
+
+
+def test_oversize_word_is_hard_split():
+    word = "-".join(["ab"] * 300)
+    chunks = list(iter_chunks(f"Link: {word}", chunk_size=50, overlap=0))
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 50 for chunk in chunks)
+    assert "".join(chunks).replace(" ", "").replace("\n", "") == f"Link:{word}"
+
+
+def test_dedupe_drops_exact_and_near_duplicates():
+    base = " ".join(sentence(i) for i in range(10))
+    near = base.replace("Frase número 9", "Frase numero 9")
+    other = " ".join(f"Outro texto {i} sobre pagamento no pix e cartão." for i in range(10))
+    assert dedupe_chunks([base, base.upper(), near, other]) == [base, other]
+
+
+def test_dedupe_keeps_different_chunks():
+    chunks = [" ".join(sentence(i + offset) for i in range(3)) for offset in (0, 50, 100)]
+    chunks.append("Um texto completamente diferente sobre horários das aulas ao vivo.")
+    assert dedupe_chunks(chunks) == chunks
+
+
+def test_numbered_list_items_are_not_headings():
+    text = "O que você leva:\n1. Workshops ao vivo\n2. Desafios mensais\n3. Aulas gravadas"
+    assert list(iter_chunks(text, chunk_size=300, overlap=50)) == [text]
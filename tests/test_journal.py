@@ -0,0 +1,92 @@
+import itertools
+from campaign import journal as journal_module
+from campaign.journal import Journal
+
+
+def make_journal(tmp_path):
+    return Journal(str(tmp_path / "journal.db"))
+
+
+def leads(count, start=0):
+    return [{"phone": f"55219999{i:05d}"} for i in range(start, start + count)]
+
+
+def test_skip_done_drops_sent_and_failed_leads(tmp_path):
+    journal = make_journal(tmp_path)
+    campaign_id = journal.start("leads.csv")
+    all_leads = leads(5)
+    journal.record(campaign_id, all_leads[0]["phone"], "sent")
+    journal.record(campaign_id, all_leads[1]["phone"], "failed", reason="timeout")
+    journal.flush()
+
+    remaining = [lead["phone"] for lead in journal.skip_done(campaign_id, all_leads)]
+    assert remaining == [lead["phone"] for lead in all_leads[2:]]
+
+    retried = [lead["phone"] for lead in journal.skip_done(campaign_id, all_leads, retry_failed=True)]
+    assert retried == [lead["phone"] for lead in all_leads[1:]]
+
+
+def test_skip_done_is_per_campaign_and_spans_lookup_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal_module, "LOOKUP_BATCH", 3)
+    journal = make_journal(tmp_path)
+    first = journal.start("leads.csv")
+    second = journal.start("leads.csv")
+    all_leads = leads(10)
+    for lead in all_leads[::2]:
+        journal.record(first, lead["phone"], "sent")
+    journal.flush()
+
+    assert list(journal.skip_done(first, all_leads)) == all_leads[1::2]
+    assert list(journal.skip_done(second, all_leads)) == all_leads
+
+
+def test_skip_done_ignores_unflushed_outcomes(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal_module, "GROUP_INTERVAL", 3600)
+    journal = make_journal(tmp_path)
+    campaign_id = journal.start("leads.csv")
+    journal.record(campaign_id, leads(1)[0]["phone"], "sent")
+    assert len(list(journal.skip_done(campaign_id, leads(1)))) == 1
+    journal.flush()
+    assert list(journal.skip_done(campaign_id, leads(1))) == []
+
+
+def test_summary(tmp_path, monkeypatch):
+    journal = make_journal(tmp_path)
+    campaign_id = journal.start("leads.csv", {"variants": 3})
+    clock = itertools.count(100, 10)
+    monkeypatch.setattr(journal_module.time, "time", lambda: next(clock))
+    all_leads = leads(5)
+    journal.record(campaign_id, all_leads[0]["phone"], "sent", variant=0, instance="chip1")
+    journal.record(campaign_id, all_leads[1]["phone"], "sent", variant=1, instance="chip2")
+    journal.record(campaign_id, all_leads[2]["phone"], "sent", variant=0, instance="chip1")
+    journal.record(campaign_id, all_leads[3]["phone"], "failed", instance="chip2", reason="HTTP 500")
+    journal.record(campaign_id, all_leads[4]["phone"], "failed", reason="generation")
+    journal.flush()
+
+    summary = journal.summary(campaign_id)
+    assert summary["options"] == {"variants": 3}
+    assert summary["status"] == "running"
+    assert (summary["sent"], summary["failed"]) == (3, 2)
+    assert summary["failure_reasons"] == {"HTTP 500": 1, "generation": 1}
+    assert summary["instances"] == {"chip1": 2, "chip2": 1}
+    assert summary["variants"] == {0: 2, 1: 1}
+    assert summary["per_minute"] == round(5 / (summary["last_send"] - summary["first_send"]) * 60, 2)
+
+
+def test_summary_of_a_resent_lead_counts_its_last_outcome(tmp_path):
+    journal = make_journal(tmp_path)
+    campaign_id = journal.start("leads.csv")
+    phone = leads(1)[0]["phone"]
+    journal.record(campaign_id, phone, "failed", reason="timeout")
+    journal.record(campaign_id, phone, "sent")
+    journal.flush()
+
+    summary = journal.summary(campaign_id)
+    assert (summary["sent"], summary["failed"]) == (1, 0)
+
+
+def test_summary_of_unknown_or_empty_campaign(tmp_path):
+    journal = make_journal(tmp_path)
+    assert journal.summary("missing") is None
+    summary = journal.summary(journal.start("leads.csv"))
+    assert (summary["sent"], summary["failed"], summary["per_minute"]) == (0, 0, None)
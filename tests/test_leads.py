@@ -0,0 +1,43 @@
+import io
+import json
+import numpy as np
+from campaign.leads import BloomFilter, iter_json_array, normalize_phones
+
+
+def test_bloom_filter_flags_repeats_across_and_within_batches():
+    seen = BloomFilter(1000)
+    assert seen.add_many([5521999990001, 5521999990002]).tolist() == [False, False]
+    assert seen.add_many([5521999990002, 5521999990003, 5521999990003]).tolist() == [True, False, True]
+
+
+def test_bloom_filter_never_misses_a_number_it_has_seen():
+    seen = BloomFilter(50000)
+    numbers = np.arange(5521900000000, 5521900050000, dtype=np.uint64)
+    assert not seen.add_many(numbers).any()
+    assert seen.add_many(numbers).all()
+
+
+def test_bloom_filter_false_positive_rate_is_near_its_target():
+    seen = BloomFilter(100000, error_rate=1e-3)
+    seen.add_many(np.arange(5521900000000, 5521900100000, dtype=np.uint64))
+    fresh = seen.add_many(np.arange(5521800000000, 5521800100000, dtype=np.uint64))
+    assert fresh.mean() < 3e-3
+
+
+def test_normalize_phones():
+    assert normalize_phones(["(21) 99999-0001", "021999990001", "+55 21 9999-0001", "123", None]) == [
+        "5521999990001", "5521999990001", "552199990001", None, None
+    ]
+
+
+def test_iter_json_array_decodes_elements_longer_than_a_chunk():
+    leads = [{"phone": "5521999999999", "name": "João", "notes": "x" * 500}, {"phone": "5521888888888"}]
+    f = io.StringIO(json.dumps(leads))
+
+    assert list(iter_json_array(f, chunk_size=64)) == leads
+
+
+def test_iter_json_array_skips_a_malformed_element():
+    f = io.StringIO('[{"phone": "1"}, {"phone": "2", "name": }, {"phone": "3"}]')
+
+    assert list(iter_json_array(f, chunk_size=8)) == [{"phone": "1"}, None, {"phone": "3"}]
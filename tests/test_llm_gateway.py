@@ -0,0 +1,117 @@
+import types
+import httpx
+import pytest
+from openai import APIConnectionError, APITimeoutError
+from app import llm_gateway, llm_metrics
+from app.llm_gateway import CircuitBreaker, CircuitOpenError, chat_completion
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+class FakeClient:
+    """Answers chat completions per model: a response, or an exception to raise."""
+
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+        self.calls = []
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+
+    def create(self, model, timeout, **kwargs):
+        self.calls.append(model)
+        outcome = self.outcomes[model]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return types.SimpleNamespace(model=model, usage=None, choices=[])
+
+
+@pytest.fixture(autouse=True)
+def fresh_gateway(monkeypatch):
+    monkeypatch.setattr(llm_metrics, "LLM_METRICS_FLUSH_INTERVAL", 0)  # nothing written to data/
+    monkeypatch.setattr(llm_gateway, "_breakers", {})
+    monkeypatch.setattr(llm_gateway, "_latencies", {})
+    monkeypatch.setattr(llm_gateway, "LLM_HEDGE", False)
+    monkeypatch.setattr(llm_gateway, "MODEL_FALLBACKS", {"gpt-4o-mini": ["gpt-3.5-turbo"]})
+
+
+def use_client(monkeypatch, outcomes):
+    client = FakeClient(outcomes)
+    monkeypatch.setattr(llm_gateway, "get_client", lambda call_type=None: client)
+    return client
+
+
+def test_breaker_opens_after_min_calls_at_the_failure_rate(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "BREAKER_MIN_CALLS", 4)
+    breaker = CircuitBreaker("chat:test")
+    for _ in range(3):
+        breaker.record(failed=True)
+    assert breaker.state == "closed"
+    breaker.record(failed=True)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_breaker_stays_closed_below_the_failure_rate(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "BREAKER_MIN_CALLS", 4)
+    breaker = CircuitBreaker("chat:test")
+    for failed in (True, False, False, False, True, False):
+        breaker.record(failed=failed)
+    assert breaker.state == "closed"
+
+
+def test_half_open_probe_closes_or_reopens(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "BREAKER_COOLDOWN", 0)
+    breaker = CircuitBreaker("chat:test")
+    breaker.trip(0)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()  # one probe at a time
+    breaker.record(failed=True)
+    assert breaker.state == "open"
+
+    assert breaker.allow()
+    breaker.record(failed=False)
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_provider_error_walks_the_fallback_models(monkeypatch):
+    client = use_client(monkeypatch, {
+        "gpt-4o-mini": APIConnectionError(request=REQUEST),
+        "gpt-3.5-turbo": None,
+    })
+    response = chat_completion("humanize", model="gpt-4o-mini", messages=[])
+    assert response.model == "gpt-3.5-turbo"
+    assert client.calls == ["gpt-4o-mini", "gpt-3.5-turbo"]
+
+
+def test_reply_timeout_does_not_walk_the_fallbacks(monkeypatch):
+    client = use_client(monkeypatch, {
+        "gpt-4o-mini": APITimeoutError(request=REQUEST),
+        "gpt-3.5-turbo": None,
+    })
+    with pytest.raises(APITimeoutError):
+        chat_completion("reply", model="gpt-4o-mini", messages=[])
+    assert client.calls == ["gpt-4o-mini"]
+    assert llm_gateway.get_breaker("chat:gpt-4o-mini").status()["failures"] == 1
+
+
+def test_open_circuits_are_skipped(monkeypatch):
+    client = use_client(monkeypatch, {"gpt-4o-mini": None, "gpt-3.5-turbo": None})
+    llm_gateway.get_breaker("chat:gpt-4o-mini").trip(llm_gateway.time.time())
+    assert chat_completion("reply", model="gpt-4o-mini", messages=[]).model == "gpt-3.5-turbo"
+    assert client.calls == ["gpt-3.5-turbo"]
+
+
+def test_circuit_open_error_when_every_model_is_open(monkeypatch):
+    client = use_client(monkeypatch, {"gpt-4o-mini": None, "gpt-3.5-turbo": None})
+    now = llm_gateway.time.time()
+    llm_gateway.get_breaker("chat:gpt-4o-mini").trip(now)
+    llm_gateway.get_breaker("chat:gpt-3.5-turbo").trip(now)
+    with pytest.raises(CircuitOpenError):
+        chat_completion("reply", model="gpt-4o-mini", messages=[])
+    assert client.calls == []
+
+
+def test_reply_and_query_embeddings_have_no_sdk_retries():
+    assert llm_gateway.CALL_RETRIES["reply"] == 0
+    assert llm_gateway.CALL_RETRIES["embedding"] == 0
@@ -0,0 +1,29 @@
+from app.local_humanizer import LIST_ITEM_PATTERN, blocks, segment
+
+
+def test_list_items_need_a_space_after_the_bullet():
+    for line in ("- item", "* item", "• item", "1. item", "2) item", "✅ item", "✅item"):
+        assert LIST_ITEM_PATTERN.match(line), line
+    for line in ("*Oferta* só hoje", "1.5 litros por dia", "10 parcelas sem juros", "-5% no pix"):
+        assert not LIST_ITEM_PATTERN.match(line), line
+
+
+def test_bold_and_decimal_lines_stay_prose():
+    text = "*Oferta* só hoje.\nSão 12x sem juros.\n\n1.5 litros por dia.\nBeba água."
+    assert blocks(text) == [
+        ("text", "*Oferta* só hoje. São 12x sem juros."),
+        ("text", "1.5 litros por dia. Beba água."),
+    ]
+
+
+def test_list_block_stays_together_when_short():
+    text = "Você leva:\n- Workshops\n- Desafios\n- Aulas gravadas"
+    assert segment(text) == [text]
+
+
+def test_long_list_is_split_between_items():
+    items = [f"✅ Benefício número {i} com uma descrição razoavelmente longa" for i in range(8)]
+    chunks = segment("\n".join(["O que está incluído:"] + items), max_chars=160)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 160 for chunk in chunks)
+    assert "\n".join(chunks).split("\n") == ["O que está incluído:"] + items
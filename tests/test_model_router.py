@@ -0,0 +1,47 @@
+import pytest
+from app import model_router
+
+LONG = " ".join(["palavra"] * (model_router.LONG_MESSAGE_WORDS + 1))
+
+
+@pytest.mark.parametrize("message, kwargs, expected", [
+    ("oi tudo bem", {"history_length": 3}, "small_talk"),
+    ("kkkk valeu", {"history_length": 0}, "small_talk"),
+    ("Quanto custa o acesso anual da comunidade?", {"history_length": 0}, "first_contact"),
+    ("Quanto custa o acesso anual da comunidade?", {"history_length": 2, "user_state": "new_user"}, "first_contact"),
+    ("Quanto custa o acesso anual da comunidade?", {"history_length": 2, "user_state": "normal"}, "question"),
+    ("Quanto custa o acesso anual da comunidade?", {"history_length": 2}, "question"),
+    ("oi", {"pdf_context": "Acesso anual por R$ 297", "history_length": 0}, "grounded"),
+    (LONG, {"history_length": 2}, "long_message"),
+    ("me explica o curso", {"origin": "audio", "history_length": 2}, "audio"),
+    ("o que é isso?", {"origin": "image", "pdf_context": "Contexto", "history_length": 0}, "image"),
+    ("o que é isso?", {"origin": "audio", "pdf_context": "Contexto"}, "grounded"),
+])
+def test_classify(message, kwargs, expected):
+    assert model_router.classify(message, **kwargs) == expected
+
+
+def test_route_returns_a_copy_of_the_class_settings():
+    name, settings = model_router.route("oi", history_length=3)
+    assert name == "small_talk"
+    assert settings == model_router.ROUTE_CLASSES["small_talk"]
+    settings["max_tokens"] = 1
+    assert model_router.ROUTE_CLASSES["small_talk"]["max_tokens"] != 1
+
+
+def test_generate_response_routes_on_the_user_state(monkeypatch):
+    from app import openai_service
+
+    seen = {}
+
+    def fake_route(message, pdf_context, origin, history_length, user_state):
+        seen.update(history_length=history_length, user_state=user_state)
+        raise RuntimeError("stop before the completion")
+
+    monkeypatch.setattr(openai_service, "check_if_thread_exists", lambda wa_id: [
+        {"role": "system", "content": "prompt"}, {"role": "user", "content": "oi"}
+    ])
+    monkeypatch.setattr(openai_service, "get_user_state", lambda wa_id: "new_user")
+    monkeypatch.setattr(openai_service.model_router, "route", fake_route)
+    openai_service.generate_response("Quanto custa?", "5521999990001", pdf_context="")
+    assert seen == {"history_length": 1, "user_state": "new_user"}
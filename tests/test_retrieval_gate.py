@@ -0,0 +1,78 @@
+import threading
+import pytest
+from app import retrieval_gate
+from app.retrieval_gate import get_lexical_index, lexical_search, should_retrieve
+
+
+CHUNKS = [
+    "O curso de social media tem 12 módulos e certificado de conclusão.",
+    "O pagamento pode ser feito no cartão em até 12 parcelas ou no pix.",
+    "O suporte atende pelo WhatsApp de segunda a sexta.",
+]
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("", (False, "empty_or_emoji")),
+    ("👍", (False, "empty_or_emoji")),
+    ("Oiii", (False, "stop_phrase")),
+    ("Bom dia!", (False, "stop_phrase")),
+    ("muito obrigada", (False, "stop_phrase")),
+    ("kkkkk", (False, "laughter")),
+    ("hahaha", (False, "laughter")),
+    ("rsrs", (False, "laughter")),
+    ("e o", (False, "no_content_words")),
+    ("quanto custa?", (True, "question")),
+    ("qual o valor do curso", (True, "question")),
+    ("como funciona o suporte", (True, "question")),
+])
+def test_should_retrieve_without_corpus(message, expected):
+    assert should_retrieve(message) == expected
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("adorei seu perfil", (False, "no_corpus_overlap")),
+    ("quero pagar no pix", (True, "content")),
+    ("tem certificado", (True, "content")),
+    ("minha cachorra se chama Mel e hoje ela fez aniversário e ganhou bolo", (True, "content")),
+])
+def test_should_retrieve_lexical_check(message, expected):
+    assert should_retrieve(message, CHUNKS) == expected
+
+
+def test_lexical_search_ranks_matching_chunk_first():
+    assert lexical_search("parcelas no cartão", CHUNKS, top_k=1) == [CHUNKS[1]]
+    assert lexical_search("qualquer coisa", [], top_k=1) == []
+
+
+def test_lexical_index_rebuilds_only_when_chunks_change():
+    chunks = list(CHUNKS)
+    index = get_lexical_index(chunks)
+    assert get_lexical_index(chunks) is index
+    assert get_lexical_index(list(CHUNKS)) is not index
+
+
+def test_lexical_index_built_once_under_concurrent_requests(monkeypatch):
+    built = []
+    original = retrieval_gate.BM25Index
+
+    def counting_index(documents):
+        built.append(documents)
+        return original(documents)
+
+    monkeypatch.setattr(retrieval_gate, "BM25Index", counting_index)
+    chunks = list(CHUNKS)
+    barrier = threading.Barrier(8)
+    results = []
+
+    def request():
+        barrier.wait()
+        results.append(get_lexical_index(chunks))
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(built) == 1
+    assert all(result is results[0] for result in results)
@@ -0,0 +1,50 @@
+import pytest
+from campaign.variants import VariantPool, pool_digest
+
+TEMPLATE = "Oi [NOME], a oferta acaba hoje: https://example.com/oferta"
+
+
+def make_pool(tmp_path):
+    return VariantPool(TEMPLATE, "reescreva", path=str(tmp_path / "variants.json"))
+
+
+def rewrite(number):
+    return f"Olá [NOME], variação número {number} da oferta que acaba hoje: https://example.com/oferta"
+
+
+def test_restore_keeps_the_stored_texts_and_order(tmp_path):
+    stored = [rewrite(2), rewrite(1)]
+    pool = make_pool(tmp_path)
+    pool.restore(stored, pool_digest(stored))
+    assert pool.variants == stored
+    assert pool.assign({"name": "ana"}, 3)[1] == rewrite(1).replace("[NOME]", "ANA")
+
+
+def test_restore_ignores_the_shared_pool_file(tmp_path):
+    other = make_pool(tmp_path)
+    for number in range(5):
+        other.add(rewrite(number))
+    other.save()
+
+    stored = [rewrite(7)]
+    pool = make_pool(tmp_path)
+    pool.restore(stored, pool_digest(stored))
+    assert pool.variants == stored
+
+
+def test_restore_rejects_a_mismatched_hash(tmp_path):
+    with pytest.raises(ValueError):
+        make_pool(tmp_path).restore([rewrite(1)], pool_digest([rewrite(2)]))
+
+
+def test_fill_caps_a_larger_saved_pool_to_size(tmp_path):
+    saved = make_pool(tmp_path)
+    for number in range(40):
+        saved.add(rewrite(number))
+    saved.save()
+
+    pool = make_pool(tmp_path)
+    pool.load()
+    assert len(pool.variants) == 40
+    assert pool.fill(10) == [rewrite(number) for number in range(10)]
+    assert {pool.assign({}, index)[0] for index in range(40)} == set(range(10))